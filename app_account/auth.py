@@ -1,21 +1,31 @@
+import asyncio
+import hashlib
+import logging
+import time
+
 import jwt
 from uuid import uuid4, UUID
 from typing import Any
 from datetime import datetime, timezone, timedelta
 from enum import Enum
-from copy import deepcopy
 
-from fastapi.encoders import jsonable_encoder
 from fastapi.security import APIKeyHeader
-from passlib.context import CryptContext
-from fastapi import Request, Depends
+from fastapi import HTTPException, Request, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app_account.crud import UserCRUD
+from app_account import hashing
+from app_account.cache import revoked_access_jti, verified_token_cache
+from app_account.crud import UserCRUD, TokenCRUD
 from app_account.excepions import AuthExceptions
+from app_account.jwt_keys import get_jwt_keys
 from app_account.models import User
+from app_account.schemas import UserClaimsSchema
 from core.config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class TypeToken(Enum):
     ACCESS = APIKeyHeader(name="Authorization")
     REFRESH = APIKeyHeader(name="Refresh_token")
@@ -27,8 +37,10 @@ class TypeToken(Enum):
 
 class Authentication:
 
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    payload_token: dict = dict()
+    pwd_context = hashing.pwd_context
+    hash_pool = hashing.PasswordHashPool(
+        size=settings.PWD_HASH_POOL_SIZE, queue_size=settings.PWD_HASH_QUEUE_SIZE, timeout=settings.PWD_HASH_TIMEOUT
+    )
 
     @classmethod
     def get_password_hash(cls, password: str) -> str:
@@ -53,6 +65,56 @@ class Authentication:
         """
         return cls.pwd_context.verify(input_password, hashed_password)
 
+    @classmethod
+    def password_needs_update(cls, hashed_password: str) -> bool:
+        """
+        Хеш создан другой схемой или с другой стоимостью, чем в текущих настройках (PWD_HASH_SCHEME, PWD_BCRYPT_ROUNDS,
+        PWD_ARGON2_*). Сам хеш не вычисляется.
+        """
+        return cls.pwd_context.needs_update(hashed_password)
+
+    @classmethod
+    async def arehash_password(cls, password: str) -> str | None:
+        """
+        Новый хеш пароля по текущим настройкам в пуле процессов. Если пул перегружен, то вернет None: перехеширование
+        откладывается до следующего входа, а не завершает вход ошибкой.
+        """
+        try:
+            return await cls.hash_pool.run(hashing.hash_password, password)
+        except hashing.PasswordHashPoolBusy:
+            return None
+
+    @classmethod
+    async def aget_password_hash(cls, password: str) -> str:
+        """
+        Хеширование пароля в пуле процессов, цикл событий не блокируется. Если пул перегружен, то вызовет
+        HTTP_503_SERVICE_UNAVAILABLE.
+        Args:
+            password: user password
+        Returns:
+            hashed password
+        """
+        try:
+            return await cls.hash_pool.run(hashing.hash_password, password)
+        except hashing.PasswordHashPoolBusy:
+            AuthExceptions.exc_password_hash_busy()
+
+    @classmethod
+    async def averify_password(cls, input_password: str, hashed_password: str) -> bool:
+        """
+        Проверка пароля в пуле процессов, цикл событий не блокируется. Если пул перегружен, то вызовет
+        HTTP_503_SERVICE_UNAVAILABLE.
+        Args:
+            input_password: input password
+            hashed_password: hash in database
+        Returns:
+            True if good
+        """
+        try:
+            return await cls.hash_pool.run(hashing.verify_password, input_password, hashed_password)
+        except hashing.PasswordHashPoolBusy:
+            AuthExceptions.exc_password_hash_busy()
+
     @classmethod
     def _create_token(
             cls,
@@ -60,17 +122,17 @@ class Authentication:
             current_time: datetime | None,
             ttl: timedelta | None,
             type_t: str = TypeToken.ACCESS.name
-    ) -> str:
+    ) -> tuple[str, dict[str, Any]]:
         """
         Создание JWT токена. По умолчанию создается access токен. По умолчанию время жизни токена указано в
-        переменных окружения.
+        переменных окружения. Подпись ключом get_jwt_keys(), подготовленным при запуске.
         Args:
             data: data for Payload
             current_time: Current time
             type_t: Access or Refresh of token type
             ttl: timedelta - время жизни токена
         Returns:
-            str: jwt token
+            str: jwt token, dict: payload токена (новый словарь на каждый вызов)
         """
         if not current_time:
             current_time = datetime.now(tz=timezone.utc)
@@ -85,34 +147,41 @@ class Authentication:
 
         nbf: datetime = data.get("not_before") if data.get("not_before") else current_time
         user_device: str = data.get("user_device") if data.get("user_device") else "no_device"
+        user: User = data.get("user_id")
 
         to_encode: dict[str, Any] = {
-            "sub": str(data.get("user_id").id) + "=" + user_device,  # субъект, которому выдан токен
+            "sub": str(user.id) + "=" + user_device,  # субъект, которому выдан токен
+            "uid": str(user.id),  # claims пользователя для режима AUTH_STATELESS
+            "is_staff": user.is_staff,
+            "is_superuser": user.is_superuser,
             "iss": settings.APPLICATION,  # издатель токена
             "exp": nbf + ttl if ttl else nbf + time_delta,  # время, когда токен станет невалидным
             "type": type_t,
-            "jti": jsonable_encoder(uuid4()),  # уникальный идентификатор токена
+            "jti": str(uuid4()),  # уникальный идентификатор токена
             "iat": current_time,  # время, в которое был выдан токен
             "nbf": nbf,  # время, с которого токен должен считаться действительным
         }
-        cls.payload_token = deepcopy(to_encode)
-        encode_jwt: str = jwt.encode(payload=to_encode, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-        return "JWT " + encode_jwt
+        encode_jwt: str = get_jwt_keys().encode(to_encode)  # PyJWT кодирует копию, to_encode не меняется
+        return "JWT " + encode_jwt, to_encode
 
     @classmethod
-    def create_access_token(cls, data: dict, current_time: datetime = None, ttl: timedelta = None) -> str:
+    def create_access_token(
+            cls, data: dict, current_time: datetime = None, ttl: timedelta = None
+    ) -> tuple[str, dict[str, Any]]:
         return cls._create_token(data=data, current_time=current_time, ttl=ttl)
 
     @classmethod
-    def create_refresh_token(cls, data: dict, current_time: datetime = None, ttl: timedelta = None) -> str:
+    def create_refresh_token(
+            cls, data: dict, current_time: datetime = None, ttl: timedelta = None
+    ) -> tuple[str, dict[str, Any]]:
         return cls._create_token(data=data, current_time=current_time, ttl=ttl, type_t=TypeToken.REFRESH.name)
 
     @staticmethod
     def __get_payload(token: str) -> dict:
         payload = dict()
         try:
-            payload: dict = jwt.decode(jwt=token, key=settings.SECRET_KEY, algorithms=settings.ALGORITHM)
-        except (jwt.ExpiredSignatureError, jwt.DecodeError):
+            payload: dict = get_jwt_keys().decode(token)
+        except jwt.InvalidTokenError:  # в том числе истекший и еще не действующий (nbf) токен
             AuthExceptions.exc_jwt_decode_error()
         return payload
 
@@ -120,16 +189,24 @@ class Authentication:
     def verify_access_token(cls, token: str) -> dict:
         """
         Проверяет действительность access токена. Возвращает полезную нагрузку токена в виде словаря либо вызывает
-        ошибку аутентификации.
+        ошибку аутентификации. Проверенные токены кешируются в verified_token_cache до их exp: повторная проверка того
+        же токена - хеш и поиск в словаре вместо проверки подписи.
         Args:
             token: str: token without JWT
         Returns:
             dict: payload
         """
+        digest: bytes = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached: dict | None = verified_token_cache.get(digest)
+        if cached is not None:
+            return dict(cached)
+
         payload: dict = Authentication.__get_payload(token)
         if payload.get("type") != TypeToken.ACCESS.name:
             AuthExceptions.exc_invalid_token_type()
 
+        if "exp" in payload:  # без exp токен не кешируется: запись должна истечь вместе с токеном
+            verified_token_cache.set(digest, dict(payload), ttl=payload["exp"] - time.time())
         return payload
 
     @classmethod
@@ -149,58 +226,94 @@ class Authentication:
         return payload
 
 
-class IsAuthenticate:
-    def __init__(self, request: Request, authorization_header: str, refresh: bool = False):
-        self.request = request
-        self.request.state.user = None
-        self.authorization_header = authorization_header
-        self.refresh = refresh
+AUTH_ERROR_SCOPE_KEY = "auth_error"  # ошибка проверки токена в AuthenticationMiddleware, поднимается зависимостью
+JWT_PREFIX = "JWT "
 
-    def _check_headers(self) -> None:
-        AuthExceptions.exc_authorization_header_not_exist(self.authorization_header)
-        AuthExceptions.exc_jwt_not_exist(self.authorization_header)
-        return
-
-    def _authenticate(self) -> None:
-        """
-        Устанавливает пользователя в Request.state или вызывает ошибку: HTTP_403_FORBIDDEN
-        Returns:
-            None
-        """
-        clear_token: str = self.authorization_header.replace("JWT ", "")
-        payload: dict = Authentication.verify_access_token(clear_token) if not self.refresh else \
-            Authentication.verify_refresh_token(clear_token)
 
-        jti = UUID(payload["jti"])
-        user: User | None = UserCRUD.get_user_by_jti_token(uuid_jti=jti, refresh=self.refresh)
-        AuthExceptions.exc_user_not_exist(user)
-        self.request.state.user = user
+def _user_from_claims(payload: dict, jti: UUID) -> UserClaimsSchema | None:
+    """
+    Режим AUTH_STATELESS: пользователь из claims access токена, отзыв проверяется по revoked_access_jti. Вернет None,
+    если проверить токен без БД нельзя (фильтр устарел, нет claims).
+    """
+    if not revoked_access_jti.ready or "uid" not in payload:
         return None
+    if jti in revoked_access_jti:
+        AuthExceptions.exc_jwt_decode_error()
+    return UserClaimsSchema(
+        id=payload["uid"], is_staff=payload.get("is_staff", False), is_superuser=payload.get("is_superuser", False)
+    )
 
-    def is_authenticate(self) -> bool:
-        """
-        Вернет True или вызовет HTTP ошибку.
-        """
-        self._check_headers()
-        self._authenticate()
+
+async def authenticate_token(
+        db: AsyncSession, header: str | None, refresh: bool = False
+) -> tuple[User | UserClaimsSchema, str | None]:
+    """
+    Проверяет токен из заголовка ("JWT <token>") и находит его пользователя. Вызывается один раз на запрос из
+    JWTAuthenticationBackend. Ошибки - HTTPException из AuthExceptions (401, 403).
+    Args:
+        db: session; соединение берется, только если пользователя нет в jti_user_cache
+        header: значение заголовка Authorization или Refresh_token
+        refresh: refresh токен
+    Returns:
+        пользователь (User или claims в режиме AUTH_STATELESS), устройство токена или None
+    """
+    AuthExceptions.exc_authorization_header_not_exist(header)
+    AuthExceptions.exc_jwt_not_exist(header)
+    token: str = header[len(JWT_PREFIX):]
+    payload: dict = Authentication.verify_refresh_token(token) if refresh else \
+        Authentication.verify_access_token(token)
+
+    jti = UUID(payload["jti"])
+    if settings.AUTH_STATELESS and not refresh:
+        claims_user = _user_from_claims(payload, jti)
+        if claims_user is not None:
+            return claims_user, None
+
+    user, device_id = await UserCRUD.get_user_by_jti_token(db, uuid_jti=jti, refresh=refresh, exp=payload.get("exp"))
+    AuthExceptions.exc_user_not_exist(user)
+    return user, device_id
+
+
+def _require_scope(request: Request, scope: str) -> bool:
+    """
+    Пользователь уже установлен AuthenticationMiddleware (request.user, request.auth), здесь только проверка.
+    """
+    if scope in request.auth.scopes:
         return True
+    error: HTTPException | None = request.scope.get(AUTH_ERROR_SCOPE_KEY)
+    if error is not None:
+        raise error
+    AuthExceptions.exc_jwt_decode_error()
 
 
-def is_authenticate(request: Request, header: str = Depends(TypeToken.ACCESS.value)) -> bool:
+async def is_authenticate(request: Request, header: str = Depends(TypeToken.ACCESS.value)) -> bool:
     """
     Использовать для апи, в которых нужна аутентификация. Вернет True или вызовет ошибку аутентификации.
     Args:
         request: Request
-        header: token in the header (access_token)
+        header: token in the header (access_token), для документации OpenAPI; проверен в AuthenticationMiddleware
     Returns:
         True if token is valid else raises exception
     """
-    return IsAuthenticate(request, header).is_authenticate()
+    return _require_scope(request, "access")
 
 
-def refresh_tokens(request: Request, header: str = Depends(TypeToken.REFRESH.value)) -> bool:
+async def refresh_tokens(request: Request, header: str = Depends(TypeToken.REFRESH.value)) -> bool:
     """
     Предназначено для обновления токенов. В заголовке использовать имя 'Refresh_token'. Соответственно должен быть
-    получен refresh токен.
+    получен refresh токен. Путь должен быть в AUTH_REFRESH_PATHS.
     """
-    return IsAuthenticate(request, header, refresh=True).is_authenticate()
+    return _require_scope(request, "refresh")
+
+
+async def refresh_revoked_tokens(interval: float) -> None:
+    """
+    Фоновая задача режима AUTH_STATELESS: раз в interval секунд перезагружает отозванные jti access токенов.
+    Запускается из lifespan приложения.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await TokenCRUD.load_revoked_access_jti()
+        except Exception:
+            logger.exception("Не удалось обновить список отозванных токенов")
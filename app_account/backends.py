@@ -0,0 +1,78 @@
+"""
+Аутентификация в AuthenticationMiddleware: заголовок с токеном разбирается и проверяется один раз на запрос,
+обработчики и зависимости получают готовые request.user и request.auth.
+
+Публичные пути (AUTH_PUBLIC_PATHS) не проверяются совсем. Ошибка проверки токена не прерывает запрос: она
+сохраняется в scope и поднимается зависимостью is_authenticate / refresh_tokens только на защищенных маршрутах.
+"""
+from uuid import UUID
+
+from fastapi import HTTPException
+from starlette.authentication import AuthCredentials, AuthenticationBackend, BaseUser
+from starlette.requests import HTTPConnection
+
+from app_account.auth import AUTH_ERROR_SCOPE_KEY, TypeToken, authenticate_token
+from app_account.models import User
+from app_account.schemas import UserClaimsSchema
+from core.database import request_session
+
+
+class AuthenticatedUser(BaseUser):
+    """
+    Пользователь запроса: модель User или claims токена (режим AUTH_STATELESS) и устройство токена.
+    """
+
+    def __init__(self, instance: User | UserClaimsSchema, device_id: str | None = None):
+        self.instance = instance
+        self.device_id = device_id  # устройство, на которое выдан токен; None в режиме AUTH_STATELESS
+
+    @property
+    def id(self) -> UUID:
+        return self.instance.id
+
+    @property
+    def is_staff(self) -> bool:
+        return self.instance.is_staff
+
+    @property
+    def is_superuser(self) -> bool:
+        return self.instance.is_superuser
+
+    @property
+    def is_authenticated(self) -> bool:
+        return True
+
+    @property
+    def display_name(self) -> str:
+        return str(self.instance.id)
+
+
+class JWTAuthenticationBackend(AuthenticationBackend):
+    """
+    Backend для starlette AuthenticationMiddleware. На путях refresh_paths проверяется refresh токен из заголовка
+    Refresh_token, на остальных - access токен из Authorization.
+    """
+
+    def __init__(self, public_paths: tuple[str, ...] = (), refresh_paths: tuple[str, ...] = ()):
+        self.public_paths = tuple(public_paths)
+        self.refresh_paths = frozenset(refresh_paths)
+
+    async def authenticate(self, conn: HTTPConnection) -> tuple[AuthCredentials, BaseUser] | None:
+        path: str = conn.scope["path"]
+        if path.startswith(self.public_paths):
+            return None
+
+        refresh = path in self.refresh_paths
+        header = conn.headers.get(TypeToken.REFRESH.value.model.name if refresh else TypeToken.ACCESS.value.model.name)
+        if header is None:
+            return None  # без заголовка ответит зависимость маршрута (APIKeyHeader)
+
+        try:
+            # сессия запроса, её продолжит get_async_db; соединение берется только при промахе jti_user_cache
+            async with request_session(conn.scope) as db:
+                user, device_id = await authenticate_token(db, header, refresh=refresh)
+        except HTTPException as exc:
+            conn.scope[AUTH_ERROR_SCOPE_KEY] = exc
+            return None
+        scopes = ["authenticated", "refresh" if refresh else "access"]
+        return AuthCredentials(scopes), AuthenticatedUser(user, device_id)
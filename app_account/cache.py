@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+from core.config import settings
+
+
+class TTLCache:
+    """
+    LRU-кеш ограниченного размера с временем жизни каждой записи. Записи можно помечать тегами и удалять по тегу.
+    Рассчитан на работу внутри одного цикла событий, блокировок нет.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any, tuple]] = OrderedDict()
+        self._tags: dict[Hashable, set[Hashable]] = dict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any | None:
+        """
+        Вернет значение по ключу либо None, если записи нет или истекло время ее жизни.
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value, _ = item
+        if expires <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None, tags: Iterable[Hashable] = ()) -> None:
+        """
+        Сохраняет значение. Время жизни записи не больше ttl кеша.
+        Args:
+            key: ключ
+            value: значение
+            ttl: секунд жизни записи, если нужно меньше ttl кеша
+            tags: теги для удаления записи через invalidate_tag
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        if key in self._data:
+            self._remove(key)
+
+        tags = tuple(tags)
+        self._data[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._data) > self.max_size:
+            self._remove(next(iter(self._data)))
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        """
+        Удаляет все записи, помеченные тегом.
+        """
+        for key in self._tags.pop(tag, ()):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key: Hashable) -> None:
+        item = self._data.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+# jti access токена -> пользователь. Кеш свой у каждого процесса: деактивация токена в другом воркере станет видна
+# здесь не позже, чем через JTI_CACHE_TTL_SECONDS.
+jti_user_cache = TTLCache(max_size=settings.JTI_CACHE_MAX_SIZE, ttl=settings.JTI_CACHE_TTL_SECONDS)
+
+# хеш access токена -> проверенная полезная нагрузка. Запись живет не дольше exp токена, поэтому попадание в кеш
+# заменяет проверку подписи и срока действия; отзыв токена проверяется отдельно (по jti).
+verified_token_cache = TTLCache(max_size=settings.JWT_CACHE_MAX_SIZE, ttl=settings.JWT_CACHE_TTL_SECONDS)
+
+
+class RevokedTokenFilter:
+    """
+    Множество отозванных (is_active=False), но ещё не истекших jti. Используется в режиме AUTH_STATELESS вместо
+    запроса к БД на каждый запрос. Периодически полностью перезагружается из таблицы токенов, токены отозванные в
+    этом процессе добавляются сразу. Если данные старше max_age секунд, то фильтр считается неготовым.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age: float = max_age
+        self._revoked: set = set()
+        self._added_during_load: set = set()
+        self._loaded_at: float | None = None
+
+    def __contains__(self, jti: Hashable) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    def begin_load(self) -> None:
+        """ Вызывается перед запросом к БД, чтобы не потерять jti, отозванные во время загрузки. """
+        self._added_during_load = set()
+
+    def replace(self, jti_set: Iterable[Hashable]) -> None:
+        self._revoked = set(jti_set) | self._added_during_load
+        self._added_during_load = set()
+        self._loaded_at = time.monotonic()
+
+    def add(self, jti_set: Iterable[Hashable]) -> None:
+        for jti in jti_set:
+            self._revoked.add(jti)
+            self._added_during_load.add(jti)
+
+
+# Данные старше трех интервалов обновления не используются: аутентификация вернется к проверке по БД
+revoked_access_jti = RevokedTokenFilter(max_age=settings.REVOCATION_REFRESH_SECONDS * 3)
@@ -1,81 +1,90 @@
 from datetime import datetime, timedelta
 from uuid import UUID
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-from typing import Optional, Any
+from sqlalchemy import select, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
-from core.database import SessionLocal
+from core.pagination import PageParams, decode_cursor, keyset, split_page, estimate_count
+from core.serialization import validate
 from .constants import DEFAULT_USER_DEVICE
-from .crud import TokenCRUD
+from .crud import TokenCRUD, UserCRUD
 from .excepions import AuthExceptions
 from .models import User, AssignedJWTAccessToken, AssignedJWTRefreshToken
 from .auth import Authentication, TypeToken
-from .schemas import FullUserSchema, UserIdSchema, AuthUserSchema, AcTokenSchema, ReTokenSchema
-
-
-def get_session():
-    return SessionLocal()
+from .schemas import FullUserSchema, UserIdSchema, AuthUserSchema, AcTokenSchema, ReTokenSchema, UsersPageSchema
 
 
 class UserCommon:
 
     @classmethod
-    def get_user_or_none(cls, user_email: str) -> Optional[User]:
+    async def get_user_or_none(cls, db: AsyncSession, user_email: str) -> Optional[User]:
         """
         Возвращает экземпляр пользователя по его email либо None.
         Args:
+            db: session of the request
             user_email: email of user
         Returns:
             User or None
         """
         query_ = select(User).where(User.email == user_email)
-        user: User = cls._session_to_receive_user(query_)
+        user: User = await cls._session_to_receive_user(db, query_)
         return user
 
     @classmethod
-    def get_user_by_id_or_none(cls, user_id: UUID) -> Optional[User]:
+    async def get_user_by_id_or_none(cls, db: AsyncSession, user_id: UUID) -> Optional[User]:
         """
         Возвращает экземпляр пользователя по его id либо None.
         Args:
+            db: session of the request
             user_id: id of the user
         Returns:
             User or None
         """
         query_ = select(User).where(User.id == user_id)
-        user: User = cls._session_to_receive_user(query_)
+        user: User = await cls._session_to_receive_user(db, query_)
         return user
 
     @classmethod
-    def authenticate_user(cls, username: str, password: str) -> Optional[User]:
+    async def authenticate_user(cls, db: AsyncSession, username: str, password: str) -> Optional[User]:
         """
         Получает пользователя по переданному username. Если пользователь существует и переданный пароль совпадает,
-        то возвращает экземпляр пользователя.
+        то возвращает экземпляр пользователя. Хеш с устаревшими схемой или стоимостью заменяется новым.
         Args:
+            db: session of the request
             username: input username
             password: input password
         Returns:
             instance User model or None
         """
         query_ = select(User).where(User.username == username)
-        user: User = cls._session_to_receive_user(query_)
-        if not user or Authentication.verify_password(input_password=password, hashed_password=user.password) is False:
+        user: User = await cls._session_to_receive_user(db, query_)
+        if not user:
+            return None
+        # завершает транзакцию чтения: на время проверки пароля соединение возвращается в пул
+        await db.commit()
+        verified: bool = await Authentication.averify_password(input_password=password, hashed_password=user.password)
+        if verified is False:
             return None
+        if Authentication.password_needs_update(user.password):
+            # хеш с прежними схемой или стоимостью: пароль известен только сейчас, поэтому перехеширование при входе
+            hashed_password: str | None = await Authentication.arehash_password(password)
+            if hashed_password is not None:
+                await UserCRUD.update_password_hash(db, user, hashed_password)
         return user
 
     @staticmethod
-    def _session_to_receive_user(query_) -> Optional[User]:
+    async def _session_to_receive_user(db: AsyncSession, query_) -> Optional[User]:
         """
         Возвращает экземпляр пользователя либо None.
         Args:
+            db: session of the request
             query_: select from sqlalchemy
         Returns:
             instance User model
         """
-        session = get_session()
-        with session as ses:
-            resp = ses.execute(query_)
-            instance: Optional[User] = resp.scalar_one_or_none()
+        resp = await db.execute(query_)
+        instance: Optional[User] = resp.scalar_one_or_none()
 
         return instance
 
@@ -84,11 +93,13 @@ class TokenCommon:
 
     def __init__(
             self,
+            db: AsyncSession,
             user_verified: User,
             user: AuthUserSchema,
             current_time: datetime | None = None,
             ttl: timedelta | None = None  # время жизни токена, если нужно отличное от значения в переменной окружения
     ):
+        self.session: AsyncSession = db  # сессия запроса
         self.user_verified: User = user_verified
         self.user_schema: AuthUserSchema = user
         self.current_time: datetime | None = current_time
@@ -109,34 +120,20 @@ class TokenCommon:
             token_model = AssignedJWTRefreshToken
         return token_model if token_model is not None else AuthExceptions.exc_type_token_error()
 
-    def _deactivate_current_user_tokens(self, payload_token: dict) -> None:
-        token_model: AssignedJWTAccessToken | AssignedJWTRefreshToken = self._get_token_model(
-            token_type=payload_token["type"]
-        )
-        user_device: str = self.user_schema.device_id if self.user_schema.device_id else DEFAULT_USER_DEVICE
-
-        TokenCRUD.deactivate_token(token_model, self.user_verified, user_device)
-        return
+    def _get_user_device(self) -> str:
+        return self.user_schema.device_id if self.user_schema.device_id else DEFAULT_USER_DEVICE
 
-    def _insert_user_token(self, payload_token: dict) -> None:
+    def _validate_token_data(self, payload_token: dict) -> AcTokenSchema | ReTokenSchema:
         token_model = self._get_token_model(token_type=payload_token["type"])
         payload_token.update({"user_id": self.user_verified})
 
         if self.user_schema.device_id:
             payload_token.update({"device_id": self.user_schema.device_id})
 
-        validator = AcTokenSchema if isinstance(token_model, AssignedJWTAccessToken) else ReTokenSchema
+        validator = AcTokenSchema if token_model is AssignedJWTAccessToken else ReTokenSchema
         valid_data = validator.model_validate(payload_token)
         valid_data.is_active = True
-
-        TokenCRUD.insert_token(token_model=token_model, data=valid_data)
-        return
-
-    def _deactivate_and_insert(self) -> None:
-        payload_token: dict[str, Any] = Authentication.payload_token
-        self._deactivate_current_user_tokens(payload_token)
-        self._insert_user_token(payload_token)
-        return
+        return valid_data
 
     def _prepare_data(self) -> dict:
         data = {
@@ -146,50 +143,77 @@ class TokenCommon:
         }
         return data
 
-    def get_access_token(self) -> str:
-        payload_data: dict = self._prepare_data()
-        access_token: str = Authentication.create_access_token(
-            data=payload_data, current_time=self.current_time, ttl=self.ttl
+    async def get_access_token(self) -> str:
+        """
+        Выдает только access токен: прежний access токен устройства деактивируется, refresh токен остается
+        (TokenCRUD.issue_tokens без refresh).
+        """
+        access, access_payload = Authentication.create_access_token(
+            data=self._prepare_data(), current_time=self.current_time, ttl=self.ttl
         )
-        self._deactivate_and_insert()
-        return access_token
+        access_data = self._validate_token_data(access_payload)
+
+        await TokenCRUD.issue_tokens(self.session, self.user_verified, self._get_user_device(), access_data)
+        return access
 
-    def get_refresh_token(self) -> str:
+    async def get_tokens(self) -> tuple[str, str]:
+        """
+        Выдает пару токенов. Деактивация прежних токенов устройства и сохранение новых выполняются одной
+        транзакцией (TokenCRUD.issue_tokens).
+        """
         payload_data: dict = self._prepare_data()
-        refresh_token: str = Authentication.create_refresh_token(
+        access, access_payload = Authentication.create_access_token(
+            data=payload_data, current_time=self.current_time, ttl=self.ttl
+        )
+        access_data = self._validate_token_data(access_payload)
+        refresh, refresh_payload = Authentication.create_refresh_token(
             data=payload_data, current_time=self.current_time, ttl=self.ttl
         )
-        self._deactivate_and_insert()
-        return refresh_token
+        refresh_data = self._validate_token_data(refresh_payload)
 
-    def get_tokens(self) -> tuple[str, str]:
-        access: str = self.get_access_token()
-        refresh: str = self.get_refresh_token()
+        await TokenCRUD.issue_tokens(
+            self.session, self.user_verified, self._get_user_device(), access_data, refresh_data
+        )
         return access, refresh
 
 
 class UserCommonBase:
 
-    def __init__(self, db: Session):
-        self.session: Session = db  # ожидается сессия от database.py
+    def __init__(self, db: AsyncSession):
+        self.session: AsyncSession = db  # ожидается сессия от database.py
 
-    def show_all_users(self):
-        session = get_session()
-        query_ = select(User)
-        with session as ses:
-            resp = ses.execute(query_)
-            result = resp.scalars().all()
-            users = [FullUserSchema.model_validate(row, from_attributes=True) for row in result]
-        return users
+    async def show_all_users(self, params: PageParams) -> UsersPageSchema:
+        """
+        Страница пользователей в порядке регистрации (keyset по (created, id)).
+        Args:
+            params: limit, курсор after, нужна ли примерная общая численность
+        Returns:
+            UsersPageSchema
+        """
+        columns = (User.created, User.id)
+        after = decode_cursor(params.after, (datetime.fromisoformat, UUID)) if params.after else None
+        resp = await self.session.execute(keyset(select(User), columns, after, params.limit))
+        rows, next_cursor = split_page(resp.scalars().all(), columns, params.limit)
 
-    def show_full_user(self, user_id: UUID):
-        resp = self.session.execute(select(User).where(User.id == user_id))
+        total = await estimate_count(self.session, User.__tablename__) if params.estimate_total else None
+        return validate(UsersPageSchema, {"items": rows, "next_cursor": next_cursor, "total_estimate": total})
+
+    @staticmethod
+    def export_query() -> Select:
+        """ Колонки выгрузки пользователей (без пароля) в порядке регистрации. """
+        return select(
+            User.id, User.username, User.email, User.first_name, User.last_name, User.created, User.updated,
+            User.is_active, User.is_staff, User.is_superuser
+        ).order_by(User.created, User.id)
+
+    async def show_full_user(self, user_id: UUID):
+        resp = await self.session.execute(select(User).where(User.id == user_id))
         result = resp.scalars().all()
         user = FullUserSchema.model_validate(result[0])
         return user
 
-    def get_user_by_id(self, user_id: UUID):
-        resp = self.session.execute(select(User).where(User.id == user_id))
+    async def get_user_by_id(self, user_id: UUID):
+        resp = await self.session.execute(select(User).where(User.id == user_id))
         result = resp.first()
         user = UserIdSchema.model_validate(result[0], from_attributes=True)
         return user
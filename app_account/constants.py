@@ -2,3 +2,6 @@ from typing import Final
 
 
 DEFAULT_USER_DEVICE: Final[str] = "Не указано"
+
+# ключ pg_advisory_lock: обслуживание партиций таблиц токенов выполняет только один процесс
+TOKEN_PARTITION_LOCK_KEY: Final[int] = 52_018_001
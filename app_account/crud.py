@@ -1,32 +1,23 @@
-from contextlib import contextmanager
+import time
+from datetime import datetime
 from typing import Optional
 from uuid import UUID
 
-from sqlalchemy import update, select
+from sqlalchemy import select, delete, func, or_, update
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import SessionLocal
-from .models import User, AssignedJWTAccessToken, AssignedJWTRefreshToken
+from core.response_cache import response_cache
+from .cache import jti_user_cache, revoked_access_jti
+from .models import User
 from .schemas import UserRegisterSchema, AcTokenSchema, ReTokenSchema
+from .token_store import token_store
 
 
-class BaseCRUD:
-
-    @classmethod
-    @contextmanager
-    def _get_session_db(cls):
-        session = SessionLocal()
-        try:
-            yield session
-        finally:
-            session.close()
-
-
-class UserCRUD(BaseCRUD):
+class UserCRUD:
 
     @staticmethod
-    def register_user(db: Session, user: UserRegisterSchema) -> User:
+    async def register_user(db: AsyncSession, user: UserRegisterSchema) -> User:
         """
         Регистрация (создание) пользователя
         Args:
@@ -37,140 +28,177 @@ class UserCRUD(BaseCRUD):
         """
         instance = User(**user.model_dump())
         db.add(instance)
-        db.commit()
-        db.refresh(instance)
+        await db.commit()
+        await db.refresh(instance)
+        response_cache.invalidate_tag("users")
         return instance
 
     @staticmethod
-    def del_user(db: Session, user: User) -> None:
+    async def get_taken_usernames_emails(
+            db: AsyncSession, usernames: list[str], emails: list[str]
+    ) -> tuple[set[str], set[str]]:
+        """
+        Какие из переданных username и email уже заняты. Один запрос на пачку.
+        Args:
+            db: session
+            usernames: проверяемые username
+            emails: проверяемые email
+        Returns:
+            занятые username, занятые email
+        """
+        resp = await db.execute(
+            select(User.username, User.email).where(or_(User.username.in_(usernames), User.email.in_(emails)))
+        )
+        rows = resp.all()
+        return {row.username for row in rows}, {row.email for row in rows}
+
+    @staticmethod
+    async def bulk_insert_users(db: AsyncSession, users: list[dict]) -> set[str]:
+        """
+        Вставка пачки пользователей одним INSERT ... VALUES (...), (...) ON CONFLICT DO NOTHING RETURNING username.
+        Строки, которые заняли параллельно (после проверки), пропускаются. Коммит выполняет вызывающий.
+        Args:
+            db: session
+            users: значения колонок User, пароль уже захеширован
+        Returns:
+            username вставленных пользователей
+        """
+        stmt = insert(User).on_conflict_do_nothing().returning(User.username)
+        resp = await db.execute(stmt, users, execution_options={"insertmanyvalues_page_size": len(users)})
+        response_cache.invalidate_tag("users")
+        return set(resp.scalars().all())
+
+    @staticmethod
+    async def del_user(db: AsyncSession, user: User) -> None:
         """
-        Удаление пользователя
+        Удаление пользователя. Токены пользователя удаляются каскадно на стороне БД (ondelete="CASCADE"), поэтому
+        связи не загружаются.
         Args:
-            db: Session from get_db()
+            db: AsyncSession from get_async_db()
             user: instance User model
         """
-        db.delete(user)
-        db.commit()
+        active_jti: list[UUID] = await token_store.revoke_user(db, user.id)
+        await db.execute(delete(User).where(User.id == user.id))
+        await db.commit()
+        jti_user_cache.invalidate_tag(user.id)
+        revoked_access_jti.add(active_jti)
+        response_cache.invalidate_tag("users")
+        response_cache.invalidate_tag(("user", user.id))
         return
 
+    @staticmethod
+    async def update_password_hash(db: AsyncSession, user: User, hashed_password: str) -> bool:
+        """
+        Заменяет хеш пароля, если он не изменился с момента чтения пользователя (пароль могли сменить параллельно).
+        Args:
+            db: AsyncSession from get_async_db()
+            user: instance User model с прежним хешем
+            hashed_password: новый хеш того же пароля
+        Returns:
+            True, если хеш заменен
+        """
+        resp = await db.execute(
+            update(User).where(User.id == user.id, User.password == user.password).values(password=hashed_password)
+        )
+        await db.commit()
+        if resp.rowcount == 0:
+            return False
+        user.password = hashed_password
+        return True
+
+    @staticmethod
+    async def get_users_validator(db: AsyncSession) -> tuple:
+        """
+        Валидатор кеша списка пользователей: число пользователей и max(updated). Меняется при добавлении, удалении
+        и изменении пользователя.
+        """
+        resp = await db.execute(select(func.count(), func.max(User.updated)).select_from(User))
+        return tuple(resp.one())
+
+    @staticmethod
+    async def get_user_validator(db: AsyncSession, user_id: UUID) -> datetime | None:
+        """
+        Валидатор кеша профиля: updated пользователя, None - пользователя нет.
+        """
+        resp = await db.execute(select(User.updated).where(User.id == user_id))
+        return resp.scalar_one_or_none()
+
     @classmethod
-    def get_user_by_jti_token(cls, uuid_jti: UUID, refresh: bool = False) -> Optional[User]:
+    async def get_user_by_jti_token(
+            cls,
+            db: AsyncSession,
+            uuid_jti: UUID,
+            refresh: bool = False,
+            exp: int | None = None
+    ) -> tuple[Optional[User], Optional[str]]:
         """
-        Вернет пользователя по идентификатору токена сохраненного в БД, либо ничего.
+        Вернет пользователя и устройство по идентификатору активного токена из хранилища токенов (TOKEN_STORE), либо
+        (None, None). Для access токенов результат кешируется в jti_user_cache не дольше, чем до окончания действия
+        токена. Refresh токены всегда проверяются по хранилищу.
         Args:
+            db: session of the request
             uuid_jti: token jti from payload
             refresh: refresh or not
+            exp: token exp from payload (timestamp)
         Returns:
-            Instance of User or None
-        """
-        if refresh:
-            stmt = (
-                select(User).
-                join(
-                    User.refresh_tokens
-                ).
-                where(
-                    AssignedJWTRefreshToken.jti == uuid_jti,
-                    AssignedJWTRefreshToken.is_active == True
-                ).
-                options(
-                    contains_eager(
-                        User.refresh_tokens
-                    )
-                )
-            )
-        else:
-            stmt = (
-                select(User).
-                join(
-                    User.access_tokens
-                ).
-                where(
-                    AssignedJWTAccessToken.jti == uuid_jti,
-                    AssignedJWTAccessToken.is_active == True
-                ).
-                options(
-                    contains_eager(
-                        User.access_tokens
-                    )
-                )
-            )
-
-        with cls._get_session_db() as db:
-            user: User | None = db.execute(stmt).unique().scalar_one_or_none()
-
-        return user
-
-
-class TokenCRUD(BaseCRUD):
+            Instance of User or None, device_id or None
+        """
+        if not refresh:
+            cached: tuple[User, str] | None = jti_user_cache.get(uuid_jti)
+            if cached is not None:
+                return cached
+
+        found: tuple[User, str] | None = await token_store.find(db, uuid_jti, refresh=refresh, exp=exp)
+        if found is None:
+            return None, None
+
+        user, device_id = found
+        if not refresh:
+            ttl: float | None = exp - time.time() if exp is not None else None
+            jti_user_cache.set(uuid_jti, found, ttl=ttl, tags=(user.id, (user.id, device_id)))
+        return user, device_id
 
-    @classmethod
-    def _update_insert_session_db(cls, stmt) -> None:
-        with cls._get_session_db() as db:
-            db.execute(stmt)
-            db.commit()
-        return None
+
+class TokenCRUD:
+    """
+    Операции с токенами через хранилище token_store (TOKEN_STORE) и обновление кеша jti -> пользователь и фильтра
+    отозванных токенов в этом процессе.
+    """
 
     @classmethod
-    def deactivate_token(
-            cls,
-            token_model: AssignedJWTAccessToken | AssignedJWTRefreshToken,
-            user_verified: User,
-            user_device: str
-    ) -> None:
+    async def load_revoked_access_jti(cls) -> None:
         """
-        Обновляет (деактивирует) имеющиеся токены соответствующей модели конкретного пользователя с привязкой к
-        устройству пользователя. Значения колонки is_active устанавливаются в False.
-        Args:
-            token_model: модель токена
-            user_verified: Экземпляр пользователя верифицированный
-            user_device: str: Устройство пользователя
+        Перезагружает revoked_access_jti: jti отозванных, но ещё не истекших access токенов. Вызывается вне запроса.
         Returns:
             None
         """
-        stmt = (
-            update(
-                token_model
-            ).
-            where(
-                token_model.user_id == user_verified.id,
-                token_model.device_id == user_device,
-                token_model.is_active
-            ).
-            values(
-                is_active=False
-            )
-        )
-        cls._update_insert_session_db(stmt)
+        revoked_access_jti.begin_load()
+        jti_set: set[UUID] = await token_store.revoked_access_jti()
+        revoked_access_jti.replace(jti_set)
         return
 
     @classmethod
-    def insert_token(
+    async def issue_tokens(
             cls,
-            token_model: AssignedJWTAccessToken | AssignedJWTRefreshToken,
-            data: AcTokenSchema | ReTokenSchema
+            db: AsyncSession,
+            user_verified: User,
+            user_device: str,
+            access: AcTokenSchema,
+            refresh: ReTokenSchema | None = None
     ) -> None:
         """
-        Вставка одной записи в соответствующую таблицу модели токена. Данные для вставки принимаются от соответствующей
-        pydentic модели.
+        Выдача пары токенов: атомарно деактивирует имеющиеся access и refresh токены пользователя на устройстве и
+        сохраняет новые (TokenStore.issue).
         Args:
-            token_model: модель токена
-            data: данные для наполнения
+            db: session of the request
+            user_verified: Экземпляр пользователя верифицированный
+            user_device: str: Устройство пользователя
+            access: данные access токена
+            refresh: данные refresh токена, None - заменяется только access токен
         Returns:
             None
         """
-        stmt = (
-            insert(
-                token_model
-            ).
-            values(
-                jti=data.jti,
-                is_active=data.is_active,
-                expired_time=data.expired_time,
-                device_id=data.device_id,
-                user_id=data.user_id.id
-            )
-        )
-        cls._update_insert_session_db(stmt)
+        deactivated: list[UUID] = await token_store.issue(db, user_verified.id, user_device, access, refresh)
+        jti_user_cache.invalidate_tag((user_verified.id, user_device))
+        revoked_access_jti.add(deactivated)
         return
-
@@ -1,3 +1,6 @@
+import math
+from datetime import datetime
+
 from fastapi import HTTPException, status
 
 from app_account.models import User
@@ -31,6 +34,17 @@ class UserExceptions(AccountBaseException):
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Неверное имя пользователя или пароль')
 
+    @classmethod
+    def exc_user_not_found(cls, user_updated: datetime | None):
+        """
+        Поднимает исключение, если пользователя нет (валидатор кеша профиля None).\n
+        raise HTTPException, status.HTTP_404_NOT_FOUND
+        Args:
+            user_updated: updated пользователя or None
+        """
+        if user_updated is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
+
 
 class AuthExceptions(AccountBaseException):
     @classmethod
@@ -60,7 +74,7 @@ class AuthExceptions(AccountBaseException):
         Args:
             authorization_header: Authorization in headers
         """
-        if 'JWT ' not in authorization_header:
+        if not authorization_header.startswith('JWT '):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Token not found')
 
     @classmethod
@@ -82,6 +96,28 @@ class AuthExceptions(AccountBaseException):
         if not user:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Ошибка аутентификации')
 
+    @classmethod
+    def exc_password_hash_busy(cls):
+        """
+        Поднимает исключение, если пул хеширования паролей перегружен.\n
+        raise HTTPException, status.HTTP_503_SERVICE_UNAVAILABLE
+        """
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Сервис перегружен, повторите позже')
+
+    @classmethod
+    def exc_too_many_login_attempts(cls, retry_after: float):
+        """
+        Поднимает исключение, если превышена частота попыток входа.\n
+        raise HTTPException, status.HTTP_429_TOO_MANY_REQUESTS
+        Args:
+            retry_after: секунд до следующей разрешенной попытки
+        """
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Слишком много попыток входа, повторите позже',
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
     @classmethod
     def exc_type_token_error(cls):
         """ Для внутреннего использования. Типизация наименований токенов. """
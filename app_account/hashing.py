@@ -0,0 +1,224 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable
+
+from passlib.context import CryptContext
+
+from core.config import settings
+
+
+PWD_SCHEMES: tuple[str, ...] = ("bcrypt", "argon2")
+# нижние границы калибровки: стоимость не опускается ниже ради времени ответа
+BCRYPT_MIN_ROUNDS = 10
+ARGON2_MIN_TIME_COST = 2
+
+
+def make_pwd_context(
+        scheme: str, bcrypt_rounds: int, argon2_time_cost: int, argon2_memory_cost: int, argon2_parallelism: int
+) -> CryptContext:
+    """
+    Новые пароли хешируются схемой scheme с заданной стоимостью. Хеши другой схемы или с другой стоимостью
+    проверяются, но needs_update для них True: они перехешируются при входе (UserCommon.authenticate_user).
+    Args:
+        scheme: bcrypt | argon2 (нужен argon2-cffi)
+        bcrypt_rounds: log2 числа раундов bcrypt
+        argon2_time_cost: число проходов argon2id
+        argon2_memory_cost: память argon2id, КиБ
+        argon2_parallelism: число потоков argon2id
+    Returns:
+        CryptContext
+    """
+    return CryptContext(
+        schemes=[scheme] + [name for name in PWD_SCHEMES if name != scheme],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+# Модуль импортируется в дочерних процессах пула, поэтому из приложения здесь только настройки
+pwd_context = make_pwd_context(
+    settings.PWD_HASH_SCHEME,
+    bcrypt_rounds=settings.PWD_BCRYPT_ROUNDS,
+    argon2_time_cost=settings.PWD_ARGON2_TIME_COST,
+    argon2_memory_cost=settings.PWD_ARGON2_MEMORY_COST,
+    argon2_parallelism=settings.PWD_ARGON2_PARALLELISM,
+)
+
+
+def hash_password(password: str) -> str:
+    """ Выполняется в процессе пула. """
+    return pwd_context.hash(password)
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """ Выполняется в процессе пула: пачка паролей за один вызов, меньше передачи данных между процессами. """
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def verify_password(input_password: str, hashed_password: str) -> bool:
+    """ Выполняется в процессе пула. """
+    return pwd_context.verify(input_password, hashed_password)
+
+
+class PasswordHashPoolBusy(Exception):
+    """ Очередь пула хеширования переполнена либо истекло время ожидания в очереди. """
+    pass
+
+
+class PasswordHashPool:
+    """
+    Ограниченный пул процессов для bcrypt. Хеширование занимает CPU и удерживает GIL, поэтому выполняется вне
+    процесса воркера: цикл событий не блокируется, а нагрузка распределяется по ядрам.
+
+    В работе одновременно находится не более size вызовов, ещё не более queue_size ожидают в очереди. Если очередь
+    заполнена или ожидание в ней дольше timeout секунд, то поднимается PasswordHashPoolBusy.
+    """
+
+    def __init__(self, size: int, queue_size: int, timeout: float):
+        self.size: int = size
+        self.queue_size: int = queue_size
+        self.timeout: float = timeout
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._queued: int = 0
+        self._in_flight: int = 0
+
+    def start(self) -> None:
+        """
+        Создает пул процессов. Вызывается при старте приложения, иначе при первом обращении.
+        """
+        if self._executor is not None:
+            return
+        # spawn: fork процесса с запущенным циклом событий и потоками небезопасен
+        self._executor = ProcessPoolExecutor(max_workers=self.size, mp_context=multiprocessing.get_context("spawn"))
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._queued = 0
+        self._in_flight = 0
+
+    def shutdown(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._semaphore = None
+
+    def stats(self) -> dict[str, int]:
+        """
+        Текущее состояние пула: размер, вызовы в очереди и в работе.
+        """
+        return {
+            "size": self.size,
+            "queue_size": self.queue_size,
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+        }
+
+    def _release(self, _: Future) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет func(*args) в процессе пула.
+        Args:
+            func: функция уровня модуля (передается в дочерний процесс через pickle)
+            args: аргументы функции
+        Returns:
+            результат func
+        """
+        self.start()
+        if self._semaphore.locked():
+            if self._queued >= self.queue_size:
+                raise PasswordHashPoolBusy("Очередь хеширования паролей переполнена")
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise PasswordHashPoolBusy("Истекло время ожидания в очереди хеширования паролей")
+            finally:
+                self._queued -= 1
+        else:
+            await self._semaphore.acquire()
+
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            future: Future = self._executor.submit(func, *args)
+        except BaseException:
+            self._in_flight -= 1
+            self._semaphore.release()
+            raise
+        # Слот освобождается, когда процесс действительно закончил работу, даже если запрос уже отменен
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        return await asyncio.wrap_future(future)
+
+
+def measure_hash(context: CryptContext, repeat: int = 3) -> float:
+    """ Медиана времени хеширования одного пароля, секунд. """
+    timings: list[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate(scheme: str, target: float, memory_cost: int, parallelism: int) -> tuple[dict[str, int], float]:
+    """
+    Наибольшая стоимость хеша, при которой хеширование на этой машине не дольше target секунд: для bcrypt - раунды,
+    для argon2id - time_cost при заданных памяти и потоках. Стоимость не опускается ниже BCRYPT_MIN_ROUNDS /
+    ARGON2_MIN_TIME_COST, даже если так target не достигается.
+    Returns:
+        параметры (имя переменной окружения -> значение), время хеширования с ними
+    """
+    def measure(cost: int) -> float:
+        return measure_hash(make_pwd_context(
+            scheme,
+            bcrypt_rounds=cost if scheme == "bcrypt" else settings.PWD_BCRYPT_ROUNDS,
+            argon2_time_cost=cost if scheme == "argon2" else settings.PWD_ARGON2_TIME_COST,
+            argon2_memory_cost=memory_cost,
+            argon2_parallelism=parallelism,
+        ))
+
+    cost = BCRYPT_MIN_ROUNDS if scheme == "bcrypt" else ARGON2_MIN_TIME_COST
+    seconds = measure(cost)
+    while True:
+        next_seconds = measure(cost + 1)
+        if next_seconds > target:
+            break
+        cost, seconds = cost + 1, next_seconds
+
+    if scheme == "bcrypt":
+        return {"PWD_HASH_SCHEME": scheme, "PWD_BCRYPT_ROUNDS": cost}, seconds
+    params = {
+        "PWD_HASH_SCHEME": scheme,
+        "PWD_ARGON2_TIME_COST": cost,
+        "PWD_ARGON2_MEMORY_COST": memory_cost,
+        "PWD_ARGON2_PARALLELISM": parallelism,
+    }
+    return params, seconds
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Подбор стоимости хеширования паролей под время на этой машине")
+    parser.add_argument("--scheme", choices=PWD_SCHEMES, default=settings.PWD_HASH_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="целевое время одного хеша")
+    parser.add_argument("--memory-mib", type=int, default=settings.PWD_ARGON2_MEMORY_COST // 1024, help="argon2id")
+    parser.add_argument("--parallelism", type=int, default=settings.PWD_ARGON2_PARALLELISM, help="argon2id")
+    args = parser.parse_args()
+
+    found, hash_seconds = calibrate(args.scheme, args.target_ms / 1000, args.memory_mib * 1024, args.parallelism)
+    for name, value in found.items():
+        print(f"{name}={value}")
+    print(f"# {hash_seconds * 1000:.0f} ms на хеш, цель {args.target_ms:.0f} ms")
+    if hash_seconds > args.target_ms / 1000:
+        print("# цель недостижима при минимальной стоимости: уменьшите --memory-mib (argon2) или увеличьте цель")
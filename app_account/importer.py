@@ -0,0 +1,204 @@
+"""
+Массовый импорт пользователей из CSV или NDJSON (файл или stdin).
+
+Строка: username, email, password, first_name, last_name (необязательные). Строки обрабатываются пачками по
+BULK_BATCH_SIZE: проверка схемой UserImportSchema, проверка занятых username/email одним запросом на пачку,
+хеширование паролей параллельно на USER_IMPORT_HASH_WORKERS ядрах, вставка одним INSERT ... ON CONFLICT DO NOTHING.
+Каждая пачка - отдельная транзакция. По каждой отклоненной строке в отчет (NDJSON) пишется номер строки и причина.
+
+Запуск: python -m app_account.importer users.csv --report errors.ndjson
+        cat users.ndjson | python -m app_account.importer - --format ndjson
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import IO, Iterator
+
+from pydantic import ValidationError
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from . import hashing
+from .crud import UserCRUD
+from .schemas import UserImportSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    errors: list[dict] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def error(self, line: int, username: str | None, reason: str) -> None:
+        self.errors.append({"line": line, "username": username, "error": reason})
+
+    def summary(self) -> dict:
+        return {
+            "total": self.total,
+            "created": self.created,
+            "failed": len(self.errors),
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.total / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+def read_rows(stream: IO[str], file_format: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+    Строки файла по одной, без загрузки файла в память.
+    Returns:
+        номер строки, данные строки или None, ошибка разбора или None
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key: value or None for key, value in row.items()}, None
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield number, None, f"Неверный JSON: {exc.msg}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Ожидается JSON объект"
+            continue
+        yield number, row, None
+
+
+class UserImporter:
+    """
+    Импорт пачками. Уникальность username/email проверяется и внутри файла (первая строка побеждает), и в БД.
+    """
+
+    def __init__(self, batch_size: int = settings.BULK_BATCH_SIZE, workers: int = settings.USER_IMPORT_HASH_WORKERS):
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_pool = hashing.PasswordHashPool(size=self.workers, queue_size=self.workers, timeout=60.0)
+        self.report = ImportReport()
+        self._seen_usernames: set[str] = set()
+        self._seen_emails: set[str] = set()
+
+    async def _hash(self, passwords: list[str]) -> list[str]:
+        """ Пароли пачки делятся на workers частей, каждая хешируется в своем процессе. """
+        chunk = -(-len(passwords) // self.workers)
+        parts = [passwords[start:start + chunk] for start in range(0, len(passwords), chunk)]
+        hashed = await asyncio.gather(*(self.hash_pool.run(hashing.hash_passwords, part) for part in parts))
+        return [value for part in hashed for value in part]
+
+    def _validate(self, batch: list[tuple[int, dict | None, str | None]]) -> list[tuple[int, UserImportSchema]]:
+        valid: list[tuple[int, UserImportSchema]] = []
+        for line, row, parse_error in batch:
+            if parse_error:
+                self.report.error(line, None, parse_error)
+                continue
+            try:
+                user = UserImportSchema.model_validate(row)
+            except ValidationError as exc:
+                reason = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors())
+                self.report.error(line, row.get("username"), reason)
+                continue
+            if user.username in self._seen_usernames or user.email in self._seen_emails:
+                self.report.error(line, user.username, "Повтор username или email в файле")
+                continue
+            self._seen_usernames.add(user.username)
+            self._seen_emails.add(user.email)
+            valid.append((line, user))
+        return valid
+
+    async def _import_batch(self, batch: list[tuple[int, dict | None, str | None]]) -> None:
+        self.report.total += len(batch)
+        valid = self._validate(batch)
+        if not valid:
+            return
+
+        async with AsyncSessionLocal() as db:
+            taken_usernames, taken_emails = await UserCRUD.get_taken_usernames_emails(
+                db, [user.username for _, user in valid], [user.email for _, user in valid]
+            )
+            await db.commit()  # на время хеширования соединение возвращается в пул
+            free: list[tuple[int, UserImportSchema]] = []
+            for line, user in valid:
+                if user.username in taken_usernames or user.email in taken_emails:
+                    self.report.error(line, user.username, "Пользователь уже существует")
+                else:
+                    free.append((line, user))
+            if not free:
+                return
+
+            hashed = await self._hash([user.password for _, user in free])
+            rows = [
+                user.model_dump() | {"id": uuid.uuid4(), "password": password}
+                for (_, user), password in zip(free, hashed)
+            ]
+            inserted = await UserCRUD.bulk_insert_users(db, rows)
+            await db.commit()
+
+        self.report.created += len(inserted)
+        for line, user in free:
+            if user.username not in inserted:
+                self.report.error(line, user.username, "Пользователь уже существует")
+
+    async def run(self, stream: IO[str], file_format: str) -> ImportReport:
+        started = time.perf_counter()
+        self.hash_pool.start()
+        try:
+            batch: list[tuple[int, dict | None, str | None]] = []
+            for item in read_rows(stream, file_format):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    await self._import_batch(batch)
+                    batch = []
+                    self.report.seconds = time.perf_counter() - started
+                    logger.info("Импорт: %s", self.report.summary())
+            if batch:
+                await self._import_batch(batch)
+        finally:
+            self.hash_pool.shutdown()
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="файл CSV/NDJSON, - для stdin")
+    parser.add_argument("--format", dest="file_format", choices=("csv", "ndjson"), help="по умолчанию по расширению")
+    parser.add_argument("--report", help="файл отчета об ошибках (NDJSON), по умолчанию stderr")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.USER_IMPORT_HASH_WORKERS, help="0 - по числу ядер")
+    args = parser.parse_args()
+
+    file_format = args.file_format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    importer = UserImporter(batch_size=args.batch_size, workers=args.workers)
+    if args.path == "-":
+        report = asyncio.run(importer.run(sys.stdin, file_format))
+    else:
+        with open(args.path, encoding="utf-8", newline="") as stream:
+            report = asyncio.run(importer.run(stream, file_format))
+
+    out = open(args.report, "w", encoding="utf-8") if args.report else sys.stderr
+    try:
+        for error in report.errors:
+            out.write(json.dumps(error, ensure_ascii=False) + "\n")
+    finally:
+        if args.report:
+            out.close()
+    print(json.dumps(report.summary(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
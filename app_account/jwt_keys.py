@@ -0,0 +1,151 @@
+"""
+Ключи подписи JWT. Ключ разбирается один раз (get_jwt_keys, при запуске приложения), а не при каждом
+jwt.encode/jwt.decode: для EdDSA/ES256 разбор PEM дороже самой подписи. Импорт модуля ключи не читает, поэтому
+создание пары ключей работает без настроенных JWT_PRIVATE_KEY_PATH/JWT_PUBLIC_KEY_PATH.
+
+ALGORITHM:
+- HS256/HS384/HS512 - общий секрет SECRET_KEY;
+- EdDSA, ES256 - закрытый ключ JWT_PRIVATE_KEY_PATH (PEM), открытый JWT_PUBLIC_KEY_PATH или из закрытого. В заголовок
+  токена пишется kid (JWT_KEY_ID или отпечаток открытого ключа), открытый ключ публикуется в /account/jwks, и
+  другие сервисы могут проверять токены сами.
+
+Создание пары ключей: python -m app_account.jwt_keys EdDSA keys/
+"""
+import argparse
+import base64
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+from core.config import settings
+
+
+HMAC_ALGORITHMS: tuple[str, ...] = ("HS256", "HS384", "HS512")
+
+
+class JWTKeys:
+    """
+    Ключи и алгоритм подписи, подготовленные один раз. encode/decode передают в PyJWT готовые объекты ключей.
+    """
+
+    def __init__(
+            self,
+            algorithm: str,
+            secret: str | None = None,
+            private_key_pem: bytes | None = None,
+            public_key_pem: bytes | None = None,
+            kid: str | None = None
+    ):
+        self.algorithm: str = algorithm
+        self._jwt = jwt.PyJWT()
+        self._algorithm = get_default_algorithms()[algorithm]
+
+        if algorithm in HMAC_ALGORITHMS:
+            self.signing_key: Any = self._algorithm.prepare_key(secret)
+            self.verifying_key: Any = self.signing_key
+            self.public_key: Any = None
+            self.kid: str | None = kid
+        else:
+            self.signing_key = self._algorithm.prepare_key(private_key_pem) if private_key_pem else None
+            if public_key_pem:
+                self.public_key = self._algorithm.prepare_key(public_key_pem)
+            elif self.signing_key is not None:
+                self.public_key = self.signing_key.public_key()
+            else:
+                raise ValueError(f"Для {algorithm} нужен JWT_PRIVATE_KEY_PATH или JWT_PUBLIC_KEY_PATH")
+            self.verifying_key = self.public_key
+            self.kid = kid or self._thumbprint()
+        self.headers: dict[str, str] | None = {"kid": self.kid} if self.kid else None
+
+    @classmethod
+    def from_settings(cls) -> "JWTKeys":
+        def read(path: str | None) -> bytes | None:
+            return Path(path).read_bytes() if path else None
+
+        return cls(
+            algorithm=settings.ALGORITHM,
+            secret=settings.SECRET_KEY,
+            private_key_pem=read(settings.JWT_PRIVATE_KEY_PATH),
+            public_key_pem=read(settings.JWT_PUBLIC_KEY_PATH),
+            kid=settings.JWT_KEY_ID,
+        )
+
+    def _thumbprint(self) -> str:
+        """ kid по умолчанию: отпечаток SHA-256 открытого ключа в JWK (RFC 7638). """
+        jwk: dict = self._algorithm.to_jwk(self.public_key, as_dict=True)
+        members = {name: jwk[name] for name in ("crv", "kty", "x", "y") if name in jwk}
+        canonical = "{" + ",".join(f'"{name}":"{value}"' for name, value in sorted(members.items())) + "}"
+        digest = hashlib.sha256(canonical.encode()).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def encode(self, payload: dict[str, Any]) -> str:
+        if self.signing_key is None:
+            raise ValueError("Закрытый ключ не задан: JWT_PRIVATE_KEY_PATH")
+        return self._jwt.encode(payload, key=self.signing_key, algorithm=self.algorithm, headers=self.headers)
+
+    def decode(self, token: str) -> dict[str, Any]:
+        """
+        Проверяет подпись и время действия токена. Вызывает jwt.InvalidTokenError и его подклассы.
+        """
+        return self._jwt.decode(token, key=self.verifying_key, algorithms=[self.algorithm])
+
+    def jwks(self) -> dict[str, list]:
+        """
+        Открытые ключи в формате JWKS. Для HS* пустой список: общий секрет не публикуется.
+        """
+        if self.public_key is None:
+            return {"keys": []}
+        jwk: dict = self._algorithm.to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return {"keys": [jwk]}
+
+
+def generate_key_pair(algorithm: str) -> tuple[bytes, bytes]:
+    """
+    Новая пара ключей в PEM для EdDSA (Ed25519) или ES256 (P-256).
+    Returns:
+        закрытый ключ, открытый ключ
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f"Неподдерживаемый алгоритм: {algorithm}")
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+
+@lru_cache(maxsize=None)
+def get_jwt_keys() -> JWTKeys:
+    """
+    Ключи из настроек, подготовленные при первом обращении и общие для всех запросов.
+    """
+    return JWTKeys.from_settings()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Создание пары ключей JWT")
+    parser.add_argument("algorithm", choices=("EdDSA", "ES256"))
+    parser.add_argument("directory", type=Path)
+    args = parser.parse_args()
+
+    private, public = generate_key_pair(args.algorithm)
+    args.directory.mkdir(parents=True, exist_ok=True)
+    (args.directory / "jwt_private.pem").write_bytes(private)
+    (args.directory / "jwt_public.pem").write_bytes(public)
+    (args.directory / "jwt_private.pem").chmod(0o600)
+    print(f"JWT_PRIVATE_KEY_PATH={args.directory / 'jwt_private.pem'}")
+    print(f"JWT_PUBLIC_KEY_PATH={args.directory / 'jwt_public.pem'}")
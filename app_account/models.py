@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import BigInteger, String, UUID, Boolean, DateTime, func, ForeignKey, text, UniqueConstraint
+from sqlalchemy import BigInteger, String, UUID, Boolean, DateTime, func, ForeignKey, text, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app_account.constants import DEFAULT_USER_DEVICE
@@ -27,8 +27,8 @@ class User(Base):
         String(100), nullable=False, unique=True, index=True, comment="ник пользователя"
     )
     password: Mapped[str] = mapped_column(
-        String(100), nullable=False
-    )
+        String(255), nullable=False
+    )  # хеш bcrypt - 60 символов, argon2id - от 97 и растет с параметрами стоимости
     email: Mapped[str] = mapped_column(
         String(100), nullable=False, unique=True, index=True
     )
@@ -58,6 +58,7 @@ class User(Base):
     __table_args__ = (
         UniqueConstraint("username", name="user_username_key"),
         UniqueConstraint("email", name="user_email_key"),
+        Index("ix_user_created_id", "created", "id"),  # ключ постраничного вывода (keyset)
         # UniqueConstraint("username", "email", name="user_username_email_key"),  # так будет составной
     )
 
@@ -75,14 +76,14 @@ class AssignedJWTAccessToken(Base):
         BigInteger, primary_key=True, autoincrement=True
     )
     jti: Mapped[UUID] = mapped_column(
-        UUID(as_uuid=True), nullable=False, unique=True, index=True, comment="Идентификатор токена"
+        UUID(as_uuid=True), nullable=False, index=True, comment="Идентификатор токена"
     )
     is_active: Mapped[bool] = mapped_column(
         Boolean, nullable=False, default=False, comment="Активен"
     )
     expired_time: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, comment="Окончание доступа"
-    )
+        DateTime(timezone=True), primary_key=True, nullable=False, comment="Окончание доступа"
+    )  # ключ секционирования, поэтому входит в первичный ключ и уникальные ограничения
     device_id: Mapped[str] = mapped_column(
         String(100), server_default=text(f"'{DEFAULT_USER_DEVICE}'"), comment="Устройство пользователя"
     )
@@ -91,7 +92,13 @@ class AssignedJWTAccessToken(Base):
     user: Mapped[User] = relationship(back_populates="access_tokens")
 
     __table_args__ = (
-        UniqueConstraint("jti", name="assigned_jwt_access_token_jti_key"),
+        UniqueConstraint("jti", "expired_time", name="assigned_jwt_access_token_jti_key"),
+        # деактивация токенов устройства: TokenCRUD.issue_tokens
+        Index(
+            "ix_assigned_jwt_access_token_user_id_device_id_active", "user_id", "device_id",
+            postgresql_where=text("is_active")
+        ),
+        {"postgresql_partition_by": "RANGE (expired_time)"},  # партиции: app_account.partitions
     )
 
     def __repr__(self):
@@ -108,14 +115,14 @@ class AssignedJWTRefreshToken(Base):
         BigInteger, primary_key=True, autoincrement=True
     )
     jti: Mapped[UUID] = mapped_column(
-        UUID(as_uuid=True), nullable=False, unique=True, index=True, comment="Идентификатор токена"
+        UUID(as_uuid=True), nullable=False, index=True, comment="Идентификатор токена"
     )
     is_active: Mapped[bool] = mapped_column(
         Boolean, nullable=False, default=False, comment="Активен"
     )
     expired_time: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, comment="Окончание доступа"
-    )
+        DateTime(timezone=True), primary_key=True, nullable=False, comment="Окончание доступа"
+    )  # ключ секционирования, поэтому входит в первичный ключ и уникальные ограничения
     device_id: Mapped[str] = mapped_column(
         String(100), server_default=text(f"'{DEFAULT_USER_DEVICE}'"), comment="Устройство пользователя"
     )
@@ -124,7 +131,12 @@ class AssignedJWTRefreshToken(Base):
     user: Mapped[User] = relationship(back_populates="refresh_tokens")
 
     __table_args__ = (
-        UniqueConstraint("jti", name="assigned_jwt_refresh_token_jti_key"),
+        UniqueConstraint("jti", "expired_time", name="assigned_jwt_refresh_token_jti_key"),
+        Index(
+            "ix_assigned_jwt_refresh_token_user_id_device_id_active", "user_id", "device_id",
+            postgresql_where=text("is_active")
+        ),
+        {"postgresql_partition_by": "RANGE (expired_time)"},  # партиции: app_account.partitions
     )
 
     def __repr__(self):
@@ -0,0 +1,206 @@
+"""
+Обслуживание партиций таблиц токенов (секционирование по expired_time, партиция на сутки UTC + DEFAULT):
+заранее создает партиции на TOKEN_PARTITION_PREMAKE_DAYS вперед и удаляет партиции, все токены которых истекли.
+
+Запуск вручную: python -m app_account.partitions
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.config import settings
+from core.database import async_engine
+from .constants import TOKEN_PARTITION_LOCK_KEY
+from .models import AssignedJWTAccessToken, AssignedJWTRefreshToken
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TABLES: tuple[str, ...] = (AssignedJWTAccessToken.__tablename__, AssignedJWTRefreshToken.__tablename__)
+LOCK_TIMEOUT = "2s"  # DDL не ждет блокировку дольше, иначе встанет в очередь перед запросами приложения
+DETACH_LOCK_TIMEOUT = "100ms"  # DETACH без CONCURRENTLY: короткое ожидание блокировки и повтор
+DETACH_ATTEMPTS = 5
+LOCK_NOT_AVAILABLE = "55P03"  # SQLSTATE ошибки lock_timeout
+
+
+def _partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def _bounds(day: date) -> tuple[str, str]:
+    return f"{day:%Y-%m-%d} 00:00:00+00", f"{day + timedelta(days=1):%Y-%m-%d} 00:00:00+00"
+
+
+async def _existing_partitions(conn: AsyncConnection, table: str) -> set[date]:
+    resp = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": table}
+    )
+    pattern = re.compile(rf"^{table}_p(\d{{8}})$")
+    days: set[date] = set()
+    for name in resp.scalars():
+        match = pattern.match(name)
+        if match:
+            days.add(datetime.strptime(match.group(1), "%Y%m%d").date())
+    return days
+
+
+async def _create_partition(conn: AsyncConnection, table: str, day: date) -> None:
+    """
+    Создает партицию отдельно от родительской таблицы и подключает ее через ATTACH PARTITION: в отличие от
+    CREATE TABLE ... PARTITION OF родительская таблица не блокируется на чтение. CHECK ограничение позволяет не
+    сканировать партицию при подключении. Строки этого диапазона, попавшие в DEFAULT, переносятся в партицию.
+    """
+    name = _partition_name(table, day)
+    lower, upper = _bounds(day)
+    async with conn.begin():
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        await conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        await conn.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {table}_default WHERE expired_time >= :lower AND expired_time < :upper "
+                f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+            ),
+            {
+                "lower": datetime.combine(day, time(), tzinfo=timezone.utc),
+                "upper": datetime.combine(day + timedelta(days=1), time(), tzinfo=timezone.utc)
+            }
+        )
+        await conn.execute(
+            text(
+                f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+                f"CHECK (expired_time >= '{lower}' AND expired_time < '{upper}')"
+            )
+        )
+        await conn.execute(
+            text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')")
+        )
+        await conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+    logger.info("Создана партиция %s", name)
+
+
+async def _has_default_partition(conn: AsyncConnection, table: str) -> bool:
+    resp = await conn.execute(
+        text("SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = CAST(:table AS regclass)"),
+        {"table": table}
+    )
+    return bool(resp.scalar_one())
+
+
+async def _detach_partition(conn: AsyncConnection, table: str, name: str) -> None:
+    """
+    DETACH PARTITION ... CONCURRENTLY не блокирует запросы к родительской таблице, но Postgres запрещает его, если у
+    таблицы есть DEFAULT партиция. Тогда выполняется обычный DETACH с коротким lock_timeout и повтором: ожидая
+    ACCESS EXCLUSIVE блокировку родительской таблицы, DDL не стоит в очереди перед запросами приложения дольше
+    DETACH_LOCK_TIMEOUT.
+    """
+    if not await _has_default_partition(conn, table):
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY"))
+        return
+
+    await conn.execute(text(f"SET lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+    try:
+        for attempt in range(1, DETACH_ATTEMPTS + 1):
+            try:
+                await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                return
+            except DBAPIError as exc:
+                if getattr(exc.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE or attempt == DETACH_ATTEMPTS:
+                    raise
+            await asyncio.sleep(0.2 * attempt)
+    finally:
+        await conn.execute(text("RESET lock_timeout"))
+
+
+async def _drop_partition(table: str, day: date) -> None:
+    """
+    Отключает партицию и удаляет уже отключенную таблицу: DROP TABLE подключенной партиции берет ACCESS EXCLUSIVE
+    блокировку родительской таблицы и останавливает поиск токенов и вход, пока ждет ее. Выполняется в отдельном
+    соединении в режиме autocommit (CONCURRENTLY нельзя выполнять в транзакции), advisory lock остается у
+    соединения обслуживания.
+    """
+    name = _partition_name(table, day)
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await _detach_partition(conn, table, name)
+        await conn.execute(text(f"DROP TABLE {name}"))
+    logger.info("Удалена партиция %s", name)
+
+
+async def maintain_token_partitions(premake_days: int = settings.TOKEN_PARTITION_PREMAKE_DAYS) -> dict[str, list[str]]:
+    """
+    Создает недостающие партиции с сегодняшнего дня на premake_days вперед, удаляет партиции, верхняя граница которых
+    уже прошла, и чистит истекшие строки в DEFAULT. Если обслуживание уже выполняет другой процесс, то ничего не делает.
+    Ошибка одной операции (например, lock_timeout) не прерывает остальные.
+    Args:
+        premake_days: на сколько суток вперед создавать партиции
+    Returns:
+        dict: созданные и удаленные партиции
+    """
+    report: dict[str, list[str]] = {"created": [], "dropped": []}
+    today: date = datetime.now(tz=timezone.utc).date()
+
+    async with async_engine.connect() as conn:
+        locked: bool = (await conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": TOKEN_PARTITION_LOCK_KEY}
+        )).scalar_one()
+        await conn.commit()
+        if not locked:
+            return report
+
+        try:
+            for table in TOKEN_TABLES:
+                existing: set[date] = await _existing_partitions(conn, table)
+                await conn.commit()
+
+                for shift in range(premake_days + 1):
+                    day = today + timedelta(days=shift)
+                    if day in existing:
+                        continue
+                    try:
+                        await _create_partition(conn, table, day)
+                        report["created"].append(_partition_name(table, day))
+                    except Exception:
+                        logger.exception("Не удалось создать партицию %s", _partition_name(table, day))
+
+                for day in sorted(existing):
+                    if day >= today:
+                        continue
+                    try:
+                        await _drop_partition(table, day)
+                        report["dropped"].append(_partition_name(table, day))
+                    except Exception:
+                        logger.exception("Не удалось удалить партицию %s", _partition_name(table, day))
+
+                async with conn.begin():
+                    await conn.execute(text(f"DELETE FROM {table}_default WHERE expired_time <= now()"))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": TOKEN_PARTITION_LOCK_KEY})
+            await conn.commit()
+
+    return report
+
+
+async def run_partition_maintenance(interval: float) -> None:
+    """
+    Фоновая задача: обслуживание партиций раз в interval секунд. Запускается из lifespan приложения.
+    """
+    while True:
+        try:
+            await maintain_token_partitions()
+        except Exception:
+            logger.exception("Не удалось выполнить обслуживание партиций токенов")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(maintain_token_partitions()))
@@ -4,6 +4,7 @@ from uuid import UUID
 from pydantic import BaseModel, EmailStr, Field, field_validator, ConfigDict
 
 from app_account.constants import DEFAULT_USER_DEVICE
+from core.pagination import Page
 
 
 class UserSchema(BaseModel):
@@ -15,6 +16,11 @@ class UserRegisterSchema(UserSchema):
     password: str = Field(min_length=3, max_length=8, description="Пароль")
 
 
+class UserImportSchema(UserRegisterSchema):
+    first_name: str | None = Field(default=None, max_length=100, description="Имя пользователя")
+    last_name: str | None = Field(default=None, max_length=100, description="Фамилия пользователя")
+
+
 class UserIdSchema(UserSchema):
     id: UUID = Field(description="Идентификатор")
 
@@ -24,6 +30,11 @@ class UserIdSchema(UserSchema):
 
 
 class FullUserSchema(UserIdSchema):
+    # только для ответов: email из БД уже проверен при регистрации, повторная проверка EmailStr самая дорогая часть
+    # валидации строки
+    email: str = Field(
+        max_length=80, description="Электронная почта пользователя", json_schema_extra={"format": "email"}
+    )
     first_name: str | None = Field(max_length=125, description="Имя пользователя")
     last_name: str | None = Field(max_length=125, description="Фамилия пользователя")
     created: datetime = Field(description="Дата регистрации")
@@ -34,6 +45,10 @@ class FullUserSchema(UserIdSchema):
     )
 
 
+class UsersPageSchema(Page[FullUserSchema]):
+    pass
+
+
 class UserPayloadSchema(BaseModel):
     device_id: str | None = Field(
         default=None, min_length=1, max_length=100, title="Устройство", description="Устройство пользователя"
@@ -56,6 +71,15 @@ class UserPayloadSchema(BaseModel):
         return value
 
 
+class UserClaimsSchema(BaseModel):
+    """
+    Пользователь из claims подписанного access токена (режим AUTH_STATELESS), без обращения к БД.
+    """
+    id: UUID = Field(description="Идентификатор")
+    is_staff: bool = Field(default=False, description="Персонал")
+    is_superuser: bool = Field(default=False, description="Суперпользователь")
+
+
 class AuthUserSchema(UserPayloadSchema):
     username: str = Field(description="Имя пользователя")
     password: str = Field(description="Пароль")
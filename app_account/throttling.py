@@ -0,0 +1,231 @@
+"""
+Ограничение частоты входа (/account/login) по алгоритму token bucket: отдельные корзины для имени пользователя и
+для IP клиента. Проверка выполняется до поиска пользователя и проверки пароля, поэтому перебор паролей не
+превращается в нагрузку на БД и bcrypt. При превышении - 429 с заголовком Retry-After.
+
+Хранилище корзин выбирается LOGIN_THROTTLE:
+
+- memory - корзины в памяти процесса, у каждого воркера свои (предел на воркер);
+- redis - общие корзины на сервере с протоколом Redis, пополнение и списание в одном Lua скрипте;
+- off - без ограничений.
+
+За балансировщиком IP соединения - адрес балансировщика: IP клиента берется из X-Forwarded-For, если соединение
+пришло от адреса из TRUSTED_PROXIES.
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import Any, Literal, NamedTuple
+
+from fastapi import Request
+
+from core.config import settings
+from .excepions import AuthExceptions
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimit(NamedTuple):
+    rate: float  # токенов в секунду
+    burst: int  # размер корзины: столько попыток подряд без ожидания
+
+
+class LoginThrottle(ABC):
+    """
+    Интерфейс хранилища корзин. acquire списывает одну попытку и возвращает 0 или секунды до следующей попытки.
+    """
+    name: str
+
+    def __init__(self):
+        self.allowed: int = 0
+        self.throttled: int = 0
+
+    @abstractmethod
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        """
+        Args:
+            key: ключ корзины (user:{username}, ip:{host})
+            limit: скорость пополнения и размер корзины
+        Returns:
+            0 - попытка разрешена, иначе секунд до появления токена в корзине
+        """
+
+    async def close(self) -> None:
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {"allowed": self.allowed, "throttled": self.throttled}
+
+
+class NoLoginThrottle(LoginThrottle):
+    name = "off"
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        return 0.0
+
+
+class MemoryLoginThrottle(LoginThrottle):
+    """
+    Корзины в памяти процесса, разделенные на shards частей по хешу ключа. В каждой части не больше
+    max_keys // shards корзин: при переполнении удаляется корзина, к которой дольше всего не обращались (LRU внутри
+    части), поэтому поток случайных имен не увеличивает память и вытесняет корзины только своей части. Удаленная
+    корзина создается заново полной. Все операции без await внутри, поэтому атомарны в цикле событий.
+    """
+    name = "memory"
+
+    def __init__(self, max_keys: int, shards: int = 16):
+        super().__init__()
+        self._shard_size: int = max(1, max_keys // shards)
+        self._shards: list[OrderedDict[str, tuple[float, float]]] = [OrderedDict() for _ in range(shards)]
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        bucket = shard.pop(key, None)  # повторная вставка переносит корзину в конец LRU
+        tokens: float = limit.burst if bucket is None else min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / limit.rate
+        shard[key] = (tokens, now)
+        if len(shard) > self._shard_size:
+            shard.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict[str, int]:
+        return super().stats() | {"buckets": len(self)}
+
+
+# KEYS[1] - корзина (hash: tokens, ts); ARGV - rate, burst. Время сервера Redis: одинаково для всех воркеров.
+# Ответ строкой, так как числа Lua в ответе Redis округляются до целых.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = burst
+if bucket[1] then
+    tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisLoginThrottle(LoginThrottle):
+    """
+    Общие корзины для всех воркеров: {prefix}:{ключ} - hash, живет до полного пополнения корзины. Если сервер
+    недоступен, попытка разрешается (ограничение защитное, вход не должен зависеть от Redis), в лог - предупреждение.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str):
+        super().__init__()
+        # зависимость нужна только этому хранилищу
+        from redis import asyncio as redis_asyncio
+        from redis.exceptions import RedisError
+
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._redis_error = RedisError
+        self.prefix: str = prefix
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        try:
+            wait: str = await self._script(keys=[f"{self.prefix}:{key}"], args=[limit.rate, limit.burst])
+        except self._redis_error as exc:
+            logger.warning("login throttle unavailable, attempt allowed: %r", exc)
+            return 0.0
+        return float(wait)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_login_throttle(backend: Literal["memory", "redis", "off"], **options: Any) -> LoginThrottle:
+    if backend == "redis":
+        return RedisLoginThrottle(url=options["url"], prefix=options["prefix"])
+    if backend == "memory":
+        return MemoryLoginThrottle(max_keys=options["max_keys"], shards=options["shards"])
+    return NoLoginThrottle()
+
+
+login_throttle: LoginThrottle = create_login_throttle(
+    settings.LOGIN_THROTTLE,
+    url=settings.LOGIN_THROTTLE_REDIS_URL,
+    prefix=settings.LOGIN_THROTTLE_KEY_PREFIX,
+    max_keys=settings.LOGIN_THROTTLE_MAX_KEYS,
+    shards=settings.LOGIN_THROTTLE_SHARDS,
+)
+IP_LIMIT = RateLimit(rate=settings.LOGIN_THROTTLE_IP_PER_MINUTE / 60, burst=settings.LOGIN_THROTTLE_IP_BURST)
+USER_LIMIT = RateLimit(rate=settings.LOGIN_THROTTLE_USER_PER_MINUTE / 60, burst=settings.LOGIN_THROTTLE_USER_BURST)
+
+TRUSTED_PROXIES: tuple[IPv4Network | IPv6Network, ...] = tuple(
+    ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES
+)
+
+
+def _is_trusted(host: str, proxies: tuple[IPv4Network | IPv6Network, ...]) -> bool:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in proxies)
+
+
+def client_ip(request: Request, proxies: tuple[IPv4Network | IPv6Network, ...] = TRUSTED_PROXIES) -> str:
+    """
+    IP клиента для корзины. Если соединение пришло от доверенного прокси, то X-Forwarded-For просматривается справа
+    налево до первого адреса не из proxies: левее него значения задает сам клиент и могут быть подделаны.
+    Args:
+        request: Request
+        proxies: подсети доверенных прокси (TRUSTED_PROXIES)
+    Returns:
+        str: IP клиента
+    """
+    host: str = request.client.host if request.client is not None else "unknown"
+    if not _is_trusted(host, proxies):
+        return host
+    forwarded: list[str] = ",".join(request.headers.getlist("x-forwarded-for")).split(",")
+    for item in reversed(forwarded):
+        item = item.strip()
+        if not item:
+            continue
+        host = item
+        if not _is_trusted(host, proxies):
+            break
+    return host
+
+
+async def check_login_rate(request: Request, username: str) -> None:
+    """
+    Списывает попытку входа из корзин IP клиента и имени пользователя. Вызывается до поиска пользователя.
+    Если попытка IP отклонена, корзина пользователя не расходуется.
+    raise HTTPException, status.HTTP_429_TOO_MANY_REQUESTS
+    Args:
+        request: Request (IP клиента, client_ip)
+        username: имя пользователя из тела запроса
+    """
+    wait = await login_throttle.acquire(f"ip:{client_ip(request)}", IP_LIMIT)
+    if not wait:
+        wait = await login_throttle.acquire(f"user:{username.strip().lower()}", USER_LIMIT)
+    if wait:
+        login_throttle.throttled += 1
+        AuthExceptions.exc_too_many_login_attempts(wait)
+    login_throttle.allowed += 1
@@ -0,0 +1,439 @@
+"""
+Хранилище состояния выданных токенов (активные jti пользователя на устройстве, отзыв). Выбирается TOKEN_STORE:
+
+- postgres - таблицы assigned_jwt_access_token / assigned_jwt_refresh_token (по умолчанию);
+- memory - словари в памяти процесса: только для одного воркера (разработка, тесты);
+- redis - сервер с протоколом Redis (Redis, Valkey, KeyDB, Dragonfly), TTL ключей - до expired_time токена.
+
+Пользователи всегда хранятся в Postgres. Кеш jti -> пользователь и фильтр отозванных токенов обновляет TokenCRUD,
+хранилище только сохраняет и ищет токены.
+"""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+from typing import Any, Literal
+from uuid import UUID
+
+from sqlalchemy import update, select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from .models import User, AssignedJWTAccessToken, AssignedJWTRefreshToken
+from .schemas import AcTokenSchema, ReTokenSchema
+
+
+TokenData = AcTokenSchema | ReTokenSchema
+
+
+def _kind(refresh: bool) -> str:
+    return "refresh" if refresh else "access"
+
+
+class TokenStore(ABC):
+    """
+    Интерфейс хранилища токенов. Методы получают сессию запроса db: ее использует Postgres, остальным хранилищам
+    она нужна только для чтения пользователя.
+    """
+    name: str
+
+    @abstractmethod
+    async def issue(
+            self,
+            db: AsyncSession,
+            user_id: UUID,
+            device_id: str,
+            access: AcTokenSchema,
+            refresh: ReTokenSchema | None = None
+    ) -> list[UUID]:
+        """
+        Атомарно деактивирует токены пользователя на устройстве и сохраняет новую пару. Если refresh не передан, то
+        заменяется только access токен, refresh токен устройства остается действительным.
+        Returns:
+            jti деактивированных access токенов
+        """
+
+    @abstractmethod
+    async def find(
+            self, db: AsyncSession, jti: UUID, refresh: bool, exp: int | None = None
+    ) -> tuple[User, str] | None:
+        """
+        Пользователь и устройство активного токена или None.
+        Args:
+            db: session of the request
+            jti: token jti from payload
+            refresh: refresh or not
+            exp: token exp from payload (timestamp)
+        """
+
+    @abstractmethod
+    async def revoke_user(self, db: AsyncSession, user_id: UUID) -> list[UUID]:
+        """
+        Удаляет токены пользователя перед удалением пользователя.
+        Returns:
+            jti активных access токенов
+        """
+
+    @abstractmethod
+    async def revoked_access_jti(self) -> set[UUID]:
+        """ jti отозванных, но ещё не истекших access токенов (режим AUTH_STATELESS). """
+
+    async def close(self) -> None:
+        return None
+
+    @staticmethod
+    async def _get_user(db: AsyncSession, user_id: UUID | str) -> User | None:
+        resp = await db.execute(select(User).where(User.id == user_id))
+        return resp.scalar_one_or_none()
+
+
+class PostgresTokenStore(TokenStore):
+    """
+    Токены в секционированных таблицах Postgres в транзакции запроса.
+    """
+    name = "postgres"
+
+    @staticmethod
+    def _model(refresh: bool) -> type[AssignedJWTAccessToken] | type[AssignedJWTRefreshToken]:
+        return AssignedJWTRefreshToken if refresh else AssignedJWTAccessToken
+
+    @staticmethod
+    def _deactivate_stmt(token_model, user_id: UUID, device_id: str):
+        return (
+            update(
+                token_model
+            ).
+            where(
+                token_model.user_id == user_id,
+                token_model.device_id == device_id,
+                token_model.is_active
+            ).
+            values(
+                is_active=False
+            ).
+            returning(
+                token_model.jti
+            )
+        )
+
+    @staticmethod
+    def _insert_stmt(token_model, data: TokenData):
+        return (
+            insert(
+                token_model
+            ).
+            values(
+                jti=data.jti,
+                is_active=data.is_active,
+                expired_time=data.expired_time,
+                device_id=data.device_id,
+                user_id=data.user_id.id
+            )
+        )
+
+    async def issue(
+            self,
+            db: AsyncSession,
+            user_id: UUID,
+            device_id: str,
+            access: AcTokenSchema,
+            refresh: ReTokenSchema | None = None
+    ) -> list[UUID]:
+        """
+        Одна транзакция и один запрос (CTE): деактивация прежних access и refresh (если выдается) токенов устройства
+        и вставка новых. Все части запроса видят один снимок данных, поэтому вставленные токены не деактивируются, а
+        наполовину выданной пары быть не может.
+        """
+        deactivated_ctes = []
+        inserted_ctes = []
+        for token_model, data in ((AssignedJWTAccessToken, access), (AssignedJWTRefreshToken, refresh)):
+            if data is None:
+                continue
+            deactivated_ctes.append(
+                self._deactivate_stmt(token_model, user_id, device_id).cte(f"deactivated_{token_model.__tablename__}")
+            )
+            inserted_ctes.append(self._insert_stmt(token_model, data).cte(f"inserted_{token_model.__tablename__}"))
+
+        deactivated_access, *deactivated_refresh = deactivated_ctes
+        resp = await db.execute(select(deactivated_access.c.jti).add_cte(*deactivated_refresh, *inserted_ctes))
+        await db.commit()
+        return list(resp.scalars().all())
+
+    async def find(
+            self, db: AsyncSession, jti: UUID, refresh: bool, exp: int | None = None
+    ) -> tuple[User, str] | None:
+        token_model = self._model(refresh)
+        stmt = (
+            select(
+                User, token_model.device_id
+            ).
+            join(
+                token_model, token_model.user_id == User.id
+            ).
+            where(
+                token_model.jti == jti,
+                token_model.is_active == True
+            )
+        )
+        if exp is not None:
+            # Таблицы секционированы по expired_time: условие оставляет в плане одну партицию. В токене exp в целых
+            # секундах, в БД - с микросекундами.
+            expired_from = datetime.fromtimestamp(exp, tz=timezone.utc)
+            stmt = stmt.where(
+                token_model.expired_time >= expired_from,
+                token_model.expired_time < expired_from + timedelta(seconds=1)
+            )
+        resp = await db.execute(stmt)
+        row = resp.first()
+        return (row[0], row[1]) if row is not None else None
+
+    async def revoke_user(self, db: AsyncSession, user_id: UUID) -> list[UUID]:
+        """ Строки токенов удаляются вместе с пользователем (ondelete="CASCADE"). """
+        resp = await db.execute(
+            select(AssignedJWTAccessToken.jti).where(
+                AssignedJWTAccessToken.user_id == user_id, AssignedJWTAccessToken.is_active == True
+            )
+        )
+        return list(resp.scalars().all())
+
+    async def revoked_access_jti(self) -> set[UUID]:
+        """ Вызывается вне запроса, поэтому открывает собственную сессию. """
+        stmt = (
+            select(
+                AssignedJWTAccessToken.jti
+            ).
+            where(
+                AssignedJWTAccessToken.is_active == False,
+                AssignedJWTAccessToken.expired_time > func.now()
+            )
+        )
+        async with AsyncSessionLocal() as db:
+            resp = await db.execute(stmt)
+            return set(resp.scalars().all())
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Токены в памяти процесса. Состояние не разделяется между воркерами и теряется при перезапуске, поэтому
+    подходит только для одного воркера. Истекшие записи удаляются при чтении и раз в PURGE_EVERY изменений.
+    Все операции без await внутри, поэтому атомарны в цикле событий.
+    """
+    name = "memory"
+    PURGE_EVERY = 1000
+
+    def __init__(self):
+        self._tokens: dict[tuple[str, UUID], tuple[UUID, str, float]] = dict()  # -> user_id, device_id, exp
+        self._devices: dict[tuple[str, UUID, str], UUID] = dict()  # -> активный jti
+        self._revoked: dict[UUID, float] = dict()  # access jti -> exp
+        self._writes: int = 0
+
+    def _purge(self, now: float) -> None:
+        for key in [key for key, (_, _, exp) in self._tokens.items() if exp <= now]:
+            user_id, device_id, _ = self._tokens.pop(key)
+            if self._devices.get((key[0], user_id, device_id)) == key[1]:
+                del self._devices[(key[0], user_id, device_id)]
+        for jti in [jti for jti, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[jti]
+
+    def _written(self) -> None:
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge(time.time())
+
+    def _deactivate(self, refresh: bool, user_id: UUID, device_id: str) -> list[UUID]:
+        kind = _kind(refresh)
+        jti = self._devices.pop((kind, user_id, device_id), None)
+        if jti is None:
+            return []
+        _, _, exp = self._tokens.pop((kind, jti), (None, None, 0.0))
+        if not refresh and exp > time.time():
+            self._revoked[jti] = exp
+        return [jti]
+
+    def _insert(self, refresh: bool, data: TokenData) -> None:
+        kind = _kind(refresh)
+        user_id: UUID = data.user_id.id
+        self._tokens[(kind, data.jti)] = (user_id, data.device_id, data.expired_time.timestamp())
+        self._devices[(kind, user_id, data.device_id)] = data.jti
+        self._written()
+
+    async def issue(
+            self,
+            db: AsyncSession,
+            user_id: UUID,
+            device_id: str,
+            access: AcTokenSchema,
+            refresh: ReTokenSchema | None = None
+    ) -> list[UUID]:
+        deactivated = self._deactivate(False, user_id, device_id)
+        self._insert(False, access)
+        if refresh is not None:
+            self._deactivate(True, user_id, device_id)
+            self._insert(True, refresh)
+        return deactivated
+
+    async def find(
+            self, db: AsyncSession, jti: UUID, refresh: bool, exp: int | None = None
+    ) -> tuple[User, str] | None:
+        token = self._tokens.get((_kind(refresh), jti))
+        if token is None or token[2] <= time.time():
+            return None
+        user = await self._get_user(db, token[0])
+        return (user, token[1]) if user is not None else None
+
+    async def revoke_user(self, db: AsyncSession, user_id: UUID) -> list[UUID]:
+        devices = [key for key in self._devices if key[1] == user_id]
+        revoked: list[UUID] = []
+        for kind, _, device_id in devices:
+            deactivated = self._deactivate(kind == "refresh", user_id, device_id)
+            if kind == "access":
+                revoked.extend(deactivated)
+        return revoked
+
+    async def revoked_access_jti(self) -> set[UUID]:
+        now = time.time()
+        return {jti for jti, exp in self._revoked.items() if exp > now}
+
+
+class RedisTokenStore(TokenStore):
+    """
+    Токены на сервере с протоколом Redis. Ключи (prefix - TOKEN_STORE_KEY_PREFIX):
+
+    - {prefix}:jti:{access|refresh}:{jti} -> JSON [user_id, device_id, exp], живет до expired_time;
+    - {prefix}:dev:{access|refresh}:{user_id}:{device_id} -> активный jti устройства, живет до expired_time;
+    - {prefix}:user:{user_id} -> множество ключей dev пользователя (для удаления пользователя);
+    - {prefix}:revoked -> sorted set: отозванные access jti со score = exp.
+
+    Деактивация и выдача выполняются в MULTI/EXEC с WATCH ключей устройства, поэтому параллельная выдача токенов на
+    одно устройство не оставляет два активных токена.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str):
+        # зависимость нужна только этому хранилищу
+        from redis import asyncio as redis_asyncio
+        from redis.exceptions import WatchError
+
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+        self._watch_error = WatchError
+        self.prefix: str = prefix
+
+    def _jti_key(self, kind: str, jti: UUID | str) -> str:
+        return f"{self.prefix}:jti:{kind}:{jti}"
+
+    def _dev_key(self, kind: str, user_id: UUID, device_id: str) -> str:
+        return f"{self.prefix}:dev:{kind}:{user_id}:{device_id}"
+
+    def _user_key(self, user_id: UUID) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    @property
+    def _revoked_key(self) -> str:
+        return f"{self.prefix}:revoked"
+
+    async def _replace(
+            self, user_id: UUID, device_id: str, tokens: dict[str, TokenData | None]
+    ) -> dict[str, UUID | None]:
+        """
+        Для каждого типа из tokens деактивирует активный токен устройства и, если передан новый, сохраняет его.
+        Returns:
+            тип токена -> jti деактивированного токена или None
+        """
+        dev_keys = {kind: self._dev_key(kind, user_id, device_id) for kind in tokens}
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(*dev_keys.values())
+                    current = dict(zip(dev_keys, await pipe.mget(*dev_keys.values())))
+                    old_values = dict(zip(
+                        current,
+                        await pipe.mget(*(self._jti_key(kind, jti) for kind, jti in current.items()))
+                    ))
+
+                    pipe.multi()
+                    for kind, data in tokens.items():
+                        old_jti = current[kind]
+                        if old_jti is not None:
+                            pipe.delete(self._jti_key(kind, old_jti))
+                            pipe.delete(dev_keys[kind])
+                            if kind == "access" and old_values[kind] is not None:
+                                pipe.zadd(self._revoked_key, {old_jti: json.loads(old_values[kind])[2]})
+                                pipe.zremrangebyscore(self._revoked_key, "-inf", time.time())
+                        if data is not None:
+                            exp: float = data.expired_time.timestamp()
+                            pxat = int(exp * 1000)
+                            value = json.dumps([str(user_id), data.device_id, exp])
+                            pipe.set(self._jti_key(kind, data.jti), value, pxat=pxat)
+                            pipe.set(dev_keys[kind], str(data.jti), pxat=pxat)
+                            pipe.sadd(self._user_key(user_id), dev_keys[kind])
+                            pipe.pexpireat(self._user_key(user_id), pxat)
+                    await pipe.execute()
+                    return {kind: UUID(jti) if jti else None for kind, jti in current.items()}
+                except self._watch_error:
+                    continue
+
+    async def issue(
+            self,
+            db: AsyncSession,
+            user_id: UUID,
+            device_id: str,
+            access: AcTokenSchema,
+            refresh: ReTokenSchema | None = None
+    ) -> list[UUID]:
+        tokens: dict[str, TokenData | None] = {"access": access}
+        if refresh is not None:
+            tokens["refresh"] = refresh
+        deactivated = await self._replace(user_id, device_id, tokens)
+        return [deactivated["access"]] if deactivated["access"] else []
+
+    async def _deactivate(self, refresh: bool, user_id: UUID, device_id: str) -> list[UUID]:
+        kind = _kind(refresh)
+        deactivated = await self._replace(user_id, device_id, {kind: None})
+        return [deactivated[kind]] if deactivated[kind] else []
+
+    async def find(
+            self, db: AsyncSession, jti: UUID, refresh: bool, exp: int | None = None
+    ) -> tuple[User, str] | None:
+        value: str | None = await self._redis.get(self._jti_key(_kind(refresh), jti))
+        if value is None:
+            return None
+        user_id, device_id, _ = json.loads(value)
+        user = await self._get_user(db, UUID(user_id))
+        return (user, device_id) if user is not None else None
+
+    async def revoke_user(self, db: AsyncSession, user_id: UUID) -> list[UUID]:
+        dev_keys: set[str] = await self._redis.smembers(self._user_key(user_id))
+        revoked: list[UUID] = []
+        for dev_key in dev_keys:
+            kind, _, device_id = dev_key[len(self.prefix) + len(":dev:"):].split(":", 2)
+            deactivated = await self._deactivate(kind == "refresh", user_id, device_id)
+            if kind == "access":
+                revoked.extend(deactivated)
+        await self._redis.delete(self._user_key(user_id))
+        return revoked
+
+    async def revoked_access_jti(self) -> set[UUID]:
+        now = time.time()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(self._revoked_key, "-inf", now)
+            pipe.zrangebyscore(self._revoked_key, now, "+inf")
+            _, members = await pipe.execute()
+        return {UUID(jti) for jti in members}
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_token_store(backend: Literal["postgres", "memory", "redis"], **options: Any) -> TokenStore:
+    if backend == "memory":
+        return MemoryTokenStore()
+    if backend == "redis":
+        return RedisTokenStore(url=options["url"], prefix=options["prefix"])
+    return PostgresTokenStore()
+
+
+token_store: TokenStore = create_token_store(
+    settings.TOKEN_STORE, url=settings.TOKEN_STORE_REDIS_URL, prefix=settings.TOKEN_STORE_KEY_PREFIX
+)
@@ -1,24 +1,29 @@
 from datetime import datetime, timezone
-from typing import List
 from uuid import UUID
 from fastapi import APIRouter, Depends, status, Response, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
+from core.database import get_async_db
+from core.export import ExportFormat, export_response
+from core.pagination import PageParams, page_params
+from core.response_cache import cached_response
+from core.serialization import PydanticResponse
 from .auth import Authentication, is_authenticate, refresh_tokens
 from .common import UserCommon, UserCommonBase, TokenCommon
 from .crud import UserCRUD
 from .excepions import UserExceptions
+from .jwt_keys import get_jwt_keys
 from .models import User
 from .schemas import UserRegisterSchema, AuthUserSchema, FullUserSchema, UserIdSchema, UserSchema, \
-    UserPayloadSchema
+    UserPayloadSchema, UsersPageSchema
 from .swagger_schema import AccountSWSchema as Swag
+from .throttling import check_login_rate
 
 router = APIRouter(tags=["account"])
 
 
 @router.post(path="/register", status_code=status.HTTP_201_CREATED, **Swag.register_user)
-def register_user(user: UserRegisterSchema, db: Session = Depends(get_db)) -> dict:
+async def register_user(user: UserRegisterSchema, db: AsyncSession = Depends(get_async_db)) -> dict:
     """
     Регистрация пользователя в системе. Если пользователь уже существует, то будет поднято исключение.
     Args:
@@ -27,32 +32,41 @@ def register_user(user: UserRegisterSchema, db: Session = Depends(get_db)) -> di
     Returns:
         msg and schema User
     """
-    user_instance = UserCommon.get_user_or_none(user.email)
+    user_instance = await UserCommon.get_user_or_none(db, user.email)
     UserExceptions.exc_user_already_exists(user_instance)
+    await db.commit()  # на время хеширования пароля соединение возвращается в пул
 
-    user.password = Authentication.get_password_hash(user.password)
-    instance: User = UserCRUD.register_user(db, user)
+    user.password = await Authentication.aget_password_hash(user.password)
+    instance: User = await UserCRUD.register_user(db, user)
     user_sch = UserSchema.model_validate(instance, from_attributes=True)
     return {"msg": "Вы зарегистрированы!", "user": user_sch}
 
 
 @router.post(path="/login", response_model=UserIdSchema, status_code=status.HTTP_200_OK)
-def login_user(response: Response, user: AuthUserSchema) -> User:
+async def login_user(
+        request: Request, response: Response, user: AuthUserSchema, db: AsyncSession = Depends(get_async_db)
+) -> User:
     """
     Аутентификация. Устанавливает заголовки "access_token" и "refresh_token" в ответе. Если пользователь не пройдет
-    проверку будет вызвано исключение: HTTPException, status.HTTP_401_UNAUTHORIZED.
+    проверку будет вызвано исключение: HTTPException, status.HTTP_401_UNAUTHORIZED. При превышении частоты попыток
+    входа по имени пользователя или IP - HTTPException, status.HTTP_429_TOO_MANY_REQUESTS с заголовком Retry-After.
     Args:
+        request: Request
         response: Response
         user: schema AuthUser (from post body)
+        db: session
     Returns:
         schema UserIdSchema and sets the headers "access_token" and "refresh_token"
     """
-    user_verified: User | None = UserCommon.authenticate_user(username=user.username, password=user.password)
+    await check_login_rate(request, user.username)  # до запроса к БД и проверки пароля
+    user_verified: User | None = await UserCommon.authenticate_user(
+        db, username=user.username, password=user.password
+    )
     UserExceptions.exc_user_unauthorized(user_verified)
 
     current_time = datetime.now(tz=timezone.utc)
-    token_common = TokenCommon(user_verified=user_verified, user=user, current_time=current_time)
-    access, refresh = token_common.get_tokens()
+    token_common = TokenCommon(db, user_verified=user_verified, user=user, current_time=current_time)
+    access, refresh = await token_common.get_tokens()
 
     response.headers["access_token"]: str = access
     response.headers["refresh_token"]: str = refresh
@@ -60,22 +74,28 @@ def login_user(response: Response, user: AuthUserSchema) -> User:
 
 
 @router.post(path="/update-tokens", dependencies=[Depends(refresh_tokens)])
-def refresh_token(request: Request, response: Response) -> dict:
-    user_verified: User = request.state.user
-    ref_tokens: list = user_verified.refresh_tokens
+async def refresh_token(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)) -> dict:
+    user_verified: User = request.user.instance  # установлен AuthenticationMiddleware
     current_time = datetime.now(tz=timezone.utc)
-    user_schema = UserPayloadSchema(device_id=ref_tokens[0].device_id, not_before=None)
-    token_common = TokenCommon(user_verified=user_verified, user=user_schema, current_time=current_time)
+    user_schema = UserPayloadSchema(device_id=request.user.device_id, not_before=None)
+    token_common = TokenCommon(db, user_verified=user_verified, user=user_schema, current_time=current_time)
 
-    access, refresh = token_common.get_tokens()
+    access, refresh = await token_common.get_tokens()
     response.headers["access_token"]: str = access
     response.headers["refresh_token"]: str = refresh
     return {"msg": "Токены обновлены"}
 
 
-@router.post(path="/update-access-token")
-def refresh_token(response: Response, user: User = Depends(refresh_tokens)) -> dict:
-    response.headers["access_token"]: str = Authentication.create_access_token({"sub": str(user.id)})
+@router.post(path="/update-access-token", dependencies=[Depends(refresh_tokens)])
+async def refresh_access_token(
+        request: Request, response: Response, db: AsyncSession = Depends(get_async_db)
+) -> dict:
+    user_verified: User = request.user.instance  # установлен AuthenticationMiddleware
+    current_time = datetime.now(tz=timezone.utc)
+    user_schema = UserPayloadSchema(device_id=request.user.device_id, not_before=None)
+    token_common = TokenCommon(db, user_verified=user_verified, user=user_schema, current_time=current_time)
+
+    response.headers["access_token"]: str = await token_common.get_access_token()
     return {"msg": "Токен доступа обновлен"}
 
 
@@ -85,12 +105,20 @@ def logout_user(response: Response):
     return {"massage": "Пользователь успешно вышел из системы"}
 
 
+@router.get(path="/jwks", status_code=status.HTTP_200_OK)
+async def read_jwks() -> dict:
+    """
+    Открытые ключи подписи токенов (JWKS) для проверки токенов в других сервисах. Для HS* список пуст.
+    """
+    return get_jwt_keys().jwks()
+
+
 @router.delete(path="/delete_user", status_code=status.HTTP_200_OK)
-def read_all_users(user: UserSchema, db: Session = Depends(get_db)) -> dict:
-    user_instance = UserCommon.get_user_or_none(user.email)
+async def read_all_users(user: UserSchema, db: AsyncSession = Depends(get_async_db)) -> dict:
+    user_instance = await UserCommon.get_user_or_none(db, user.email)
     if not user_instance:
         return {"massage": "Пользователь не найден."}
-    UserCRUD.del_user(db, user_instance)
+    await UserCRUD.del_user(db, user_instance)
     return {"massage": "Пользователь успешно удалён."}
 
 
@@ -98,19 +126,49 @@ def read_all_users(user: UserSchema, db: Session = Depends(get_db)) -> dict:
     path="/all_users",
     dependencies=[Depends(is_authenticate), ],
     status_code=status.HTTP_200_OK,
-    response_model=List[FullUserSchema]
+    response_model=UsersPageSchema,
+    response_class=PydanticResponse
 )
-def read_all_users(db: Session = Depends(get_db)) -> List[dict]:
-    users = UserCommonBase(db).show_all_users()
-    return users
+async def read_all_users(
+        request: Request, params: PageParams = Depends(page_params), db: AsyncSession = Depends(get_async_db)
+) -> Response:
+    """
+    Пользователи постранично. Следующая страница: ?after=<next_cursor>, next_cursor = null - страница последняя.
+    Ответ с ETag: при If-None-Match с тем же ETag - 304 без тела.
+    """
+    async def render() -> PydanticResponse:
+        return PydanticResponse(await UserCommonBase(db).show_all_users(params))
+
+    validator = await UserCRUD.get_users_validator(db)
+    key = ("users", params.limit, params.after, params.estimate_total)
+    return await cached_response(request, key, validator, render, tags=("users",))
+
+
+@router.get(path="/export", dependencies=[Depends(is_authenticate), ], status_code=status.HTTP_200_OK)
+async def export_users(export_format: ExportFormat = ExportFormat.CSV, db: AsyncSession = Depends(get_async_db)):
+    """
+    Выгрузка всех пользователей в csv или ndjson. Данные передаются потоком из COPY ... TO STDOUT, память на
+    выгрузку не зависит от числа пользователей.
+    """
+    await db.close()  # COPY идет на отдельном соединении: соединение аутентификации возвращается в пул до выгрузки
+    return export_response(UserCommonBase.export_query(), export_format, filename="users")
 
 
 @router.get(
     path="/user/{user_id}",
     dependencies=[Depends(is_authenticate), ],
     status_code=status.HTTP_200_OK,
-    response_model=FullUserSchema
+    response_model=FullUserSchema,
+    response_class=PydanticResponse
 )
-def read_full_user(user_id: UUID, db: Session = Depends(get_db)):
-    user = UserCommonBase(db).show_full_user(user_id)
-    return user
+async def read_full_user(request: Request, user_id: UUID, db: AsyncSession = Depends(get_async_db)) -> Response:
+    """
+    Профиль пользователя. Ответ с ETag: при If-None-Match с тем же ETag - 304 без тела. Если пользователя нет -
+    HTTPException, status.HTTP_404_NOT_FOUND.
+    """
+    async def render() -> PydanticResponse:
+        return PydanticResponse(await UserCommonBase(db).show_full_user(user_id))
+
+    validator = await UserCRUD.get_user_validator(db, user_id)
+    UserExceptions.exc_user_not_found(validator)
+    return await cached_response(request, ("user", user_id), validator, render, tags=(("user", user_id),))
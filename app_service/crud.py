@@ -1,18 +1,139 @@
-from sqlalchemy.orm import Session
+import logging
+import time
+from typing import Sequence
 
+from sqlalchemy import select, Select, insert, update, delete, values, column, func, BigInteger, String
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.pagination import PageParams, decode_cursor, keyset, split_page, estimate_count
+from core.response_cache import response_cache
+from core.serialization import validate
 from .models import ProbaTable
-from .schemas import ProbaCreate
+from .schemas import ProbaCreate, ProbaPage, ProbaBulkItem, ProbaBulkUpdateItem, ProbaBulkResult
+
+
+logger = logging.getLogger(__name__)
 
 
-def create_proba(db: Session, proba: ProbaCreate):
+async def create_proba(db: AsyncSession, proba: ProbaCreate):
     db_proba = ProbaTable(
         name=proba.name
     )
     db.add(db_proba)
-    db.commit()
-    db.refresh(db_proba)
+    await db.commit()
+    await db.refresh(db_proba)
+    response_cache.invalidate_tag("probas")
     return db_proba
 
 
-def get_probas(db: Session):
-    return db.query(ProbaTable).all()
+def probas_export_query() -> Select:
+    return select(ProbaTable.id, ProbaTable.name, ProbaTable.description).order_by(ProbaTable.id)
+
+
+async def get_probas(db: AsyncSession, params: PageParams) -> ProbaPage:
+    columns = (ProbaTable.id,)
+    after = decode_cursor(params.after, (int,)) if params.after else None
+    resp = await db.execute(keyset(select(ProbaTable), columns, after, params.limit))
+    rows, next_cursor = split_page(resp.scalars().all(), columns, params.limit)
+
+    total = await estimate_count(db, ProbaTable.__tablename__) if params.estimate_total else None
+    return validate(ProbaPage, {"items": rows, "next_cursor": next_cursor, "total_estimate": total})
+
+
+async def get_probas_validator(db: AsyncSession) -> tuple:
+    """
+    Валидатор кеша списка proba: max(id) по первичному ключу. Изменения строк он не замечает, их сбрасывают
+    запись через функции этого модуля (тег "probas") и RESPONSE_CACHE_TTL_SECONDS.
+    """
+    resp = await db.execute(select(func.max(ProbaTable.id)))
+    return (resp.scalar_one(),)
+
+
+def _batches(items: Sequence, size: int) -> list[Sequence]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _bulk_result(operation: str, ids: list[int], batches: int, started: float) -> ProbaBulkResult:
+    elapsed = time.perf_counter() - started
+    rows_per_second = round(len(ids) / elapsed, 1) if elapsed else 0.0
+    logger.info("proba bulk %s: %d rows, %d batches, %.1f ms, %.1f rows/s",
+                operation, len(ids), batches, elapsed * 1000, rows_per_second)
+    return ProbaBulkResult(
+        count=len(ids), ids=ids, batches=batches, elapsed_ms=round(elapsed * 1000, 3), rows_per_second=rows_per_second
+    )
+
+
+async def bulk_create_probas(db: AsyncSession, items: list[ProbaBulkItem]) -> ProbaBulkResult:
+    """
+    Массовое создание: по BULK_BATCH_SIZE строк в одном INSERT ... VALUES (...), (...) RETURNING id, одна
+    транзакция и один commit на весь запрос.
+    Args:
+        db: session of the request
+        items: строки
+    Returns:
+        ProbaBulkResult: id в порядке items
+    """
+    started = time.perf_counter()
+    batches = _batches([item.model_dump() for item in items], settings.BULK_BATCH_SIZE)
+    stmt = insert(ProbaTable).returning(ProbaTable.id, sort_by_parameter_order=True)
+    ids: list[int] = []
+    for batch in batches:
+        resp = await db.execute(stmt, batch, execution_options={"insertmanyvalues_page_size": len(batch)})
+        ids.extend(resp.scalars().all())
+    await db.commit()
+    response_cache.invalidate_tag("probas")
+    return _bulk_result("create", ids, len(batches), started)
+
+
+async def bulk_update_probas(db: AsyncSession, items: list[ProbaBulkUpdateItem]) -> ProbaBulkResult:
+    """
+    Массовое изменение по id: UPDATE proba ... FROM (VALUES ...) RETURNING id, по BULK_BATCH_SIZE строк в запросе.
+    Поле со значением None не меняется. Несуществующие id пропускаются и не попадают в ответ.
+    Args:
+        db: session of the request
+        items: строки с id
+    Returns:
+        ProbaBulkResult: id измененных строк
+    """
+    started = time.perf_counter()
+    batches = _batches(items, settings.BULK_BATCH_SIZE)
+    ids: list[int] = []
+    for batch in batches:
+        data = values(
+            column("id", BigInteger), column("name", String), column("description", String), name="data"
+        ).data([(item.id, item.name, item.description) for item in batch])
+        stmt = (
+            update(ProbaTable)
+            .where(ProbaTable.id == data.c.id)
+            .values(
+                name=func.coalesce(data.c.name, ProbaTable.name),
+                description=func.coalesce(data.c.description, ProbaTable.description),
+            )
+            .returning(ProbaTable.id)
+        )
+        resp = await db.execute(stmt)
+        ids.extend(resp.scalars().all())
+    await db.commit()
+    response_cache.invalidate_tag("probas")
+    return _bulk_result("update", ids, len(batches), started)
+
+
+async def bulk_delete_probas(db: AsyncSession, ids: list[int]) -> ProbaBulkResult:
+    """
+    Массовое удаление по id: DELETE ... WHERE id IN (...) RETURNING id, по BULK_BATCH_SIZE id в запросе.
+    Args:
+        db: session of the request
+        ids: id строк
+    Returns:
+        ProbaBulkResult: id удаленных строк
+    """
+    started = time.perf_counter()
+    batches = _batches(ids, settings.BULK_BATCH_SIZE)
+    deleted: list[int] = []
+    for batch in batches:
+        resp = await db.execute(delete(ProbaTable).where(ProbaTable.id.in_(batch)).returning(ProbaTable.id))
+        deleted.extend(resp.scalars().all())
+    await db.commit()
+    response_cache.invalidate_tag("probas")
+    return _bulk_result("delete", deleted, len(batches), started)
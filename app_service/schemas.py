@@ -1,4 +1,7 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from core.config import settings
+from core.pagination import Page
 
 
 class Proba(BaseModel):
@@ -29,3 +32,37 @@ class ProbaGetAll(Proba):
         from_attributes=True,
     )
 
+
+class ProbaPage(Page[ProbaGetAll]):
+    pass
+
+
+class ProbaBulkItem(Proba):
+    name: str = Field(max_length=150)
+    description: str | None = Field(default=None, max_length=300)
+
+
+class ProbaBulkUpdateItem(Proba):
+    id: int
+    name: str | None = Field(default=None, max_length=150, description="None - не менять")
+    description: str | None = Field(default=None, max_length=300, description="None - не менять")
+
+
+class ProbaBulkCreate(Proba):
+    items: list[ProbaBulkItem] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS)
+
+
+class ProbaBulkUpdate(Proba):
+    items: list[ProbaBulkUpdateItem] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS)
+
+
+class ProbaBulkDelete(Proba):
+    ids: list[int] = Field(min_length=1, max_length=settings.BULK_MAX_ITEMS)
+
+
+class ProbaBulkResult(Proba):
+    count: int = Field(description="Строк создано/изменено/удалено")
+    ids: list[int] = Field(description="id затронутых строк")
+    batches: int = Field(description="SQL запросов")
+    elapsed_ms: float = Field(description="Время работы с БД, включая commit")
+    rows_per_second: float = Field(description="Строк в секунду")
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, Response, status, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import get_db
-from .crud import create_proba, get_probas
-from .schemas import ProbaCreate, ProbaGetAll
+from core.database import get_async_db
+from core.export import ExportFormat, export_response
+from core.pagination import PageParams, page_params
+from core.response_cache import cached_response
+from core.serialization import PydanticResponse
+from .crud import create_proba, get_probas, probas_export_query, bulk_create_probas, bulk_update_probas, \
+    bulk_delete_probas, get_probas_validator
+from .schemas import ProbaCreate, ProbaPage, ProbaBulkCreate, ProbaBulkUpdate, ProbaBulkDelete, ProbaBulkResult
 
 router = APIRouter(tags=["prob"])
+bulk_router = APIRouter(tags=["prob"])  # вне AUTH_PUBLIC_PATHS, подключается с is_authenticate
 
 swagger_post_proba = {
     # "tags": ["prob"],
@@ -16,18 +22,58 @@ swagger_post_proba = {
 
 
 @router.post("/proba", response_model=ProbaCreate, status_code=status.HTTP_201_CREATED, **swagger_post_proba)
-def post_proba(proba: ProbaCreate, db: Session = Depends(get_db)):
+async def post_proba(proba: ProbaCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create the proba instance.
     """
-    db_proba = create_proba(db, proba)
+    db_proba = await create_proba(db, proba)
 
     return db_proba
 
 
-@router.get("/proba/all", status_code=status.HTTP_200_OK, response_model=list[ProbaGetAll])
-def get_proba(db: Session = Depends(get_db)):
+@bulk_router.post("/proba", response_model=ProbaBulkResult, status_code=status.HTTP_201_CREATED)
+async def post_proba_bulk(data: ProbaBulkCreate, db: AsyncSession = Depends(get_async_db)):
     """
-    Displaying instances proba
+    Create proba instances in batches (multi-row INSERT ... RETURNING), one transaction per request.
     """
-    return get_probas(db)
+    return await bulk_create_probas(db, data.items)
+
+
+@bulk_router.patch("/proba", response_model=ProbaBulkResult, status_code=status.HTTP_200_OK)
+async def patch_proba_bulk(data: ProbaBulkUpdate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Update proba instances by id in batches. Null fields are left unchanged, unknown ids are skipped.
+    """
+    return await bulk_update_probas(db, data.items)
+
+
+@bulk_router.delete("/proba", response_model=ProbaBulkResult, status_code=status.HTTP_200_OK)
+async def delete_proba_bulk(data: ProbaBulkDelete, db: AsyncSession = Depends(get_async_db)):
+    """
+    Delete proba instances by id in batches.
+    """
+    return await bulk_delete_probas(db, data.ids)
+
+
+@router.get("/proba/all", status_code=status.HTTP_200_OK, response_model=ProbaPage, response_class=PydanticResponse)
+async def get_proba(
+        request: Request, params: PageParams = Depends(page_params), db: AsyncSession = Depends(get_async_db)
+) -> Response:
+    """
+    Displaying instances proba page by page (?limit=&after=<next_cursor>). The response carries an ETag,
+    If-None-Match with the same ETag gets 304 without a body.
+    """
+    async def render() -> PydanticResponse:
+        return PydanticResponse(await get_probas(db, params))
+
+    validator = await get_probas_validator(db)
+    key = ("probas", params.limit, params.after, params.estimate_total)
+    return await cached_response(request, key, validator, render, tags=("probas",))
+
+
+@router.get("/proba/export", status_code=status.HTTP_200_OK)
+async def export_probas(export_format: ExportFormat = ExportFormat.CSV):
+    """
+    Streaming export of all proba instances as csv or ndjson (COPY ... TO STDOUT)
+    """
+    return export_response(probas_export_query(), export_format, filename="proba")
@@ -0,0 +1,209 @@
+"""
+Горячий путь аутентификации: создание и проверка токенов, проверка пароля, выдача пары токенов, поиск пользователя
+по jti и запросы /account/login и /account/user/{id} через приложение целиком (ASGI в том же процессе).
+
+Нужна локальная БД из настроек (DB_*) с примененными миграциями. Для замера создается пользователь bench_*, после
+замера он удаляется вместе с токенами. Каждая операция выполняется не меньше --seconds секунд и не меньше
+--min-samples раз. Результат - ops/sec и задержки p50/p99/max в мс, с --json - в файл для сравнения между версиями.
+
+Запуск: python -m benchmarks.auth_hot_path --seconds 2 --json auth.json
+        python -m benchmarks.auth_hot_path --only create_access_token verify_access_token
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from app_account.auth import Authentication
+from app_account.cache import jti_user_cache, verified_token_cache
+from app_account.common import TokenCommon, UserCommon
+from app_account import throttling
+from app_account.crud import UserCRUD
+from app_account.schemas import AuthUserSchema, UserRegisterSchema
+from core.config import settings
+from core.database import AsyncSessionLocal
+from main import app, lifespan
+
+
+PASSWORD = "bench123"
+DEVICE_ID = "bench-device"
+
+
+def percentile(timings: list[float], value: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value))]
+
+
+async def measure(func: Callable[[], Any | Awaitable[Any]], seconds: float, min_samples: int) -> dict:
+    """
+    Вызывает func, пока не пройдет seconds секунд и не наберется min_samples замеров. Корутины ожидаются.
+    """
+    is_async = inspect.iscoroutinefunction(func)
+    await func() if is_async else func()  # прогрев
+    timings: list[float] = []
+    started = time.perf_counter()
+    while len(timings) < min_samples or time.perf_counter() - started < seconds:
+        begin = time.perf_counter()
+        await func() if is_async else func()
+        timings.append((time.perf_counter() - begin) * 1000)
+    total = time.perf_counter() - started
+    return {
+        "samples": len(timings),
+        "ops_per_second": round(len(timings) / total, 1),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+class AuthBenchmark:
+    """
+    Операции замера. Пользователь и его токены создаются в setup и удаляются в teardown.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.username = f"bench_{uuid.uuid4().hex[:10]}"
+        self.email = f"{self.username}@example.com"
+        self.user = None
+        self.hashed_password: str = ""
+        self.access: str = ""
+        self.jti: uuid.UUID | None = None
+        self.exp: int | None = None
+
+    async def setup(self) -> None:
+        self.hashed_password = Authentication.get_password_hash(PASSWORD)
+        user = UserRegisterSchema(username=self.username, email=self.email, password=PASSWORD)
+        user.password = self.hashed_password  # как в /account/register: хеш после проверки схемой
+        async with AsyncSessionLocal() as db:
+            self.user = await UserCRUD.register_user(db, user)
+        response = await self.client.post(
+            "/account/login", json={"username": self.username, "password": PASSWORD, "device_id": DEVICE_ID}
+        )
+        response.raise_for_status()
+        self.access = response.headers["access_token"]
+        payload = Authentication.verify_access_token(self.access.replace("JWT ", ""))
+        self.jti, self.exp = uuid.UUID(payload["jti"]), payload["exp"]
+
+    async def teardown(self) -> None:
+        async with AsyncSessionLocal() as db:
+            user = await UserCommon.get_user_or_none(db, self.email)
+            if user is not None:
+                await UserCRUD.del_user(db, user)
+
+    def create_access_token(self) -> None:
+        Authentication.create_access_token(
+            data={"user_id": self.user, "user_device": DEVICE_ID, "not_before": None}
+        )
+
+    def verify_access_token(self) -> None:
+        Authentication.verify_access_token(self.access.replace("JWT ", ""))
+
+    def verify_access_token_uncached(self) -> None:
+        verified_token_cache.clear()
+        Authentication.verify_access_token(self.access.replace("JWT ", ""))
+
+    def verify_password(self) -> None:
+        Authentication.verify_password(PASSWORD, self.hashed_password)
+
+    async def get_tokens(self) -> None:
+        async with AsyncSessionLocal() as db:
+            user_schema = AuthUserSchema(username=self.username, password=PASSWORD, device_id=DEVICE_ID)
+            token_common = TokenCommon(
+                db, user_verified=self.user, user=user_schema, current_time=datetime.now(tz=timezone.utc)
+            )
+            await token_common.get_tokens()
+
+    async def get_user_by_jti_token_cached(self) -> None:
+        async with AsyncSessionLocal() as db:
+            await UserCRUD.get_user_by_jti_token(db, self.jti, exp=self.exp)
+
+    async def get_user_by_jti_token_uncached(self) -> None:
+        jti_user_cache.clear()
+        async with AsyncSessionLocal() as db:
+            await UserCRUD.get_user_by_jti_token(db, self.jti, exp=self.exp)
+
+    async def login(self) -> None:
+        response = await self.client.post(
+            "/account/login", json={"username": self.username, "password": PASSWORD, "device_id": DEVICE_ID}
+        )
+        response.raise_for_status()
+        self.access = response.headers["access_token"]  # прежний токен устройства деактивирован
+
+    async def read_user(self) -> None:
+        response = await self.client.get(f"/account/user/{self.user.id}", headers={"Authorization": self.access})
+        response.raise_for_status()
+
+    def operations(self) -> dict[str, Callable[[], Any]]:
+        """
+        Порядок важен: login деактивирует токены устройства, поэтому get_tokens и login идут после операций,
+        которым нужен self.jti, а read_user - после login с новым токеном.
+        """
+        return {
+            "create_access_token": self.create_access_token,
+            "verify_access_token": self.verify_access_token,
+            "verify_access_token_uncached": self.verify_access_token_uncached,
+            "verify_password": self.verify_password,
+            "get_user_by_jti_token_cached": self.get_user_by_jti_token_cached,
+            "get_user_by_jti_token_uncached": self.get_user_by_jti_token_uncached,
+            "get_tokens": self.get_tokens,
+            "login": self.login,
+            "read_user": self.read_user,
+        }
+
+
+async def run(seconds: float, min_samples: int, only: list[str] | None) -> dict:
+    throttling.login_throttle = throttling.NoLoginThrottle()  # замер входа, а не ограничения частоты попыток
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://127.0.0.1") as client:
+        bench = AuthBenchmark(client)
+        await bench.setup()
+        try:
+            results: dict[str, dict] = {}
+            for name, func in bench.operations().items():
+                if only and name not in only:
+                    continue
+                results[name] = await measure(func, seconds, min_samples)
+        finally:
+            await bench.teardown()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="минимальное время замера операции")
+    parser.add_argument("--min-samples", type=int, default=20, help="минимальное число замеров операции")
+    parser.add_argument("--only", nargs="+", help="только указанные операции")
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.seconds, args.min_samples, args.only))
+    for name, stats in results.items():
+        print(
+            f"{name:32} {stats['ops_per_second']:>10} ops/s  p50 {stats['p50_ms']:>9} ms  "
+            f"p99 {stats['p99_ms']:>9} ms  n={stats['samples']}"
+        )
+    if args.json_path:
+        report = {
+            "created": datetime.now(tz=timezone.utc).isoformat(),
+            "settings": {
+                "algorithm": settings.ALGORITHM,
+                "token_store": settings.TOKEN_STORE,
+                "auth_stateless": settings.AUTH_STATELESS,
+            },
+            "results": results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Сжатие большого списка пользователей (тело ответа /account/all_users): размер и время сжатия по кодировкам, и
+запросы через приложение: прежний GZipMiddleware против CompressionMiddleware без кеша и с кешем по ETag.
+
+БД не нужна: тело строится из тех же объектов-строк, что и в benchmarks.serialization.
+
+Запуск: python -m benchmarks.compression --users 10000 --requests 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+from starlette.middleware.gzip import GZipMiddleware
+
+from app_account.schemas import UsersPageSchema
+from benchmarks.serialization import Row
+from core.compression import CompressedBodyCache, CompressionMiddleware, available_compressors
+from core.serialization import PydanticResponse, validate
+
+
+def build_body(users: int) -> bytes:
+    created = datetime.now(tz=timezone.utc)
+    page = validate(UsersPageSchema, {"items": [Row(number, created) for number in range(users)]})
+    return PydanticResponse(page).body
+
+
+def compress_stats(body: bytes, repeat: int) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    for encoding, factory in available_compressors().items():
+        timings: list[float] = []
+        size = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            compressor = factory()
+            size = len(compressor.compress(body) + compressor.finish())
+            timings.append((time.perf_counter() - started) * 1000)
+        mean = statistics.fmean(timings)
+        results[encoding] = {
+            "bytes": size,
+            "ratio": round(len(body) / size, 2),
+            "mean_ms": round(mean, 2),
+            "mb_per_second": round(len(body) / mean / 1000, 1),
+        }
+    return results
+
+
+def build_app(body: bytes, middleware: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/users")
+    async def users():
+        return Response(body, media_type="application/json", headers={"ETag": '"v1"'})
+
+    if middleware == "gzip":
+        app.add_middleware(GZipMiddleware, minimum_size=2048, compresslevel=5)
+    else:
+        cache = CompressedBodyCache(64 * 1024 * 1024) if middleware == "cached" else None
+        app.add_middleware(CompressionMiddleware, cache=cache)
+    return app
+
+
+async def measure(app: FastAPI, accept_encoding: str, requests: int) -> dict:
+    timings: list[float] = []
+    size = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Accept-Encoding": accept_encoding}
+        await client.get("/users", headers=headers)  # прогрев, для кеша - первое сжатие
+        for _ in range(requests):
+            started = time.perf_counter()
+            async with client.stream("GET", "/users", headers=headers) as response:
+                size = 0
+                async for chunk in response.aiter_raw():  # без распаковки на стороне клиента
+                    size += len(chunk)
+            timings.append((time.perf_counter() - started) * 1000)
+    mean = statistics.fmean(timings)
+    return {"mean_ms": round(mean, 2), "requests_per_second": round(1000 / mean, 1), "bytes": size}
+
+
+async def run_requests(body: bytes, requests: int) -> dict[str, dict]:
+    results = {"GZipMiddleware, gzip": await measure(build_app(body, "gzip"), "gzip", requests)}
+    for encoding in available_compressors():
+        results[f"Compression, {encoding}"] = await measure(build_app(body, "plain"), encoding, requests)
+        results[f"Compression + ETag cache, {encoding}"] = await measure(build_app(body, "cached"), encoding, requests)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    body = build_body(args.users)
+    encoders = compress_stats(body, repeat=5)
+    requests = asyncio.run(run_requests(body, args.requests))
+
+    print(f"body {len(body)} bytes ({args.users} users)")
+    for encoding, stats in encoders.items():
+        print(f"{encoding:6} {stats['bytes']:>9} B  x{stats['ratio']:<6} {stats['mean_ms']:>8} ms  "
+              f"{stats['mb_per_second']:>7} MB/s")
+    for name, stats in requests.items():
+        print(f"{name:36} {stats['mean_ms']:>8} ms  {stats['requests_per_second']:>8} req/s  {stats['bytes']:>9} B")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump({"encoders": encoders, "requests": requests}, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
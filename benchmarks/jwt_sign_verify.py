@@ -0,0 +1,85 @@
+"""
+Подпись и проверка JWT по алгоритмам: прежний путь (jwt.encode/jwt.decode с ключом строкой или PEM, ключ
+разбирается при каждом вызове) против JWTKeys с ключом, подготовленным один раз.
+
+БД не нужна. Ключи EdDSA/ES256 создаются на время замера.
+
+Запуск: python -m benchmarks.jwt_sign_verify --seconds 1
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import jwt
+
+from app_account.jwt_keys import JWTKeys, generate_key_pair
+
+
+ALGORITHMS: tuple[str, ...] = ("HS256", "ES256", "EdDSA")
+
+
+def ops_per_second(func: Callable[[], object], seconds: float) -> float:
+    func()  # прогрев
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func()
+        count += 100
+    return count / (time.perf_counter() - started)
+
+
+def payload() -> dict:
+    now = datetime.now(tz=timezone.utc)
+    return {
+        "sub": "user", "uid": str(uuid.uuid4()), "is_staff": False, "is_superuser": False, "iss": "bench",
+        "exp": now + timedelta(hours=1), "type": "ACCESS", "jti": str(uuid.uuid4()), "iat": now, "nbf": now,
+    }
+
+
+def run(seconds: float) -> dict:
+    results: dict[str, dict] = {}
+    data = payload()
+    for algorithm in ALGORITHMS:
+        if algorithm.startswith("HS"):
+            sign_key = verify_key = "secret-key-" * 4
+            keys = JWTKeys(algorithm, secret=sign_key)
+        else:
+            sign_key, verify_key = generate_key_pair(algorithm)
+            keys = JWTKeys(algorithm, private_key_pem=sign_key, public_key_pem=verify_key)
+
+        token = jwt.encode(data, key=sign_key, algorithm=algorithm)
+        results[algorithm] = {
+            "sign_legacy": ops_per_second(lambda: jwt.encode(data, key=sign_key, algorithm=algorithm), seconds),
+            "sign_preloaded": ops_per_second(lambda: keys.encode(data), seconds),
+            "verify_legacy": ops_per_second(lambda: jwt.decode(token, key=verify_key, algorithms=[algorithm]), seconds),
+            "verify_preloaded": ops_per_second(lambda: keys.decode(token), seconds),
+            "token_bytes": len(token),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="время замера каждой операции")
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    results = run(args.seconds)
+    for algorithm, stats in results.items():
+        print(
+            f"{algorithm:6} sign {stats['sign_legacy']:>9.0f} -> {stats['sign_preloaded']:>9.0f} ops/s  "
+            f"verify {stats['verify_legacy']:>9.0f} -> {stats['verify_preloaded']:>9.0f} ops/s  "
+            f"token {stats['token_bytes']} B"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Сериализация списка пользователей: прежний путь (model_validate на строку + повторная проверка response_model +
+jsonable_encoder/json) против одной валидации через TypeAdapter и PydanticResponse (orjson).
+
+БД не нужна: строки - объекты с атрибутами, как экземпляры ORM. Запросы выполняются к приложению FastAPI в том же
+процессе через ASGI, поэтому в замер входит обработка ответа FastAPI целиком.
+
+Запуск: python -m benchmarks.serialization --users 10000 --requests 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import ConfigDict, EmailStr, Field
+
+from app_account.schemas import FullUserSchema, UserIdSchema, UsersPageSchema
+from core.serialization import PydanticResponse, validate
+
+
+class LegacyFullUserSchema(UserIdSchema):
+    """ FullUserSchema до изменения: email проверяется как EmailStr и в ответе. """
+    email: EmailStr = Field(max_length=80)
+    first_name: str | None = Field(max_length=125)
+    last_name: str | None = Field(max_length=125)
+    created: datetime
+    updated: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class Row:
+    """ Строка как экземпляр User из БД. """
+
+    def __init__(self, number: int, created: datetime):
+        self.id = uuid.uuid4()
+        self.username = f"user{number}"
+        self.email = f"user{number}@example.com"
+        self.first_name = "Имя"
+        self.last_name = None
+        self.created = created
+        self.updated = created
+        self.password = "not serialized"
+
+
+def build_app(rows: list[Row]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/legacy", response_model=List[LegacyFullUserSchema], response_class=JSONResponse)
+    async def legacy():
+        return [LegacyFullUserSchema.model_validate(row, from_attributes=True) for row in rows]
+
+    @app.get("/double", response_model=List[FullUserSchema], response_class=JSONResponse)
+    async def double():
+        return [FullUserSchema.model_validate(row, from_attributes=True) for row in rows]
+
+    @app.get("/fast", response_model=UsersPageSchema, response_class=PydanticResponse)
+    async def fast():
+        return PydanticResponse(validate(UsersPageSchema, {"items": rows}))
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int) -> dict:
+    timings: list[float] = []
+    size = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)  # прогрев: построение валидаторов
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            size = len(response.content)
+    mean = statistics.fmean(timings)
+    return {
+        "mean_ms": round(mean, 1),
+        "p50_ms": round(statistics.median(timings), 1),
+        "max_ms": round(max(timings), 1),
+        "requests_per_second": round(1000 / mean, 2),
+        "bytes": size,
+    }
+
+
+async def run(users: int, requests: int) -> dict:
+    created = datetime.now(tz=timezone.utc)
+    app = build_app([Row(number, created) for number in range(users)])
+    return {
+        "legacy (EmailStr, validate twice, json)": await measure(app, "/legacy", requests),
+        "validate twice, json": await measure(app, "/double", requests),
+        "TypeAdapter once, orjson": await measure(app, "/fast", requests),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.users, args.requests))
+    baseline = next(iter(results.values()))["mean_ms"]
+    print(f"{args.users} users, {args.requests} requests")
+    for name, stats in results.items():
+        print(
+            f"{name:42} mean {stats['mean_ms']:>8} ms  p50 {stats['p50_ms']:>8} ms  "
+            f"{stats['requests_per_second']:>7} req/s  x{baseline / stats['mean_ms']:.1f}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+План и время запроса деактивации токенов устройства (TokenCRUD.issue_tokens) до и после частичного индекса
+(user_id, device_id) WHERE is_active.
+
+Данные создаются в отдельной схеме bench_token_index и удаляются после замера (--keep - оставить). У каждой пары
+(пользователь, устройство) много неактивных токенов и один активный, как в таблице без очистки.
+
+Запуск: python -m benchmarks.token_deactivation_index --rows 2000000 --users 200000 --devices 3 --samples 200
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+from uuid import UUID
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+from core.config import settings
+
+
+SCHEMA = "bench_token_index"
+TABLE = f"{SCHEMA}.assigned_jwt_access_token"
+INDEX = "ix_bench_user_id_device_id_active"
+DEACTIVATE = f"UPDATE {TABLE} SET is_active = false WHERE user_id = :user_id AND device_id = :device_id AND is_active"
+
+
+def _user_id(number: int) -> UUID:
+    """ Тот же идентификатор, что md5('u' || number)::uuid при наполнении таблицы. """
+    return UUID(hashlib.md5(f"u{number}".encode()).hexdigest())
+
+
+def seed(conn: Connection, rows: int, users: int, devices: int) -> None:
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(
+        text(
+            f"""
+            CREATE TABLE {TABLE} (
+                id BIGINT PRIMARY KEY,
+                jti UUID NOT NULL UNIQUE,
+                is_active BOOLEAN NOT NULL,
+                expired_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                device_id VARCHAR(100) NOT NULL,
+                user_id UUID NOT NULL
+            )
+            """
+        )
+    )
+    pairs = users * devices
+    conn.execute(
+        text(
+            f"""
+            INSERT INTO {TABLE} (id, jti, is_active, expired_time, device_id, user_id)
+            SELECT g, gen_random_uuid(), g > :rows - :pairs, now() + make_interval(mins => g % 1440),
+                   'device-' || (g / :users) % :devices, md5('u' || g % :users)::uuid
+            FROM generate_series(1, :rows) AS g
+            """
+        ),
+        {"rows": rows, "pairs": pairs, "users": users, "devices": devices}
+    )
+    conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+def measure(engine: Engine, users: int, devices: int, samples: int, seed_value: int) -> dict:
+    """
+    EXPLAIN ANALYZE запроса деактивации для случайных пар (пользователь, устройство). Каждый запрос выполняется в
+    транзакции, которая откатывается, поэтому данные не меняются между замерами.
+    """
+    rnd = random.Random(seed_value)
+    timings: list[float] = []
+    plan: str = ""
+    with engine.connect() as conn:
+        for number in range(samples):
+            params = {"user_id": _user_id(rnd.randrange(users)), "device_id": f"device-{rnd.randrange(devices)}"}
+            transaction = conn.begin()
+            if number == 0:
+                plan = "\n".join(
+                    conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {DEACTIVATE}"), params).scalars().all()
+                )
+            result = conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {DEACTIVATE}"), params).scalar_one()
+            transaction.rollback()
+            timings.append(result[0]["Execution Time"])
+
+    quantiles = statistics.quantiles(timings, n=100)
+    return {
+        "samples": samples,
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(quantiles[49], 3),
+        "p95_ms": round(quantiles[94], 3),
+        "p99_ms": round(quantiles[98], 3),
+        "plan": plan,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в файл")
+    parser.add_argument("--keep", action="store_true", help="не удалять схему с данными")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.postgresql_url)
+    results: dict = {"rows": args.rows, "users": args.users, "devices": args.devices}
+
+    print(f"seeding {args.rows} rows...")
+    with engine.begin() as conn:
+        seed(conn, args.rows, args.users, args.devices)
+    results["before"] = measure(engine, args.users, args.devices, args.samples, args.seed)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX {INDEX} ON {TABLE} (user_id, device_id) WHERE is_active"))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    results["after"] = measure(engine, args.users, args.devices, args.samples, args.seed)
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    for stage in ("before", "after"):
+        stats = results[stage]
+        print(f"\n=== {stage} ===\n{stats['plan']}")
+        print(
+            f"mean {stats['mean_ms']} ms, p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, p99 {stats['p99_ms']} ms"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
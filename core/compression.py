@@ -0,0 +1,282 @@
+"""
+Сжатие ответов: zstd, brotli или gzip по заголовку Accept-Encoding клиента и порядку COMPRESSION_ENCODINGS.
+
+Ответ целиком (один http.response.body) сжимается за один вызов. Если у ответа есть ETag, то сжатое тело
+сохраняется в CompressedBodyCache, и следующий такой же ответ отправляется без сжатия. Потоковые ответы (экспорт)
+сжимаются по мере поступления частей, в памяти только буфер компрессора.
+
+zstandard и brotli необязательны: без пакета кодировка не предлагается, gzip (zlib) доступен всегда.
+"""
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 4  # 4-5 близко к gzip по скорости при лучшем сжатии, 11 - только для статики
+GZIP_LEVEL = 5
+
+# сжимаются только текстовые форматы: изображения, архивы и т.п. уже сжаты
+COMPRESSIBLE_TYPES: tuple[str, ...] = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+)
+EXCLUDED_TYPES: tuple[str, ...] = ("text/event-stream",)  # части SSE должны уходить клиенту сразу
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31 - формат gzip
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_compressors() -> dict[str, Callable[[], Compressor]]:
+    compressors: dict[str, Callable[[], Compressor]] = {"gzip": GzipCompressor}
+    if brotli is not None:
+        compressors["br"] = BrotliCompressor
+    if zstandard is not None:
+        compressors["zstd"] = ZstdCompressor
+    return compressors
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str, encodings: tuple[str, ...]) -> str | None:
+    """
+    Кодировка для ответа: с наибольшим q у клиента, при равных q - первая по порядку encodings (предпочтение
+    сервера). Значения заголовка у клиентов повторяются, поэтому результат кешируется.
+    Args:
+        accept_encoding: заголовок Accept-Encoding
+        encodings: доступные кодировки в порядке предпочтения
+    Returns:
+        кодировка или None - не сжимать
+    """
+    accepted: dict[str, float] = dict()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    best: str | None = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressedBodyCache:
+    """
+    LRU-кеш сжатых тел ответов, ограниченный суммарным размером в байтах. Ключ - путь, запрос, ETag и кодировка.
+    Рассчитан на работу внутри одного цикла событий, блокировок нет.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._data: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def get(self, key: tuple) -> bytes | None:
+        body = self._data.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def set(self, key: tuple, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._data[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._data), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+def is_compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    if content_type.startswith(EXCLUDED_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.split(";")[0].endswith(("+json", "+xml"))
+
+
+class CompressionMiddleware:
+    """
+    Замена GZipMiddleware: выбор zstd/br/gzip по Accept-Encoding, потоковое сжатие и кеш сжатых тел по ETag.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 2048,
+            encodings: tuple[str, ...] = ("zstd", "br", "gzip"),
+            cache: CompressedBodyCache | None = None
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressors = available_compressors()
+        self.encodings: tuple[str, ...] = tuple(encoding for encoding in encodings if encoding in self.compressors)
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding: str = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding, self.encodings) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """
+    Состояние одного ответа. http.response.start задерживается до первой части тела: по ней решается, сжимать ли
+    ответ и как (целиком, из кеша или потоком).
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, scope: Scope, encoding: str, send: Send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Message | None = None
+        self.compressor: Compressor | None = None
+        self.passthrough: bool = False
+
+    def _set_encoding_headers(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag  # сжатое представление побайтно отличается от исходного
+
+    def _compress_body(self, headers: MutableHeaders, body: bytes) -> bytes:
+        cache = self.middleware.cache
+        etag = headers.get("etag")
+        key = None
+        if cache is not None and etag:
+            key = (self.scope["path"], self.scope["query_string"], etag, self.encoding)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        compressor = self.middleware.compressors[self.encoding]()
+        compressed = compressor.compress(body) + compressor.finish()
+        if key is not None:
+            cache.set(key, compressed)
+        return compressed
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self.compressor is not None:  # продолжение потокового ответа
+            data = self.compressor.compress(body)
+            if not more_body:
+                data += self.compressor.finish()
+            if data or not more_body:
+                await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        headers = MutableHeaders(scope=self.start_message)
+        status = self.start_message["status"]
+        if status < 200 or status in (204, 304) or not is_compressible(headers) or \
+                (not more_body and len(body) < self.middleware.minimum_size):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        if not more_body:
+            compressed = self._compress_body(headers, body)
+            self._set_encoding_headers(headers)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        self.compressor = self.middleware.compressors[self.encoding]()
+        self._set_encoding_headers(headers)
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        await self._send(self.start_message)
+        data = self.compressor.compress(body)
+        if data:
+            await self._send({"type": "http.response.body", "body": data, "more_body": True})
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -15,12 +16,103 @@ class Settings(BaseSettings, case_sensitive=True):
     DB_PASS: str = Field(alias="DB_PASS")
     DB_HOST: str = Field(alias="DB_HOST")
     DB_PORT: str = Field(alias="DB_PORT")
+    DB_ECHO: bool = Field(default=False, alias="DB_ECHO")  # логирование всех SQL запросов, только для отладки
+    DB_POOL_SIZE: int = Field(default=5, ge=1, alias="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=10, ge=0, alias="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: float = Field(default=30.0, gt=0, alias="DB_POOL_TIMEOUT")  # секунд ожидания соединения
+    DB_POOL_RECYCLE: int = Field(default=1800, alias="DB_POOL_RECYCLE")  # секунд, -1 - не пересоздавать
+    DB_POOL_PRE_PING: bool = Field(default=True, alias="DB_POOL_PRE_PING")
+    DB_STATS_HEADERS: bool = Field(default=False, alias="DB_STATS_HEADERS")  # X-DB-Sessions, X-DB-Statements
+    DB_SLOW_QUERY_MS: float = Field(default=500.0, ge=0, alias="DB_SLOW_QUERY_MS")  # лог медленных запросов, 0 - нет
+    # предупреждение, если в одном HTTP запросе один вид SQL запроса выполнен больше N раз (N+1), 0 - не проверять
+    DB_REPEATED_STATEMENT_THRESHOLD: int = Field(default=10, ge=0, alias="DB_REPEATED_STATEMENT_THRESHOLD")
+
+    # response compression: порядок предпочтения кодировок, zstd и br - если установлены zstandard и brotli
+    COMPRESSION_ENCODINGS: list[str] = Field(default=["zstd", "br", "gzip"], alias="COMPRESSION_ENCODINGS")
+    COMPRESSION_MINIMUM_SIZE: int = Field(default=2048, ge=0, alias="COMPRESSION_MINIMUM_SIZE")  # байт
+    # кеш сжатых тел ответов с ETag, байт на воркер, 0 - кеш отключен
+    COMPRESSION_CACHE_MAX_BYTES: int = Field(default=32 * 1024 * 1024, ge=0, alias="COMPRESSION_CACHE_MAX_BYTES")
+
+    # response cache (ETag/304) for list and profile endpoints, на воркер; 0 - кеш отключен, ETag остается
+    RESPONSE_CACHE_MAX_BYTES: int = Field(default=16 * 1024 * 1024, ge=0, alias="RESPONSE_CACHE_MAX_BYTES")
+    RESPONSE_CACHE_TTL_SECONDS: float = Field(default=60.0, ge=0, alias="RESPONSE_CACHE_TTL_SECONDS")
+
+    # metrics
+    METRICS_ENABLED: bool = Field(default=True, alias="METRICS_ENABLED")  # MetricsMiddleware и /metrics
 
     # auth
     SECRET_KEY: str = Field(alias="SECRET_KEY")
     ALGORITHM: str = Field(alias="ALGORITHM")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(alias="ACCESS_TOKEN_EXPIRE_MINUTES")
     REFRESH_TOKEN_EXPIRE_HOURS: int = Field(alias="REFRESH_TOKEN_EXPIRE_HOURS")
+    # ключи PEM для ALGORITHM=EdDSA/ES256 (python -m app_account.jwt_keys), для HS* используется SECRET_KEY
+    JWT_PRIVATE_KEY_PATH: str | None = Field(default=None, alias="JWT_PRIVATE_KEY_PATH")
+    JWT_PUBLIC_KEY_PATH: str | None = Field(default=None, alias="JWT_PUBLIC_KEY_PATH")  # по умолчанию из закрытого
+    JWT_KEY_ID: str | None = Field(default=None, alias="JWT_KEY_ID")  # kid, по умолчанию отпечаток открытого ключа
+
+    # password hashing: bcrypt | argon2 (argon2id, нужен argon2-cffi); подбор: python -m app_account.hashing
+    PWD_HASH_SCHEME: Literal["bcrypt", "argon2"] = Field(default="bcrypt", alias="PWD_HASH_SCHEME")
+    PWD_BCRYPT_ROUNDS: int = Field(default=12, ge=4, le=31, alias="PWD_BCRYPT_ROUNDS")
+    PWD_ARGON2_TIME_COST: int = Field(default=3, ge=1, alias="PWD_ARGON2_TIME_COST")
+    PWD_ARGON2_MEMORY_COST: int = Field(default=65536, ge=8, alias="PWD_ARGON2_MEMORY_COST")  # КиБ
+    PWD_ARGON2_PARALLELISM: int = Field(default=1, ge=1, alias="PWD_ARGON2_PARALLELISM")
+
+    # password hashing pool
+    PWD_HASH_POOL_SIZE: int = Field(default=2, ge=1, alias="PWD_HASH_POOL_SIZE")  # процессов bcrypt на воркер
+    PWD_HASH_QUEUE_SIZE: int = Field(default=64, ge=0, alias="PWD_HASH_QUEUE_SIZE")  # ожидающих вызовов
+    PWD_HASH_TIMEOUT: float = Field(default=5.0, gt=0, alias="PWD_HASH_TIMEOUT")  # секунд ожидания в очереди
+
+    # jti -> user cache
+    JTI_CACHE_MAX_SIZE: int = Field(default=10000, ge=0, alias="JTI_CACHE_MAX_SIZE")  # 0 - кеш отключен
+    JTI_CACHE_TTL_SECONDS: float = Field(default=60.0, ge=0, alias="JTI_CACHE_TTL_SECONDS")
+
+    # verified access token cache (хеш токена -> payload), запись не дольше exp токена
+    JWT_CACHE_MAX_SIZE: int = Field(default=10000, ge=0, alias="JWT_CACHE_MAX_SIZE")  # 0 - кеш отключен
+    JWT_CACHE_TTL_SECONDS: float = Field(default=300.0, ge=0, alias="JWT_CACHE_TTL_SECONDS")
+
+    # stateless access token verification
+    AUTH_STATELESS: bool = Field(default=False, alias="AUTH_STATELESS")  # доверять claims подписанного access токена
+    REVOCATION_REFRESH_SECONDS: float = Field(default=30.0, gt=0, alias="REVOCATION_REFRESH_SECONDS")
+
+    # AuthenticationMiddleware: пути (префиксы), на которых токен не проверяется, и пути с refresh токеном
+    AUTH_PUBLIC_PATHS: list[str] = Field(default=[
+        "/docs", "/redoc", "/openapi.json", "/metrics", "/proba_path/",
+        "/account/register", "/account/login", "/account/logout", "/account/jwks",
+    ], alias="AUTH_PUBLIC_PATHS")
+    AUTH_REFRESH_PATHS: list[str] = Field(
+        default=["/account/update-tokens", "/account/update-access-token"], alias="AUTH_REFRESH_PATHS"
+    )
+
+    # login throttling (token bucket): memory (на воркер) | redis (общий для воркеров) | off
+    LOGIN_THROTTLE: Literal["memory", "redis", "off"] = Field(default="memory", alias="LOGIN_THROTTLE")
+    LOGIN_THROTTLE_USER_PER_MINUTE: float = Field(default=5.0, gt=0, alias="LOGIN_THROTTLE_USER_PER_MINUTE")
+    LOGIN_THROTTLE_USER_BURST: int = Field(default=5, ge=1, alias="LOGIN_THROTTLE_USER_BURST")
+    LOGIN_THROTTLE_IP_PER_MINUTE: float = Field(default=60.0, gt=0, alias="LOGIN_THROTTLE_IP_PER_MINUTE")
+    LOGIN_THROTTLE_IP_BURST: int = Field(default=20, ge=1, alias="LOGIN_THROTTLE_IP_BURST")
+    LOGIN_THROTTLE_MAX_KEYS: int = Field(default=100000, ge=1, alias="LOGIN_THROTTLE_MAX_KEYS")  # корзин в памяти
+    LOGIN_THROTTLE_SHARDS: int = Field(default=16, ge=1, alias="LOGIN_THROTTLE_SHARDS")
+    LOGIN_THROTTLE_REDIS_URL: str = Field(default="redis://127.0.0.1:6379/0", alias="LOGIN_THROTTLE_REDIS_URL")
+    LOGIN_THROTTLE_KEY_PREFIX: str = Field(default="login", alias="LOGIN_THROTTLE_KEY_PREFIX")
+    # IP/подсети балансировщиков и прокси: только от них принимается X-Forwarded-For для корзины IP. Пусто - IP
+    # соединения; если X-Forwarded-For разбирает uvicorn (--proxy-headers --forwarded-allow-ips), оставить пустым
+    TRUSTED_PROXIES: list[str] = Field(default=[], alias="TRUSTED_PROXIES")
+
+    # token table partitions
+    TOKEN_PARTITION_PREMAKE_DAYS: int = Field(default=7, ge=1, alias="TOKEN_PARTITION_PREMAKE_DAYS")
+    # период обслуживания партиций в воркере, 0 - только вручную: python -m app_account.partitions
+    TOKEN_PARTITION_CHECK_SECONDS: float = Field(default=3600.0, ge=0, alias="TOKEN_PARTITION_CHECK_SECONDS")
+
+    # token state store: postgres | memory (один воркер) | redis
+    TOKEN_STORE: Literal["postgres", "memory", "redis"] = Field(default="postgres", alias="TOKEN_STORE")
+    TOKEN_STORE_REDIS_URL: str = Field(default="redis://127.0.0.1:6379/0", alias="TOKEN_STORE_REDIS_URL")
+    TOKEN_STORE_KEY_PREFIX: str = Field(default="tokens", alias="TOKEN_STORE_KEY_PREFIX")
+
+    # bulk operations
+    BULK_BATCH_SIZE: int = Field(default=1000, ge=1, le=5000, alias="BULK_BATCH_SIZE")  # строк в одном SQL запросе
+    BULK_MAX_ITEMS: int = Field(default=10000, ge=1, alias="BULK_MAX_ITEMS")  # строк в одном HTTP запросе
+
+    # bulk user import (python -m app_account.importer)
+    USER_IMPORT_HASH_WORKERS: int = Field(default=0, ge=0, alias="USER_IMPORT_HASH_WORKERS")  # 0 - по числу ядер
 
     # App
     APPLICATION: str = Field(alias="APPLICATION")
@@ -30,10 +122,25 @@ class Settings(BaseSettings, case_sensitive=True):
     # class Config:
     #     secrets_dir = BASE_DIR / "secrets"  # директория, где хранится файл с паролем.
 
+    @property
+    def engine_options(self) -> dict:
+        return {
+            "echo": self.DB_ECHO,
+            "pool_size": self.DB_POOL_SIZE,
+            "max_overflow": self.DB_MAX_OVERFLOW,
+            "pool_timeout": self.DB_POOL_TIMEOUT,
+            "pool_recycle": self.DB_POOL_RECYCLE,
+            "pool_pre_ping": self.DB_POOL_PRE_PING,
+        }
+
     @property
     def postgresql_url(self) -> str:
         return f"postgresql+psycopg2://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def postgresql_async_url(self) -> str:
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
 
 settings = Settings()
 
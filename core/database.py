@@ -1,27 +1,182 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, AsyncIterator
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import DeclarativeBase
 
 from core.config import settings
+from core.pool import MeasuredAsyncQueuePool
 
 
-DATABASE_URL = settings.postgresql_url
+logger = logging.getLogger(__name__)
 
-engine = create_engine(DATABASE_URL, echo=True)  # echo=True для отладки
+ASYNC_DATABASE_URL = settings.postgresql_async_url
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=MeasuredAsyncQueuePool, **settings.engine_options)
 
 
-# Dependency
-def get_db():
+class RequestDBStats:
     """
-    Независимый сеанс/соединение с базой данных (SessionLocal) для каждого запроса, использовать
-    один и тот же сеанс для всех запросов, а затем закрыть его после завершения запроса.
+    Счетчики работы с БД в рамках одного запроса: открытые сессии, выполненные SQL запросы и время их выполнения,
+    число выполнений каждого вида запроса (normalize_sql).
     """
-    db = SessionLocal()
-    try:
+    __slots__ = ("sessions", "statements", "seconds", "shapes")
+
+    def __init__(self):
+        self.sessions: int = 0
+        self.statements: int = 0
+        self.seconds: float = 0.0
+        self.shapes: dict[str, int] = dict()
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Виды запросов, выполненные в запросе больше threshold раз (признак N+1), по убыванию числа выполнений.
+        """
+        repeated = [(shape, count) for shape, count in self.shapes.items() if count > threshold]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+
+# Устанавливается middleware на время запроса, вне запроса None
+request_db_stats: ContextVar[RequestDBStats | None] = ContextVar("request_db_stats", default=None)
+
+
+class CountedAsyncSession(AsyncSession):
+    """ AsyncSession, которая учитывается в счетчиках текущего запроса. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        stats: RequestDBStats | None = request_db_stats.get()
+        if stats is not None:
+            stats.sessions += 1
+
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|\b\d+(?:\.\d+)?\b")
+_SQL_REPEATED_GROUPS = re.compile(r"(\([^()]*\))(?:, \1)+")  # VALUES (?, ?), (?, ?), ... и IN (?, ?, ...)
+_SQL_REPEATED_PARAMS = re.compile(r"\?(?:, \?)+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    """
+    Вид SQL запроса: литералы и параметры заменены на ?, повторяющиеся группы значений свернуты, пробелы схлопнуты.
+    Тексты запросов берутся SQLAlchemy из кеша компиляции, поэтому разбор выполняется один раз на вид запроса.
+    """
+    shape = " ".join(statement.split())
+    shape = _SQL_LITERALS.sub("?", shape)
+    shape = _SQL_REPEATED_PARAMS.sub("?, ...", shape)
+    return _SQL_REPEATED_GROUPS.sub(r"\1, ...", shape)
+
+
+def redact_parameters(parameters: Any, executemany: bool) -> str:
+    """ Параметры запроса для лога без значений: только типы. """
+    if executemany:
+        return f"{len(parameters)} наборов параметров"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context.statement_started = time.perf_counter()
+    stats: RequestDBStats | None = request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        if settings.DB_REPEATED_STATEMENT_THRESHOLD:
+            shape = normalize_sql(statement)
+            stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _time_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    started: float | None = getattr(context, "statement_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats: RequestDBStats | None = request_db_stats.get()
+    if stats is not None:
+        stats.seconds += elapsed
+    if settings.DB_SLOW_QUERY_MS and elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+        logger.warning(
+            "Медленный SQL запрос, %.1f мс: %s; параметры: %s",
+            elapsed * 1000, normalize_sql(statement)[:2000], redact_parameters(parameters, executemany)
+        )
+
+
+# expire_on_commit=False: после commit атрибуты не истекают, иначе обращение к ним потребует ленивой загрузки,
+# которая в асинхронном режиме невозможна.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=CountedAsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+REQUEST_SESSION_SCOPE_KEY = "db_session"  # RequestSession запроса, устанавливается RequestSessionMiddleware
+
+
+class RequestSession:
+    """
+    Одна сессия на HTTP запрос: создается при первом обращении (аутентификация в AuthenticationMiddleware или
+    get_async_db), поэтому запрос без работы с БД сессию не открывает. Закрывается после обработчика get_async_db,
+    а если он не использовался - RequestSessionMiddleware.
+    """
+    __slots__ = ("_session",)
+
+    def __init__(self):
+        self._session: AsyncSession | None = None
+
+    def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = AsyncSessionLocal()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+@asynccontextmanager
+async def request_session(scope: dict) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия HTTP запроса из scope. Без RequestSessionMiddleware - отдельная сессия, закрывается при выходе из блока.
+    """
+    holder: RequestSession | None = scope.get(REQUEST_SESSION_SCOPE_KEY)
+    if holder is not None:
+        yield holder.get()
+        return
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# Dependency
+async def get_async_db(request: Request):
+    """
+    Асинхронный сеанс с базой данных (AsyncSessionLocal) для каждого запроса. Ожидание ответа Postgres не занимает
+    поток из пула. Сессия общая с аутентификацией (request_session), поэтому пользователь токена и обработчик
+    используют одно соединение; её же следует передавать в CRUD. Закрывается при выходе из зависимости; обработчик,
+    отдающий ответ потоком (StreamingResponse), закрывает её сам (db.close()) до начала потока.
+    """
+    async with request_session(request.scope) as db:
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+def pool_stats() -> dict[str, int | float]:
+    """
+    Состояние пула соединений асинхронного движка: выданные соединения, overflow, время ожидания, отказы.
+    """
+    return async_engine.pool.stats()
 
 
 class Base(DeclarativeBase):
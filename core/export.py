@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import suppress
+from enum import Enum
+from typing import AsyncIterator, Final
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, func, literal_column, select
+from sqlalchemy.dialects import postgresql
+
+from core.database import async_engine
+
+
+# сколько блоков COPY может ждать отправки клиенту; при медленном клиенте COPY приостанавливается
+EXPORT_QUEUE_CHUNKS: Final[int] = 16
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+MEDIA_TYPES: Final[dict] = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+# NDJSON выгружается как CSV из одной колонки row_to_json: кавычка и разделитель - управляющие символы, которых нет
+# в JSON, поэтому строка выводится без экранирования (в FORMAT text были бы удвоены обратные слеши)
+COPY_OPTIONS: Final[dict] = {
+    ExportFormat.CSV: {"format": "csv", "header": True},
+    ExportFormat.NDJSON: {"format": "csv", "delimiter": "\x02", "quote": "\x01"},
+}
+
+
+def _copy_sql(query: Select, export_format: ExportFormat) -> str:
+    """
+    SQL для COPY (...) TO STDOUT. В запросе не должно быть пользовательских параметров: они подставляются в текст.
+    """
+    if export_format is ExportFormat.NDJSON:
+        query = select(func.row_to_json(literal_column("t"))).select_from(query.subquery("t"))
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def copy_to_stdout(query: Select, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Выполняет COPY (query) TO STDOUT на отдельном соединении из пула и отдает данные блоками по мере получения от
+    Postgres. Строки не превращаются в объекты ORM, в памяти держится не больше EXPORT_QUEUE_CHUNKS блоков.
+    Если клиент отключился, то COPY прерывается, а соединение возвращается в пул.
+    Args:
+        query: select
+        export_format: csv или ndjson
+    Returns:
+        асинхронный итератор блоков
+    """
+    sql = _copy_sql(query, export_format)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    finished = object()
+
+    async def output(data: bytes | bytearray | memoryview) -> None:
+        await queue.put(bytes(data))  # буфер asyncpg переиспользуется, данные копируются
+
+    async def produce() -> None:
+        result: object = finished
+        try:
+            async with async_engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_query(sql, output=output, **COPY_OPTIONS[export_format])
+        except Exception as exc:
+            result = exc
+        await queue.put(result)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is finished:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
+
+
+def export_response(query: Select, export_format: ExportFormat, filename: str) -> StreamingResponse:
+    """
+    StreamingResponse с выгрузкой запроса в csv/ndjson.
+    Args:
+        query: select
+        export_format: csv или ndjson
+        filename: имя файла без расширения
+    Returns:
+        StreamingResponse
+    """
+    return StreamingResponse(
+        copy_to_stdout(query, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format.value}"'},
+    )
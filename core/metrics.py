@@ -0,0 +1,170 @@
+"""
+Метрики HTTP запросов в текстовом формате Prometheus (/metrics).
+
+Счетчики изменяются только в цикле событий воркера, поэтому блокировок нет: на запрос приходится несколько
+обращений к словарям и bisect по границам корзин. Состояние пулов (соединения с БД, потоки, хеширование паролей)
+не накапливается, а снимается сборщиками (register_collector) в момент запроса /metrics. Метрики свои у каждого
+процесса, при нескольких воркерах Prometheus собирает их с каждого по отдельности.
+"""
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+import anyio.to_thread
+
+
+LATENCY_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_STATEMENT_BUCKETS: tuple[float, ...] = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED_ROUTE = "<unmatched>"  # путь без маршрута не попадает в метки, иначе число рядов не ограничено
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple, float] = dict()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин. Хранятся некумулятивные счетчики корзин, накопленные суммы
+    считаются только при выводе.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values: dict[tuple, list] = dict()  # метки -> [счетчики корзин + +Inf, сумма]
+
+    def observe(self, labels: tuple, value: float) -> None:
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        item[0][bisect_left(self.buckets, value)] += 1
+        item[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.label_names, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Метрики HTTP запросов воркера и сборщики состояния пулов.
+    """
+
+    def __init__(self):
+        route = ("method", "route")
+        self.in_progress: int = 0
+        self.requests = Counter("http_requests_total", "HTTP запросы по маршруту и коду ответа.", route + ("status",))
+        self.exceptions = Counter(
+            "http_request_exceptions_total", "Необработанные исключения по маршруту.", route + ("exception",)
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Время обработки HTTP запроса.", route, LATENCY_BUCKETS
+        )
+        self.db_statements = Histogram(
+            "http_request_db_statements", "SQL запросов на один HTTP запрос.", route, DB_STATEMENT_BUCKETS
+        )
+        self.db_time = Histogram(
+            "http_request_db_seconds", "Время выполнения SQL запросов за один HTTP запрос.", route, LATENCY_BUCKETS
+        )
+        self._collectors: dict[str, Callable[[], dict[str, int | float]]] = dict()
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict[str, int | float]]) -> None:
+        """
+        Регистрирует сборщик состояния: collect() вызывается при каждом запросе /metrics, каждое числовое значение
+        выводится как gauge {prefix}_{ключ}.
+        """
+        self._collectors[prefix] = collect
+
+    def observe_request(
+            self,
+            method: str,
+            route: str,
+            status: int,
+            seconds: float,
+            db_statements: int,
+            db_seconds: float,
+            exception: str | None = None
+    ) -> None:
+        labels = (method, route)
+        self.requests.inc((method, route, status))
+        self.latency.observe(labels, seconds)
+        self.db_statements.observe(labels, db_statements)
+        self.db_time.observe(labels, db_seconds)
+        if exception is not None:
+            self.exceptions.inc((method, route, exception))
+
+    @staticmethod
+    def _gauge(name: str, value: float, documentation: str = "") -> list[str]:
+        lines = [f"# HELP {name} {documentation}"] if documentation else []
+        return lines + [f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus. Вызывается в цикле событий (нужен для пула потоков anyio).
+        """
+        lines: list[str] = []
+        lines += self._gauge("http_requests_in_progress", self.in_progress, "HTTP запросы в обработке.")
+        for metric in (self.requests, self.exceptions, self.latency, self.db_statements, self.db_time):
+            lines += metric.render()
+
+        # пул потоков, в котором выполняются синхронные обработчики и зависимости (def вместо async def)
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        thread_stats = limiter.statistics()
+        lines += self._gauge("threadpool_tokens_total", limiter.total_tokens, "Размер пула потоков.")
+        lines += self._gauge("threadpool_tokens_borrowed", thread_stats.borrowed_tokens, "Занятые потоки.")
+        lines += self._gauge("threadpool_tasks_waiting", thread_stats.tasks_waiting, "Вызовы в очереди к пулу.")
+
+        for prefix, collect in self._collectors.items():
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    lines += self._gauge(f"{prefix}_{key}", value)
+        return "\n".join(lines) + "\n"
+
+
+def route_label(route: object | None) -> str:
+    """ Шаблон пути маршрута (/account/user/{user_id}), а не сам путь запроса. """
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+metrics = Metrics()
@@ -0,0 +1,129 @@
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+from core.database import REQUEST_SESSION_SCOPE_KEY, RequestDBStats, RequestSession, request_db_stats
+from core.metrics import metrics, route_label
+
+
+logger = logging.getLogger(__name__)
+
+
+class DBStatsMiddleware:
+    """
+    Считает сессии и SQL запросы каждого HTTP запроса (RequestDBStats). Итог пишется в лог с уровнем DEBUG и, если
+    headers=True, возвращается в заголовках ответа X-DB-Sessions и X-DB-Statements. Если один вид SQL запроса
+    выполнен больше DB_REPEATED_STATEMENT_THRESHOLD раз, то пишется предупреждение (вероятный N+1).
+    """
+
+    def __init__(self, app: ASGIApp, headers: bool = False):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = request_db_stats.set(stats)
+
+        async def send_with_stats(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.headers:
+                headers = MutableHeaders(scope=message)
+                headers.append("X-DB-Sessions", str(stats.sessions))
+                headers.append("X-DB-Statements", str(stats.statements))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            request_db_stats.reset(token)
+            logger.debug(
+                "%s %s: db sessions=%d statements=%d seconds=%.4f",
+                scope["method"], scope["path"], stats.sessions, stats.statements, stats.seconds
+            )
+            if settings.DB_REPEATED_STATEMENT_THRESHOLD:
+                for shape, count in stats.repeated_statements(settings.DB_REPEATED_STATEMENT_THRESHOLD):
+                    logger.warning(
+                        "%s %s: SQL запрос выполнен %d раз за запрос (N+1?): %s",
+                        scope["method"], scope["path"], count, shape[:2000]
+                    )
+
+
+class MetricsMiddleware:
+    """
+    Записывает в metrics (core.metrics) время обработки, код ответа, число и время SQL запросов каждого HTTP
+    запроса по шаблону маршрута, ведет счетчик запросов в обработке. Счетчики БД берутся из RequestDBStats запроса:
+    если DBStatsMiddleware подключен снаружи, то используется его объект, иначе создается свой.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats: RequestDBStats | None = request_db_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestDBStats()
+            token = request_db_stats.set(stats)
+
+        status_code = 500  # если ответ не начат до исключения
+        exception: str | None = None
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.in_progress += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exc:
+            exception = type(exc).__name__
+            raise
+        finally:
+            metrics.in_progress -= 1
+            metrics.observe_request(
+                scope["method"],
+                route_label(scope.get("route")),  # маршрут записывается в scope роутером FastAPI
+                status_code,
+                time.perf_counter() - started,
+                stats.statements,
+                stats.seconds,
+                exception,
+            )
+            if token is not None:
+                request_db_stats.reset(token)
+
+
+class RequestSessionMiddleware:
+    """
+    Кладет в scope RequestSession: аутентификация и get_async_db берут из него одну сессию на запрос. После ответа
+    закрывает сессию, если её не закрыл get_async_db (маршрут без БД, ошибка аутентификации). Подключается снаружи
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        holder = RequestSession()
+        scope[REQUEST_SESSION_SCOPE_KEY] = holder
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await holder.close()
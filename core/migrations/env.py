@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -33,6 +34,16 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 # target_metadata = None
 
+# Партиции таблиц токенов создаются и удаляются app_account.partitions, autogenerate не должен их трогать
+PARTITION_NAME = re.compile(r"^assigned_jwt_(access|refresh)_token_(p\d{8}|default)$")
+
+
+def include_name(name, type_, parent_names) -> bool:
+    if type_ == "table":
+        return PARTITION_NAME.match(name) is None
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -85,6 +96,7 @@ def run_migrations_online() -> None:
             compare_index=True,  # отслеживать изменения индексов
             compare_foreign_keys=True,  # Отслеживание внешних ключей
             render_item_type=True,  # Принудительное создание VARCHAR для String
+            include_name=include_name,  # без партиций таблиц токенов
             # compare_metadata=False,  # Отключает сравнение моделей и БД. Полезно, если миграции пишутся вручную.
         )
 
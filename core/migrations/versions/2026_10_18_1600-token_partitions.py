@@ -0,0 +1,127 @@
+"""token_partitions
+
+Revision ID: df45dfdd7c4e
+Revises: a787a188bb93
+Create Date: 2026-10-18 16:00:12.204871
+
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "df45dfdd7c4e"
+down_revision: Union[str, None] = "a787a188bb93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TOKEN_TABLES = ("assigned_jwt_access_token", "assigned_jwt_refresh_token")
+PREMAKE_DAYS = 7  # дальше партиции создает app_account.partitions
+
+COLUMNS = """
+    id BIGINT NOT NULL DEFAULT nextval('{table}_id_seq'::regclass),
+    jti UUID NOT NULL,
+    is_active BOOLEAN NOT NULL,
+    expired_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    device_id VARCHAR(100) NOT NULL DEFAULT 'Не указано',
+    user_id UUID NOT NULL
+"""
+
+COMMENTS = {
+    "jti": "Идентификатор токена",
+    "is_active": "Активен",
+    "expired_time": "Окончание доступа",
+    "device_id": "Устройство пользователя",
+}
+
+
+def _comment_columns(table: str) -> None:
+    for column, comment in COMMENTS.items():
+        op.execute(f"COMMENT ON COLUMN {table}.{column} IS '{comment}'")
+
+
+def _partition_table(table: str) -> None:
+    """
+    Пересоздает таблицу токенов как секционированную по expired_time (партиция на сутки UTC + DEFAULT). Переносятся
+    только не истекшие строки, поэтому запись в таблицу блокируется на время, пропорциональное числу живых токенов,
+    а не размеру таблицы. Чтение не блокируется до момента замены таблиц.
+    """
+    op.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    op.execute(
+        f"""
+        CREATE TABLE {table}_new (
+            {COLUMNS.format(table=table)},
+            CONSTRAINT {table}_new_pkey PRIMARY KEY (id, expired_time),
+            CONSTRAINT {table}_new_jti_key UNIQUE (jti, expired_time),
+            CONSTRAINT {table}_new_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (expired_time)
+        """
+    )
+    today = datetime.now(tz=timezone.utc).date()
+    for shift in range(-1, PREMAKE_DAYS + 1):
+        day = today + timedelta(days=shift)
+        op.execute(
+            f"CREATE TABLE {table}_p{day:%Y%m%d} PARTITION OF {table}_new "
+            f"FOR VALUES FROM ('{day:%Y-%m-%d} 00:00:00+00') TO ('{day + timedelta(days=1):%Y-%m-%d} 00:00:00+00')"
+        )
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table}_new DEFAULT")
+
+    op.execute(
+        f"""
+        INSERT INTO {table}_new (id, jti, is_active, expired_time, device_id, user_id)
+        SELECT id, jti, is_active, expired_time, device_id, user_id FROM {table} WHERE expired_time > now()
+        """
+    )
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    op.drop_table(table)
+
+    op.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for suffix in ("pkey", "jti_key", "user_id_fkey"):
+        op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {table}_new_{suffix} TO {table}_{suffix}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.create_index(op.f(f"ix_{table}_jti"), table, ["jti"], unique=False)
+    _comment_columns(table)
+
+
+def _unpartition_table(table: str) -> None:
+    op.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    op.execute(
+        f"""
+        CREATE TABLE {table}_old (
+            {COLUMNS.format(table=table)},
+            CONSTRAINT {table}_old_pkey PRIMARY KEY (id),
+            CONSTRAINT {table}_old_jti_key UNIQUE (jti),
+            CONSTRAINT {table}_old_user_id_fkey FOREIGN KEY (user_id) REFERENCES "user" (id) ON DELETE CASCADE
+        )
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO {table}_old (id, jti, is_active, expired_time, device_id, user_id)
+        SELECT id, jti, is_active, expired_time, device_id, user_id FROM {table} WHERE expired_time > now()
+        """
+    )
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    op.drop_table(table)  # вместе с партициями
+
+    op.execute(f"ALTER TABLE {table}_old RENAME TO {table}")
+    for suffix in ("pkey", "jti_key", "user_id_fkey"):
+        op.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {table}_old_{suffix} TO {table}_{suffix}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.create_index(op.f(f"ix_{table}_jti"), table, ["jti"], unique=True)
+    _comment_columns(table)
+
+
+def upgrade() -> None:
+    for table in TOKEN_TABLES:
+        _partition_table(table)
+
+
+def downgrade() -> None:
+    for table in TOKEN_TABLES:
+        _unpartition_table(table)
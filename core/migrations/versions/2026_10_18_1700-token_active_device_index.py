@@ -0,0 +1,56 @@
+"""token_active_device_index
+
+Revision ID: 46283b43d61f
+Revises: df45dfdd7c4e
+Create Date: 2026-10-18 17:00:41.918245
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "46283b43d61f"
+down_revision: Union[str, None] = "df45dfdd7c4e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TOKEN_TABLES = ("assigned_jwt_access_token", "assigned_jwt_refresh_token")
+
+
+def _index_name(table: str) -> str:
+    return f"ix_{table}_user_id_device_id_active"
+
+
+def upgrade() -> None:
+    """
+    Частичный индекс (user_id, device_id) WHERE is_active для деактивации токенов устройства. CREATE INDEX
+    CONCURRENTLY на секционированной таблице невозможен, поэтому индекс создается на родителе (ON ONLY, без
+    построения), затем CONCURRENTLY на каждой партиции и подключается к родителю. Запись в таблицы не блокируется.
+    """
+    conn = op.get_bind()
+    for table in TOKEN_TABLES:
+        index = _index_name(table)
+        op.execute(f"CREATE INDEX {index} ON ONLY {table} (user_id, device_id) WHERE is_active")
+        partitions = conn.execute(
+            sa.text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table AS regclass)"),
+            {"table": table},
+        ).scalars().all()
+
+        with op.get_context().autocommit_block():
+            for partition in partitions:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_user_device_active_idx "
+                    f"ON {partition} (user_id, device_id) WHERE is_active"
+                )
+        for partition in partitions:
+            op.execute(f"ALTER INDEX {index} ATTACH PARTITION {partition}_user_device_active_idx")
+
+
+def downgrade() -> None:
+    for table in TOKEN_TABLES:
+        op.drop_index(_index_name(table), table_name=table)  # индексы партиций удаляются вместе с ним
@@ -0,0 +1,32 @@
+"""user_created_index
+
+Revision ID: 0c5e7b1a9f42
+Revises: 46283b43d61f
+Create Date: 2026-10-18 18:00:07.513920
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0c5e7b1a9f42"
+down_revision: Union[str, None] = "46283b43d61f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Индекс (created, id) для постраничного вывода пользователей (keyset). Создается CONCURRENTLY, запись в таблицу
+    не блокируется.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index("ix_user_created_id", "user", ["created", "id"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_user_created_id", table_name="user", postgresql_concurrently=True)
@@ -0,0 +1,46 @@
+"""user_password_length
+
+Revision ID: 5b9e2d7c4a18
+Revises: 0c5e7b1a9f42
+Create Date: 2026-10-18 19:00:03.118402
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b9e2d7c4a18"
+down_revision: Union[str, None] = "0c5e7b1a9f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Хеш пароля до 255 символов: хеш argon2id с параметрами по умолчанию - 97 символов, с большими memory_cost и
+    parallelism не помещается в 100. Увеличение длины varchar не перезаписывает таблицу.
+    """
+    op.alter_column(
+        "user",
+        "password",
+        existing_type=sa.VARCHAR(length=100),
+        type_=sa.String(length=255),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    """
+    Не выполнится, если уже есть хеши длиннее 100 символов (argon2 с большой стоимостью).
+    """
+    op.alter_column(
+        "user",
+        "password",
+        existing_type=sa.String(length=255),
+        type_=sa.VARCHAR(length=100),
+        existing_nullable=False,
+    )
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import json
+from typing import Any, Callable, Final, Generic, Sequence, TypeVar
+
+from fastapi import HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+from sqlalchemy import Select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+
+PAGE_DEFAULT_LIMIT: Final[int] = 50
+PAGE_MAX_LIMIT: Final[int] = 500
+
+T = TypeVar("T")
+
+
+class PageParams(BaseModel):
+    limit: int = PAGE_DEFAULT_LIMIT
+    after: str | None = None
+    estimate_total: bool = False
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T] = Field(description="Строки страницы")
+    next_cursor: str | None = Field(default=None, description="Курсор следующей страницы, None - страница последняя")
+    total_estimate: int | None = Field(
+        default=None, description="Примерное число строк (pg_class.reltuples), если запрошено и доступно"
+    )
+
+
+def page_params(
+        limit: int = Query(default=PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT, description="Размер страницы"),
+        after: str | None = Query(default=None, description="Курсор: next_cursor предыдущей страницы"),
+        estimate_total: bool = Query(default=False, description="Вернуть примерное число строк по статистике БД"),
+) -> PageParams:
+    """
+    Зависимость FastAPI: параметры постраничного вывода из query.
+    """
+    return PageParams(limit=limit, after=after, estimate_total=estimate_total)
+
+
+def exc_invalid_cursor():
+    """
+    Поднимает исключение, если курсор не удалось разобрать.\n
+    raise HTTPException, status.HTTP_400_BAD_REQUEST
+    """
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Непрозрачный курсор из значений ключа последней строки страницы.
+    Args:
+        values: значения колонок ключа сортировки
+    Returns:
+        str: urlsafe base64 без выравнивания
+    """
+    raw = json.dumps(jsonable_encoder(list(values)), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[Any], Any]]) -> list:
+    """
+    Разбирает курсор encode_cursor и приводит значения к типам колонок ключа. Если курсор поврежден или подделан,
+    то вызовет HTTP_400_BAD_REQUEST.
+    Args:
+        cursor: значение параметра after
+        types: конструкторы значений в порядке колонок ключа (например, datetime.fromisoformat, UUID)
+    Returns:
+        list: значения ключа
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return [type_(value) for type_, value in zip(types, values)]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        exc_invalid_cursor()
+
+
+def keyset(query: Select, columns: Sequence[InstrumentedAttribute], after: Sequence[Any] | None, limit: int) -> Select:
+    """
+    Добавляет к запросу условие keyset: строки строго после ключа after в порядке columns. Выбирается limit + 1 строка,
+    лишняя строка показывает, что есть следующая страница. Для columns нужен индекс в том же порядке.
+    Args:
+        query: select
+        columns: колонки ключа сортировки, последняя - уникальная
+        after: значения ключа последней строки предыдущей страницы или None
+        limit: размер страницы
+    Returns:
+        select
+    """
+    if after is not None:
+        query = query.where(tuple_(*columns) > tuple_(*after))
+    return query.order_by(*columns).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], columns: Sequence[InstrumentedAttribute], limit: int) -> tuple[list, str | None]:
+    """
+    Отделяет лишнюю строку, выбранную keyset, и строит курсор следующей страницы.
+    Returns:
+        tuple: строки страницы и next_cursor или None
+    """
+    items = list(rows[:limit])
+    if len(rows) <= limit:
+        return items, None
+    last = items[-1]
+    return items, encode_cursor([getattr(last, column.key) for column in columns])
+
+
+async def estimate_count(db: AsyncSession, table_name: str) -> int | None:
+    """
+    Примерное число строк таблицы по статистике планировщика (pg_class.reltuples) без COUNT(*). Точность зависит
+    от давности ANALYZE/autovacuum. Вернет None, если статистика еще не собиралась.
+    Args:
+        db: session of the request
+        table_name: имя таблицы
+    Returns:
+        int or None
+    """
+    resp = await db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"), {"table": f'"{table_name}"'}
+    )
+    reltuples: int | None = resp.scalar_one_or_none()
+    return reltuples if reltuples is not None and reltuples >= 0 else None
@@ -0,0 +1,46 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class MeasuredAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений асинхронного движка со счетчиками выдачи соединений: количество, суммарное и максимальное время
+    ожидания соединения (включая pre-ping и открытие нового соединения), количество отказов по pool_timeout.
+    """
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Текущее состояние пула и накопленные счетчики.
+        """
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_total_seconds": round(self.wait_total, 6),
+            "wait_avg_seconds": round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_max_seconds": round(self.wait_max, 6),
+        }
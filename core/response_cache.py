@@ -0,0 +1,163 @@
+"""
+Кеш готовых (сериализованных) ответов списков и профиля с ETag и ответом 304 Not Modified.
+
+На каждый запрос выполняется дешевый запрос-валидатор (например, count(*) и max(updated) пользователей). Если
+валидатор совпадает с сохраненным вместе с телом ответа, то данные не запрашиваются и не сериализуются заново.
+ETag - хеш тела ответа, поэтому он одинаков во всех воркерах для одинаковых данных. Если клиент прислал этот ETag в
+If-None-Match, то возвращается 304 без тела.
+
+Записи помечаются тегами и удаляются при записи через CRUD этого воркера (invalidate_tag). Изменения, которые
+валидатор не замечает и которые сделаны в другом процессе, станут видны не позже, чем через RESPONSE_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, NamedTuple
+
+from fastapi import Request, Response, status
+
+from core.config import settings
+
+
+class CachedResponse(NamedTuple):
+    validator: Any
+    etag: str
+    body: bytes
+    media_type: str
+    expires: float
+    tags: tuple
+
+
+class ResponseCache:
+    """
+    LRU-кеш ответов, ограниченный суммарным размером тел в байтах, со временем жизни записи и тегами.
+    Рассчитан на работу внутри одного цикла событий, блокировок нет.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes: int = max_bytes
+        self.ttl: float = ttl
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.not_modified: int = 0
+        self._data: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._tags: dict[Hashable, set[Hashable]] = dict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, validator: Any) -> CachedResponse | None:
+        """
+        Запись по ключу, если она не истекла и сохранена при том же значении валидатора.
+        """
+        entry = self._data.get(key)
+        if entry is None or entry.expires <= time.monotonic() or entry.validator != validator:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: Hashable, entry: CachedResponse) -> None:
+        if not self.enabled or len(entry.body) > self.max_bytes:
+            return
+        self._remove(key)
+        self._data[key] = entry
+        self.size += len(entry.body)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._data)))
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        for key in self._tags.pop(tag, ()):
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._tags.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._data),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Слабое сравнение (RFC 9110): W/ не учитывается, сжатый ответ (CompressionMiddleware) отдает ETag как W/"...".
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def cached_response(
+        request: Request,
+        key: Hashable,
+        validator: Any,
+        render: Callable[[], Awaitable[Response]],
+        tags: Iterable[Hashable] = ()
+) -> Response:
+    """
+    Ответ из кеша или из render(), с заголовком ETag; 304, если ETag совпал с If-None-Match.
+    Args:
+        request: запрос (заголовок If-None-Match)
+        key: ключ ответа - маршрут и параметры, от которых зависит тело
+        validator: текущее значение валидатора данных, None - не кешировать (например, записи нет)
+        render: построение ответа с телом (PydanticResponse), вызывается только при промахе
+        tags: теги для invalidate_tag при записи
+    Returns:
+        Response
+    """
+    entry = response_cache.get(key, validator) if validator is not None else None
+    if entry is None:
+        response = await render()
+        if validator is None or response.status_code != status.HTTP_200_OK:
+            return response
+        entry = CachedResponse(
+            validator=validator,
+            etag=make_etag(response.body),
+            body=response.body,
+            media_type=response.media_type,
+            expires=time.monotonic() + response_cache.ttl,
+            tags=tuple(tags),
+        )
+        response_cache.set(key, entry)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}  # клиент кеширует, но каждый раз проверяет ETag
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        response_cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+response_cache = ResponseCache(max_bytes=settings.RESPONSE_CACHE_MAX_BYTES, ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def type_adapter(schema: Any) -> TypeAdapter:
+    """
+    TypeAdapter на тип схемы. Построение валидатора/сериализатора дорогое, поэтому адаптер создается один раз.
+    """
+    return TypeAdapter(schema)
+
+
+def validate(schema: Any, data: Any) -> Any:
+    """
+    Одна валидация данных (в том числе строк ORM - from_attributes) по схеме.
+    Args:
+        schema: схема или тип, например list[FullUserSchema]
+        data: данные
+    Returns:
+        экземпляр схемы
+    """
+    return type_adapter(schema).validate_python(data, from_attributes=True)
+
+
+class PydanticResponse(ORJSONResponse):
+    """
+    Ответ из уже провалидированной модели. Если обработчик возвращает Response, то FastAPI не выполняет повторную
+    проверку по response_model (она остается для документации). Модель выгружается сериализатором pydantic-core
+    (mode="json") без jsonable_encoder, в байты - orjson.
+    """
+
+    def render(self, content: BaseModel) -> bytes:
+        return super().render(type_adapter(type(content)).dump_python(content, mode="json"))
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Response, status
+
+from core.database import pool_stats
+from core.metrics import CONTENT_TYPE, metrics
+
+router = APIRouter(tags=["service"])
+metrics_router = APIRouter(tags=["service"])  # без префикса: Prometheus по умолчанию опрашивает /metrics
+
+
+@router.get("/db-pool", status_code=status.HTTP_200_OK)
+async def get_db_pool_stats() -> dict:
+    """
+    Состояние пула соединений с БД.
+    """
+    return pool_stats()
+
+
+@metrics_router.get("/metrics", status_code=status.HTTP_200_OK, response_class=Response)
+async def get_metrics() -> Response:
+    """
+    Метрики воркера в текстовом формате Prometheus.
+    """
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
@@ -1,19 +1,74 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import Depends, FastAPI
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.authentication import AuthenticationMiddleware
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 
-from app_service.views import router as serv_router
+from app_service.views import router as serv_router, bulk_router as serv_bulk_router
 from app_account.views import router as account_router
+from app_account.auth import Authentication, is_authenticate, refresh_revoked_tokens
+from app_account.backends import JWTAuthenticationBackend
+from app_account.jwt_keys import get_jwt_keys
+from app_account.cache import verified_token_cache
+from app_account.crud import TokenCRUD
+from app_account.partitions import run_partition_maintenance
+from app_account.throttling import login_throttle
+from app_account.token_store import token_store
+from core.compression import CompressedBodyCache, CompressionMiddleware
+from core.config import settings
+from core.database import pool_stats
+from core.metrics import metrics
+from core.middleware import DBStatsMiddleware, MetricsMiddleware, RequestSessionMiddleware
+from core.response_cache import response_cache
+from core.views import metrics_router, router as core_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_jwt_keys()  # ошибка в настройке ключей - при запуске, а не на первом запросе
+    Authentication.hash_pool.start()
+    background_tasks: list[asyncio.Task] = []
+    if settings.AUTH_STATELESS:
+        await TokenCRUD.load_revoked_access_jti()
+        background_tasks.append(
+            asyncio.create_task(refresh_revoked_tokens(settings.REVOCATION_REFRESH_SECONDS))
+        )
+    if settings.TOKEN_PARTITION_CHECK_SECONDS and settings.TOKEN_STORE == "postgres":
+        background_tasks.append(
+            asyncio.create_task(run_partition_maintenance(settings.TOKEN_PARTITION_CHECK_SECONDS))
+        )
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    Authentication.hash_pool.shutdown()
+    await token_store.close()
+    await login_throttle.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # app.add_middleware(HTTPSRedirectMiddleware)
-app.add_middleware(TrustedHostMiddleware, allowed_hosts=["127.0.0.1", ])
-app.add_middleware(GZipMiddleware, minimum_size=2048, compresslevel=5)
-# app.add_middleware(AuthenticationMiddleware, backend=)
+compressed_body_cache = CompressedBodyCache(settings.COMPRESSION_CACHE_MAX_BYTES) \
+    if settings.COMPRESSION_CACHE_MAX_BYTES else None
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    encodings=tuple(settings.COMPRESSION_ENCODINGS),
+    cache=compressed_body_cache,
+)
+app.add_middleware(
+    AuthenticationMiddleware,
+    backend=JWTAuthenticationBackend(
+        public_paths=tuple(settings.AUTH_PUBLIC_PATHS), refresh_paths=tuple(settings.AUTH_REFRESH_PATHS)
+    ),
+)
+app.add_middleware(RequestSessionMiddleware)  # снаружи AuthenticationMiddleware: одна сессия БД на запрос
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
@@ -21,7 +76,22 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],  # Specify allowed methods
     allow_headers=["*"],  # Allows all headers
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)  # внутри DBStatsMiddleware: использует его счетчики БД
+    metrics.register_collector("db_pool", pool_stats)
+    metrics.register_collector("password_hash_pool", Authentication.hash_pool.stats)
+    if compressed_body_cache is not None:
+        metrics.register_collector("compression_cache", compressed_body_cache.stats)
+    metrics.register_collector("response_cache", response_cache.stats)
+    metrics.register_collector("jwt_cache", verified_token_cache.stats)
+    metrics.register_collector("login_throttle", login_throttle.stats)
+app.add_middleware(DBStatsMiddleware, headers=settings.DB_STATS_HEADERS)
+app.add_middleware(TrustedHostMiddleware, allowed_hosts=["127.0.0.1", ])  # последним: внешний, до остальных
 
 app.include_router(serv_router, prefix="/proba_path")
+app.include_router(serv_bulk_router, prefix="/proba_bulk", dependencies=[Depends(is_authenticate)])
 app.include_router(account_router, prefix="/account")
+app.include_router(core_router, prefix="/service", dependencies=[Depends(is_authenticate)])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
 
@@ -0,0 +1,16 @@
+import os
+
+# Settings читаются при импорте модулей приложения; для модульных тестов БД и секреты не нужны
+for name, value in {
+    "DB_NAME": "test",
+    "DB_USER": "test",
+    "DB_PASS": "test",
+    "DB_HOST": "127.0.0.1",
+    "DB_PORT": "5432",
+    "SECRET_KEY": "test-secret-key",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "15",
+    "REFRESH_TOKEN_EXPIRE_HOURS": "24",
+    "APPLICATION": "test",
+}.items():
+    os.environ.setdefault(name, value)
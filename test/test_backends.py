@@ -0,0 +1,81 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from app_account import backends
+from app_account.auth import AUTH_ERROR_SCOPE_KEY
+from app_account.backends import AuthenticatedUser, JWTAuthenticationBackend
+from app_account.schemas import UserClaimsSchema
+from core.database import REQUEST_SESSION_SCOPE_KEY, RequestSession
+
+
+backend = JWTAuthenticationBackend(public_paths=("/docs", "/account/login"), refresh_paths=("/account/update-tokens",))
+USER = UserClaimsSchema(id=uuid4())
+
+
+def connection(path: str, headers: dict[str, str] | None = None) -> HTTPConnection:
+    return HTTPConnection({
+        "type": "http",
+        "path": path,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        REQUEST_SESSION_SCOPE_KEY: RequestSession(),
+    })
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """ Вызовы authenticate_token: (заголовок, refresh). """
+    calls: list[tuple[str, bool]] = []
+
+    async def authenticate_token(db, header, refresh=False):
+        calls.append((header, refresh))
+        if header == "JWT bad":
+            raise HTTPException(status_code=401, detail="Token not found")
+        return USER, "phone"
+    monkeypatch.setattr(backends, "authenticate_token", authenticate_token)
+    return calls
+
+
+def test_public_path_is_not_checked(calls):
+    conn = connection("/docs/oauth2-redirect", {"Authorization": "JWT bad"})
+
+    assert asyncio.run(backend.authenticate(conn)) is None
+    assert calls == []
+    assert AUTH_ERROR_SCOPE_KEY not in conn.scope
+
+
+def test_access_token(calls):
+    credentials, user = asyncio.run(backend.authenticate(connection("/account/user", {"Authorization": "JWT ok"})))
+
+    assert credentials.scopes == ["authenticated", "access"]
+    assert isinstance(user, AuthenticatedUser)
+    assert (user.id, user.device_id, user.is_authenticated) == (USER.id, "phone", True)
+    assert calls == [("JWT ok", False)]
+
+
+def test_refresh_path_checks_refresh_header(calls):
+    conn = connection("/account/update-tokens", {"Authorization": "JWT access", "Refresh_token": "JWT ok"})
+
+    credentials, _ = asyncio.run(backend.authenticate(conn))
+
+    assert credentials.scopes == ["authenticated", "refresh"]
+    assert calls == [("JWT ok", True)]
+
+
+def test_missing_header(calls):
+    # access токен на refresh пути не подходит: нужен заголовок Refresh_token
+    conn = connection("/account/update-tokens", {"Authorization": "JWT ok"})
+
+    assert asyncio.run(backend.authenticate(conn)) is None
+    assert calls == []
+    assert AUTH_ERROR_SCOPE_KEY not in conn.scope
+
+
+def test_error_is_kept_in_scope(calls):
+    conn = connection("/account/user", {"Authorization": "JWT bad"})
+
+    assert asyncio.run(backend.authenticate(conn)) is None
+    assert conn.scope[AUTH_ERROR_SCOPE_KEY].status_code == 401
@@ -0,0 +1,84 @@
+import pytest
+
+from app_account import cache
+from app_account.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_value_until_ttl(clock):
+    ttl_cache = TTLCache(max_size=10, ttl=60)
+    ttl_cache.set("key", "value")
+
+    clock[0] += 59
+    assert ttl_cache.get("key") == "value"
+    clock[0] += 1
+    assert ttl_cache.get("key") is None
+    assert len(ttl_cache) == 0
+    assert ttl_cache.stats() == {"entries": 0, "hits": 1, "misses": 1}
+
+
+def test_entry_ttl_is_capped_by_cache_ttl(clock):
+    ttl_cache = TTLCache(max_size=10, ttl=60)
+    ttl_cache.set("short", 1, ttl=5)
+    ttl_cache.set("long", 2, ttl=600)
+
+    clock[0] += 5
+    assert ttl_cache.get("short") is None
+    clock[0] += 54
+    assert ttl_cache.get("long") == 2
+    clock[0] += 1
+    assert ttl_cache.get("long") is None
+
+
+def test_non_positive_ttl_or_size_is_not_stored(clock):
+    ttl_cache = TTLCache(max_size=10, ttl=60)
+    ttl_cache.set("expired", 1, ttl=-1)
+    assert ttl_cache.get("expired") is None
+
+    disabled = TTLCache(max_size=0, ttl=60)
+    disabled.set("key", 1)
+    assert len(disabled) == 0
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    ttl_cache = TTLCache(max_size=2, ttl=60)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2)
+    assert ttl_cache.get("a") == 1  # "b" становится самым давним
+
+    ttl_cache.set("c", 3)
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def test_invalidate_tag_removes_tagged_entries_only(clock):
+    ttl_cache = TTLCache(max_size=10, ttl=60)
+    ttl_cache.set("jti-1", "user", tags=("user-1", ("user-1", "phone")))
+    ttl_cache.set("jti-2", "user", tags=("user-1", ("user-1", "laptop")))
+    ttl_cache.set("jti-3", "other", tags=("user-2",))
+
+    ttl_cache.invalidate_tag(("user-1", "phone"))
+    assert ttl_cache.get("jti-1") is None
+    assert ttl_cache.get("jti-2") == "user"
+
+    ttl_cache.invalidate_tag("user-1")
+    assert ttl_cache.get("jti-2") is None
+    assert ttl_cache.get("jti-3") == "other"
+
+
+def test_overwrite_and_eviction_drop_old_tags(clock):
+    ttl_cache = TTLCache(max_size=1, ttl=60)
+    ttl_cache.set("key", 1, tags=("old",))
+    ttl_cache.set("key", 2, tags=("new",))
+    ttl_cache.invalidate_tag("old")
+    assert ttl_cache.get("key") == 2
+
+    ttl_cache.set("other", 3, tags=("new",))  # вытесняет "key"
+    assert ttl_cache._tags == {"new": {"other"}}
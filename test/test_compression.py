@@ -0,0 +1,28 @@
+import pytest
+
+from core.compression import negotiate_encoding
+
+
+ENCODINGS = ("zstd", "br", "gzip")
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br, zstd", "zstd"),  # при равных q - порядок сервера
+    ("gzip, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("GZIP", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),
+    ("*", "zstd"),
+    ("*;q=0.5, zstd;q=0", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("gzip;q=abc", None),
+    ("", None),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding, ENCODINGS) == expected
+
+
+def test_negotiate_encoding_only_offers_available():
+    assert negotiate_encoding("zstd, br", ("gzip",)) is None
+    assert negotiate_encoding("zstd, gzip;q=0.5", ("gzip",)) == "gzip"
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from app_account import hashing
+from app_account.hashing import PasswordHashPool, PasswordHashPoolBusy
+
+
+def run_with_pool(pool: PasswordHashPool, scenario) -> None:
+    async def main():
+        try:
+            await scenario()
+        finally:
+            pool.shutdown()
+    asyncio.run(main())
+
+
+def test_run_returns_result_and_frees_slot():
+    pool = PasswordHashPool(size=1, queue_size=0, timeout=1.0)
+
+    async def scenario():
+        assert await pool.run(pow, 2, 10) == 1024
+        assert await pool.run(hashing.verify_password, "secret", hashing.pwd_context.hash("secret")) is True
+        assert pool.stats() == {"size": 1, "queue_size": 0, "queued": 0, "in_flight": 0}
+
+    run_with_pool(pool, scenario)
+
+
+def test_full_queue_raises_busy():
+    pool = PasswordHashPool(size=1, queue_size=0, timeout=1.0)
+
+    async def scenario():
+        await pool.run(pow, 2, 2)  # процесс запущен, следующий вызов не ждет старта
+        busy = asyncio.create_task(pool.run(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashPoolBusy):
+            await pool.run(pow, 2, 2)
+        await busy
+        assert await pool.run(pow, 2, 3) == 8
+
+    run_with_pool(pool, scenario)
+
+
+def test_queue_timeout_raises_busy():
+    pool = PasswordHashPool(size=1, queue_size=1, timeout=0.1)
+
+    async def scenario():
+        await pool.run(pow, 2, 2)
+        busy = asyncio.create_task(pool.run(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PasswordHashPoolBusy):
+            await pool.run(pow, 2, 2)
+        assert pool.stats()["queued"] == 0
+        await busy
+
+    run_with_pool(pool, scenario)
+
+
+def test_queued_call_runs_when_slot_frees():
+    pool = PasswordHashPool(size=1, queue_size=1, timeout=2.0)
+
+    async def scenario():
+        await pool.run(pow, 2, 2)
+        busy = asyncio.create_task(pool.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        assert await pool.run(pow, 3, 2) == 9
+        await busy
+        assert pool.stats()["in_flight"] == 0
+
+    run_with_pool(pool, scenario)
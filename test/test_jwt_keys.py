@@ -0,0 +1,72 @@
+import jwt
+import pytest
+
+from app_account.jwt_keys import JWTKeys, generate_key_pair
+
+
+PAYLOAD = {"sub": "user=phone"}
+
+
+@pytest.fixture(params=["EdDSA", "ES256"])
+def algorithm(request):
+    return request.param
+
+
+def key_pair(algorithm: str) -> JWTKeys:
+    private, _ = generate_key_pair(algorithm)
+    return JWTKeys(algorithm, private_key_pem=private)
+
+
+def test_kid_in_token_header_and_jwks(algorithm):
+    keys = key_pair(algorithm)
+
+    token = keys.encode(PAYLOAD)
+
+    assert jwt.get_unverified_header(token)["kid"] == keys.kid
+    [jwk] = keys.jwks()["keys"]
+    assert (jwk["kid"], jwk["alg"], jwk["use"]) == (keys.kid, algorithm, "sig")
+    assert keys.decode(token) == PAYLOAD
+
+
+def test_new_key_pair_gets_new_kid(algorithm):
+    old, new = key_pair(algorithm), key_pair(algorithm)
+
+    assert old.kid != new.kid
+    # токен старого ключа после смены ключа не проходит проверку
+    with pytest.raises(jwt.InvalidSignatureError):
+        new.decode(old.encode(PAYLOAD))
+
+
+def test_kid_is_stable_for_same_key(algorithm):
+    private, public = generate_key_pair(algorithm)
+
+    signer = JWTKeys(algorithm, private_key_pem=private)
+    verifier = JWTKeys(algorithm, public_key_pem=public)  # другой сервис: только открытый ключ
+
+    assert signer.kid == verifier.kid
+    assert verifier.decode(signer.encode(PAYLOAD)) == PAYLOAD
+    with pytest.raises(ValueError):
+        verifier.encode(PAYLOAD)
+
+
+def test_configured_kid_overrides_thumbprint(algorithm):
+    private, _ = generate_key_pair(algorithm)
+
+    keys = JWTKeys(algorithm, private_key_pem=private, kid="2026-10")
+
+    assert jwt.get_unverified_header(keys.encode(PAYLOAD))["kid"] == "2026-10"
+
+
+def test_hmac_keys_are_not_published():
+    keys = JWTKeys("HS256", secret="secret")
+
+    token = keys.encode(PAYLOAD)
+
+    assert "kid" not in jwt.get_unverified_header(token)
+    assert keys.jwks() == {"keys": []}
+    assert keys.decode(token) == PAYLOAD
+
+
+def test_asymmetric_algorithm_requires_key():
+    with pytest.raises(ValueError):
+        JWTKeys("EdDSA")
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+import pytest
+from fastapi import HTTPException
+
+from core.pagination import decode_cursor, encode_cursor
+
+
+TYPES = (datetime.fromisoformat, UUID)
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc), UUID("8d6bf7a6-2b6a-4b6e-9d0a-3f1d2c4b5a69")]
+    cursor = encode_cursor(values)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, TYPES) == values
+
+
+def test_cursor_with_number_and_string():
+    cursor = encode_cursor([42, "name"])
+    assert decode_cursor(cursor, (int, str)) == [42, "name"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor([1]),  # число значений не совпадает с ключом
+    encode_cursor(["not a date", "8d6bf7a6-2b6a-4b6e-9d0a-3f1d2c4b5a69"]),
+    "eyJhIjoxfQ",  # {"a":1} - не список
+    "_w",  # не UTF-8
+])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, TYPES)
+    assert exc_info.value.status_code == 400
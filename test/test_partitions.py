@@ -0,0 +1,166 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from app_account import partitions
+from app_account.partitions import TOKEN_TABLES, maintain_token_partitions
+
+
+class FakeResult:
+
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one(self):
+        return self.value
+
+    def scalars(self):
+        return iter(self.value)
+
+
+class LockNotAvailable(Exception):
+    sqlstate = "55P03"
+
+
+class FakeConnection:
+    """ Записывает выполненный SQL, отвечает на запросы обслуживания партиций по состоянию FakeDatabase. """
+
+    def __init__(self, database: "FakeDatabase"):
+        self.database = database
+        self.isolation_level: str | None = None
+
+    async def execute(self, statement, parameters=None):
+        sql = str(statement)
+        self.database.executed.append(sql)
+        if "pg_try_advisory_lock" in sql:
+            return FakeResult(self.database.locked)
+        if "pg_inherits" in sql:
+            return FakeResult(self.database.partitions[parameters["table"]])
+        if "pg_partitioned_table" in sql:
+            return FakeResult(self.database.has_default)
+        if "DETACH PARTITION" in sql:
+            assert self.isolation_level == "AUTOCOMMIT"
+            if self.database.detach_failures:
+                self.database.detach_failures -= 1
+                raise DBAPIError(sql, None, LockNotAvailable())
+        return FakeResult(None)
+
+    async def commit(self):
+        return None
+
+    @asynccontextmanager
+    async def begin(self):
+        yield self
+
+    async def execution_options(self, isolation_level: str):
+        self.isolation_level = isolation_level
+        return self
+
+
+class FakeDatabase:
+
+    def __init__(self, partitions: dict[str, list[str]], locked: bool = True, has_default: bool = True):
+        self.partitions = partitions
+        self.locked = locked
+        self.has_default = has_default
+        self.detach_failures = 0
+        self.executed: list[str] = []
+
+    @asynccontextmanager
+    async def connect(self):
+        yield FakeConnection(self)
+
+    def statements(self, fragment: str) -> list[str]:
+        return [sql for sql in self.executed if fragment in sql]
+
+
+@pytest.fixture
+def today():
+    return datetime.now(tz=timezone.utc).date()
+
+
+def use_database(monkeypatch, database: FakeDatabase) -> None:
+    monkeypatch.setattr(partitions, "async_engine", database)
+
+    async def no_sleep(_):
+        return None
+    monkeypatch.setattr(partitions.asyncio, "sleep", no_sleep)
+
+
+def names(table: str, *days) -> list[str]:
+    return [f"{table}_p{day:%Y%m%d}" for day in days]
+
+
+def expired_yesterday(today) -> dict[str, list[str]]:
+    """ Партиции за вчера (истекла), сегодня и завтра: создавать нечего. """
+    return {table: names(table, today - timedelta(days=1), today, today + timedelta(days=1)) for table in TOKEN_TABLES}
+
+
+def test_does_nothing_without_advisory_lock(monkeypatch, today):
+    database = FakeDatabase({table: [] for table in TOKEN_TABLES}, locked=False)
+    use_database(monkeypatch, database)
+
+    assert asyncio.run(maintain_token_partitions(premake_days=1)) == {"created": [], "dropped": []}
+    assert not database.statements("CREATE TABLE")
+    assert not database.statements("pg_advisory_unlock")
+
+
+def test_creates_missing_and_drops_expired(monkeypatch, today):
+    yesterday, tomorrow = today - timedelta(days=1), today + timedelta(days=1)
+    database = FakeDatabase({table: names(table, yesterday, today) + [f"{table}_default"] for table in TOKEN_TABLES})
+    use_database(monkeypatch, database)
+
+    report = asyncio.run(maintain_token_partitions(premake_days=1))
+
+    assert report["created"] == [name for table in TOKEN_TABLES for name in names(table, tomorrow)]
+    assert report["dropped"] == [name for table in TOKEN_TABLES for name in names(table, yesterday)]
+    for table in TOKEN_TABLES:
+        [expired] = names(table, yesterday)
+        # DEFAULT партиция: CONCURRENTLY недоступен, обычный DETACH с коротким lock_timeout
+        assert f"ALTER TABLE {table} DETACH PARTITION {expired}" in database.executed
+        assert database.executed.index(f"ALTER TABLE {table} DETACH PARTITION {expired}") < \
+            database.executed.index(f"DROP TABLE {expired}")
+    assert not database.statements("CONCURRENTLY")
+    assert len(database.statements("RESET lock_timeout")) == len(TOKEN_TABLES)
+    assert database.statements("pg_advisory_unlock")
+
+
+def test_detaches_concurrently_without_default_partition(monkeypatch, today):
+    yesterday = today - timedelta(days=1)
+    database = FakeDatabase(expired_yesterday(today), has_default=False)
+    use_database(monkeypatch, database)
+
+    report = asyncio.run(maintain_token_partitions(premake_days=1))
+
+    assert report["created"] == []
+    for table in TOKEN_TABLES:
+        [expired] = names(table, yesterday)
+        assert f"ALTER TABLE {table} DETACH PARTITION {expired} CONCURRENTLY" in database.executed
+        assert f"DROP TABLE {expired}" in database.executed
+
+
+def test_detach_retries_on_lock_timeout(monkeypatch, today):
+    yesterday = today - timedelta(days=1)
+    database = FakeDatabase(expired_yesterday(today))
+    database.detach_failures = 2
+    use_database(monkeypatch, database)
+
+    report = asyncio.run(maintain_token_partitions(premake_days=1))
+
+    assert len(report["dropped"]) == len(TOKEN_TABLES)
+    assert len(database.statements("DETACH PARTITION")) == len(TOKEN_TABLES) + 2
+
+
+def test_failed_drop_does_not_stop_maintenance(monkeypatch, today):
+    yesterday = today - timedelta(days=1)
+    database = FakeDatabase(expired_yesterday(today))
+    database.detach_failures = partitions.DETACH_ATTEMPTS  # первая таблица: все попытки по lock_timeout
+    use_database(monkeypatch, database)
+
+    report = asyncio.run(maintain_token_partitions(premake_days=1))
+
+    assert report["dropped"] == names(TOKEN_TABLES[1], yesterday)
+    assert database.statements("pg_advisory_unlock")
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+from starlette.requests import Request
+
+from core import response_cache as module
+from core.response_cache import CachedResponse, ResponseCache, cached_response, etag_matches, make_etag
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(max_bytes=1024, ttl=60)
+    monkeypatch.setattr(module, "response_cache", cache)
+    return cache
+
+
+class Renderer:
+    """ render() для cached_response, считает вызовы. """
+
+    def __init__(self, body: bytes = b'{"items": []}', status_code: int = 200):
+        self.body = body
+        self.status_code = status_code
+        self.calls = 0
+
+    async def __call__(self) -> Response:
+        self.calls += 1
+        return Response(content=self.body, media_type="application/json", status_code=self.status_code)
+
+
+def request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "headers": headers})
+
+
+def get(renderer: Renderer, validator=1, if_none_match: str | None = None, key="probas") -> Response:
+    return asyncio.run(cached_response(request(if_none_match), key, validator, renderer, tags=("probas",)))
+
+
+def test_hit_skips_render(cache):
+    renderer = Renderer()
+
+    first, second = get(renderer), get(renderer)
+
+    assert renderer.calls == 1
+    assert first.body == second.body == renderer.body
+    assert first.headers["etag"] == second.headers["etag"] == make_etag(renderer.body)
+    assert first.headers["cache-control"] == "no-cache"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_etag_gets_304(cache, if_none_match):
+    renderer = Renderer()
+    etag = get(renderer).headers["etag"]
+
+    response = get(renderer, if_none_match=if_none_match.format(etag=etag))
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == etag
+    assert cache.not_modified == 1
+
+
+def test_stale_etag_gets_body(cache):
+    renderer = Renderer()
+
+    response = get(renderer, if_none_match='"stale"')
+
+    assert response.status_code == 200
+    assert response.body == renderer.body
+
+
+def test_changed_validator_renders_again(cache):
+    renderer = Renderer()
+    get(renderer, validator=1)
+    renderer.body = b'{"items": [1]}'
+
+    response = get(renderer, validator=2, if_none_match=make_etag(b'{"items": []}'))
+
+    assert renderer.calls == 2
+    assert response.status_code == 200
+    assert response.headers["etag"] == make_etag(b'{"items": [1]}')
+
+
+def test_no_validator_is_not_cached(cache):
+    renderer = Renderer(status_code=404)
+
+    response = get(renderer, validator=None)
+    get(renderer, validator=None)
+
+    assert renderer.calls == 2
+    assert response.status_code == 404
+    assert "etag" not in response.headers
+
+
+def test_error_response_is_not_cached(cache):
+    renderer = Renderer(status_code=500)
+
+    get(renderer), get(renderer)
+
+    assert renderer.calls == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_tag(cache):
+    renderer = Renderer()
+    get(renderer)
+
+    cache.invalidate_tag("probas")
+    get(renderer)
+
+    assert renderer.calls == 2
+
+
+def test_size_limit_evicts_least_recent():
+    cache = ResponseCache(max_bytes=10, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, CachedResponse(1, make_etag(b"x"), b"12345", "application/json", float("inf"), ()))
+
+    assert cache.get("a", 1) is None
+    assert cache.get("c", 1) is not None
+    assert cache.size == 10
+
+
+def test_etag_matches_without_header():
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches("", '"a"')
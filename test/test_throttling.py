@@ -0,0 +1,88 @@
+import asyncio
+from ipaddress import ip_network
+
+import pytest
+from starlette.requests import Request
+
+from app_account import throttling
+from app_account.throttling import MemoryLoginThrottle, RateLimit, client_ip
+
+
+LIMIT = RateLimit(rate=1.0, burst=3)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(throttling.time, "monotonic", lambda: now[0])
+    return now
+
+
+def acquire(throttle: MemoryLoginThrottle, key: str, limit: RateLimit = LIMIT) -> float:
+    return asyncio.run(throttle.acquire(key, limit))
+
+
+def test_burst_then_wait(clock):
+    throttle = MemoryLoginThrottle(max_keys=100, shards=1)
+
+    assert [acquire(throttle, "ip:1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert acquire(throttle, "ip:1") == pytest.approx(1.0)
+
+
+def test_refill_at_rate_and_capped_by_burst(clock):
+    throttle = MemoryLoginThrottle(max_keys=100, shards=1)
+    for _ in range(3):
+        acquire(throttle, "ip:1")
+
+    clock[0] += 0.5
+    assert acquire(throttle, "ip:1") == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert acquire(throttle, "ip:1") == 0.0
+
+    clock[0] += 3600  # пополнение не больше burst
+    assert [acquire(throttle, "ip:1") for _ in range(4)][-1] == pytest.approx(1.0)
+
+
+def test_buckets_are_independent(clock):
+    throttle = MemoryLoginThrottle(max_keys=100, shards=4)
+    for _ in range(3):
+        acquire(throttle, "user:alice")
+
+    assert acquire(throttle, "user:alice") > 0
+    assert acquire(throttle, "user:bob") == 0.0
+
+
+def test_lru_eviction_within_shard(clock):
+    throttle = MemoryLoginThrottle(max_keys=2, shards=1)
+    for _ in range(3):
+        acquire(throttle, "user:alice")
+    acquire(throttle, "user:bob")
+    acquire(throttle, "user:carol")  # вытесняет корзину alice
+
+    assert len(throttle) == 2
+    assert acquire(throttle, "user:alice") == 0.0  # корзина создана заново полной
+
+
+PROXIES = (ip_network("10.0.0.0/8"), ip_network("192.168.1.5/32"))
+
+
+def request_from(host: str, forwarded: str | None = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "client": (host, 50000), "headers": headers})
+
+
+@pytest.mark.parametrize("host, forwarded, expected", [
+    ("203.0.113.7", None, "203.0.113.7"),
+    ("203.0.113.7", "198.51.100.1", "203.0.113.7"),  # заголовок не от прокси не учитывается
+    ("10.0.0.2", None, "10.0.0.2"),
+    ("10.0.0.2", "198.51.100.1", "198.51.100.1"),
+    ("10.0.0.2", "1.1.1.1, 198.51.100.1, 192.168.1.5", "198.51.100.1"),  # 1.1.1.1 задан клиентом
+    ("10.0.0.2", "10.1.1.1, 192.168.1.5", "10.1.1.1"),
+    ("10.0.0.2", "not-an-ip", "not-an-ip"),
+])
+def test_client_ip(host, forwarded, expected):
+    assert client_ip(request_from(host, forwarded), PROXIES) == expected
+
+
+def test_client_ip_without_trusted_proxies():
+    assert client_ip(request_from("10.0.0.2", "198.51.100.1"), ()) == "10.0.0.2"
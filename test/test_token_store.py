@@ -0,0 +1,163 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app_account.schemas import AcTokenSchema, ReTokenSchema
+from app_account.token_store import MemoryTokenStore, PostgresTokenStore
+
+
+class FakeResult:
+
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar_one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession:
+    """ Сессия запроса: запоминает запросы в SQL Postgres и отвечает заранее заданными строками. """
+
+    def __init__(self, rows: list | None = None):
+        self.rows = rows or []
+        self.statements: list[str] = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return FakeResult(self.rows)
+
+    async def commit(self):
+        self.commits += 1
+
+
+USER_ID = uuid4()
+
+
+def token(schema, device_id: str = "phone", ttl: timedelta = timedelta(hours=1)):
+    return schema(
+        jti=uuid4(), is_active=True, exp=datetime.now(tz=timezone.utc) + ttl, device_id=device_id,
+        user_id={"id": USER_ID, "username": "user", "email": "user@example.com"}
+    )
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# PostgresTokenStore
+
+def test_postgres_issue_pair_is_one_statement():
+    deactivated = [uuid4()]
+    db = FakeSession(deactivated)
+
+    assert run(PostgresTokenStore().issue(db, USER_ID, "phone", token(AcTokenSchema), token(ReTokenSchema))) == \
+        deactivated
+    [sql] = db.statements
+    assert db.commits == 1
+    for table in ("assigned_jwt_access_token", "assigned_jwt_refresh_token"):
+        assert f"deactivated_{table} AS \n(UPDATE {table} SET is_active=" in sql
+        assert f"inserted_{table} AS \n(INSERT INTO {table}" in sql
+    assert sql.rstrip().endswith("FROM deactivated_assigned_jwt_access_token")
+
+
+def test_postgres_issue_access_only_keeps_refresh():
+    db = FakeSession()
+
+    run(PostgresTokenStore().issue(db, USER_ID, "phone", token(AcTokenSchema)))
+
+    [sql] = db.statements
+    assert "deactivated_assigned_jwt_access_token" in sql
+    assert "assigned_jwt_refresh_token" not in sql
+
+
+@pytest.mark.parametrize("refresh", [False, True])
+def test_postgres_find_active_token_in_partition(refresh):
+    user = object()
+    db = FakeSession([(user, "phone")])
+
+    assert run(PostgresTokenStore().find(db, uuid4(), refresh, exp=1792345000)) == (user, "phone")
+    [sql] = db.statements
+    table = "assigned_jwt_refresh_token" if refresh else "assigned_jwt_access_token"
+    assert f"{table}.is_active = true" in sql
+    # диапазон expired_time в одну секунду: план затрагивает одну партицию
+    assert f"{table}.expired_time >= " in sql and f"{table}.expired_time < " in sql
+
+
+def test_postgres_find_missing_token():
+    assert run(PostgresTokenStore().find(FakeSession(), uuid4(), False)) is None
+
+
+# MemoryTokenStore
+
+@pytest.fixture
+def store():
+    return MemoryTokenStore()
+
+
+@pytest.fixture
+def db():
+    return FakeSession([object()])  # пользователь токена
+
+
+def test_memory_reissue_deactivates_device_tokens(store, db):
+    old_access, old_refresh = token(AcTokenSchema), token(ReTokenSchema)
+    run(store.issue(db, USER_ID, "phone", old_access, old_refresh))
+    new_access, new_refresh = token(AcTokenSchema), token(ReTokenSchema)
+
+    assert run(store.issue(db, USER_ID, "phone", new_access, new_refresh)) == [old_access.jti]
+
+    assert run(store.find(db, old_access.jti, False)) is None
+    assert run(store.find(db, old_refresh.jti, True)) is None
+    assert run(store.find(db, new_access.jti, False))[1] == "phone"
+    assert run(store.find(db, new_refresh.jti, True))[1] == "phone"
+    assert run(store.revoked_access_jti()) == {old_access.jti}
+
+
+def test_memory_access_only_reissue_keeps_refresh(store, db):
+    refresh = token(ReTokenSchema)
+    run(store.issue(db, USER_ID, "phone", token(AcTokenSchema), refresh))
+
+    run(store.issue(db, USER_ID, "phone", token(AcTokenSchema)))
+
+    assert run(store.find(db, refresh.jti, True)) is not None
+
+
+def test_memory_other_device_stays_active(store, db):
+    phone, laptop = token(AcTokenSchema, "phone"), token(AcTokenSchema, "laptop")
+    run(store.issue(db, USER_ID, "phone", phone))
+    run(store.issue(db, USER_ID, "laptop", laptop))
+
+    run(store.issue(db, USER_ID, "phone", token(AcTokenSchema, "phone")))
+
+    assert run(store.find(db, laptop.jti, False)) is not None
+
+
+def test_memory_expired_token_not_found(store, db):
+    expired = token(AcTokenSchema, ttl=timedelta(seconds=-1))
+    run(store.issue(db, USER_ID, "phone", expired))
+
+    assert run(store.find(db, expired.jti, False)) is None
+
+
+def test_memory_revoke_user(store, db):
+    phone, laptop = token(AcTokenSchema, "phone"), token(AcTokenSchema, "laptop")
+    refresh = token(ReTokenSchema, "phone")
+    run(store.issue(db, USER_ID, "phone", phone, refresh))
+    run(store.issue(db, USER_ID, "laptop", laptop))
+
+    assert sorted(run(store.revoke_user(db, USER_ID)), key=UUID.__str__) == \
+        sorted([phone.jti, laptop.jti], key=UUID.__str__)
+    assert run(store.find(db, refresh.jti, True)) is None